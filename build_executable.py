@@ -6,8 +6,33 @@
 import subprocess
 import sys
 import os
+import time
+import argparse
+import statistics
+import tempfile
 from pathlib import Path
 
+APP_NAME = "Suno字幕下載工具"
+
+# 打包設定：
+#   onefile - 單一執行檔，方便分發，但每次啟動都要先解壓縮到暫存目錄
+#   fast    - onedir 資料夾，啟動時直接載入，不需解壓縮；並排除用不到的模組、不使用 UPX
+BUILD_PROFILES = ("onefile", "fast")
+
+# GUI 用不到的標準函式庫，以及 requests 的選用套件（SOCKS、brotli、zstd、pyOpenSSL 等）
+EXCLUDED_MODULES = [
+    "unittest", "doctest", "pydoc", "pdb", "lib2to3", "distutils", "setuptools",
+    "pkg_resources", "ensurepip", "venv", "idlelib", "turtle", "turtledemo",
+    "tkinter.test", "curses", "xmlrpc", "sqlite3", "multiprocessing", "asyncio",
+    "socks", "simplejson", "brotli", "brotlicffi", "zstandard", "cryptography",
+    "OpenSSL", "h2", "chardet",
+]
+
+# 啟動時間測試：GUI 看到此環境變數時，第一個視窗畫出後寫入時間並結束
+STARTUP_PROBE_ENV = "SUNO_STARTUP_PROBE"
+BENCHMARK_RUNS = 5
+BENCHMARK_TIMEOUT = 60
+
 def check_pyinstaller():
     """檢查 PyInstaller 是否已安裝"""
     try:
@@ -22,7 +47,101 @@ def install_pyinstaller():
     subprocess.check_call([sys.executable, "-m", "pip", "install", "pyinstaller"])
     print("✅ PyInstaller 安裝完成")
 
-def build_executable():
+def build_command(script_path, profile, extra_args=None):
+    """依打包設定產生 PyInstaller 命令"""
+    cmd = [
+        "pyinstaller",
+        "--onefile" if profile == "onefile" else "--onedir",
+        "--noconfirm",
+        "--windowed" if sys.platform == "win32" else "--noconsole",  # 不顯示控制台視窗
+        f"--name={APP_NAME}",  # 可執行檔案名稱
+        "--icon=NONE",  # 可以指定圖標檔案
+        f"--add-data=requirements.txt{os.pathsep}.",  # 包含 requirements.txt（Windows 用 ;，macOS/Linux 用 :）
+    ]
+    
+    if profile == "fast":
+        # UPX 壓縮的檔案每次載入都要解壓縮，反而拖慢啟動
+        cmd.append("--noupx")
+        cmd.extend(f"--exclude-module={name}" for name in EXCLUDED_MODULES)
+    
+    cmd.extend(extra_args or [])
+    cmd.append(str(script_path))
+    return cmd
+
+def find_executable():
+    """找出打包後的可執行檔案"""
+    dist = Path("dist")
+    candidates = [
+        dist / f"{APP_NAME}.app" / "Contents" / "MacOS" / APP_NAME,
+        dist / APP_NAME / f"{APP_NAME}.exe",
+        dist / APP_NAME / APP_NAME,
+        dist / f"{APP_NAME}.exe",
+        dist / APP_NAME,
+    ]
+    for candidate in candidates:
+        if candidate.is_file():
+            return candidate
+    return None
+
+def get_path_size(path):
+    """檔案或資料夾的大小（位元組）"""
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    return sum(entry.stat().st_size for entry in path.rglob('*') if entry.is_file())
+
+def measure_startup(executable):
+    """啟動一次程式，回傳從啟動到第一個視窗畫出的秒數；失敗時回傳 None"""
+    with tempfile.TemporaryDirectory() as tmp:
+        probe = Path(tmp) / "startup"
+        env = dict(os.environ, **{STARTUP_PROBE_ENV: str(probe)})
+        started = time.time()
+        process = subprocess.Popen([str(executable)], env=env)
+        try:
+            process.wait(timeout=BENCHMARK_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            return None
+        if not probe.exists():
+            return None
+        return float(probe.read_text(encoding="utf-8")) - started
+
+def run_startup_benchmark(executable, runs=BENCHMARK_RUNS):
+    """冷啟動（打包後第一次執行）與熱啟動（之後數次的中位數）測試"""
+    print(f"⏱  啟動時間測試（{runs} 次）：{executable}")
+    timings = []
+    for _ in range(runs):
+        elapsed = measure_startup(executable)
+        if elapsed is None:
+            print("⚠️  無法取得啟動時間（需要圖形環境，或程式未能開啟視窗）")
+            return None
+        timings.append(elapsed)
+    
+    result = {"cold": timings[0], "warm": statistics.median(timings[1:] or timings)}
+    print(f"   冷啟動: {result['cold']:.2f} 秒")
+    print(f"   熱啟動: {result['warm']:.2f} 秒（中位數）")
+    return result
+
+def report_build(profile, benchmark=True):
+    """列出打包結果的大小，並視需要執行啟動時間測試"""
+    executable = find_executable()
+    if executable is None:
+        print("⚠️  找不到可執行檔案，請檢查 dist/ 目錄")
+        return
+    
+    # onedir 與 .app 以整個資料夾計算大小
+    bundle = executable
+    for parent in executable.parents:
+        if parent.suffix == ".app" or parent.parent == Path("dist"):
+            bundle = parent
+            break
+    print(f"📦 打包設定: {profile}")
+    print(f"📦 大小: {get_path_size(bundle) / (1024 * 1024):.2f} MB（{bundle}）")
+    
+    if benchmark:
+        run_startup_benchmark(executable)
+
+def build_executable(profile="onefile", benchmark=True):
     """打包可執行檔案"""
     script_path = Path(__file__).parent / "suno-subtitle-downloader-gui.py"
     
@@ -36,23 +155,7 @@ def build_executable():
     print()
     
     # PyInstaller 命令
-    cmd = [
-        "pyinstaller",
-        "--onefile",  # 打包成單一檔案
-        "--windowed",  # 不顯示控制台視窗（Windows/Mac）
-        "--name=Suno字幕下載工具",  # 可執行檔案名稱
-        "--icon=NONE",  # 可以指定圖標檔案
-        "--add-data=requirements.txt;.",  # 包含 requirements.txt（Windows 用 ;）
-        str(script_path)
-    ]
-    
-    # 根據作業系統調整
-    if sys.platform == "darwin":  # macOS
-        cmd[2] = "--noconsole"  # macOS 使用 --noconsole
-        cmd[4] = "--add-data=requirements.txt:."  # macOS/Linux 用 :
-    elif sys.platform == "linux":  # Linux
-        cmd[2] = "--noconsole"
-        cmd[4] = "--add-data=requirements.txt:."
+    cmd = build_command(script_path, profile)
     
     try:
         print("執行命令：")
@@ -65,10 +168,14 @@ def build_executable():
         print("=" * 60)
         print()
         print("可執行檔案位置：")
-        if sys.platform == "win32":
-            print("  dist/Suno字幕下載工具.exe")
+        if profile == "fast":
+            print(f"  dist/{APP_NAME}/（整個資料夾一起分發）")
+        elif sys.platform == "win32":
+            print(f"  dist/{APP_NAME}.exe")
         else:
-            print("  dist/Suno字幕下載工具")
+            print(f"  dist/{APP_NAME}")
+        print()
+        report_build(profile, benchmark)
         print()
         return True
     except subprocess.CalledProcessError as e:
@@ -78,8 +185,19 @@ def build_executable():
         print(f"❌ 發生錯誤：{e}")
         return False
 
+def parse_args():
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="將 GUI 應用程式打包成可執行檔案")
+    parser.add_argument("--profile", choices=BUILD_PROFILES, default="onefile",
+                        help="onefile：單一檔案（預設）；fast：onedir 資料夾，啟動較快")
+    parser.add_argument("--no-benchmark", action="store_true",
+                        help="打包後不執行啟動時間測試")
+    return parser.parse_args()
+
 def main():
     """主程式"""
+    args = parse_args()
+    
     # 檢查 PyInstaller
     if not check_pyinstaller():
         print("PyInstaller 未安裝")
@@ -91,13 +209,15 @@ def main():
             return
     
     # 打包
-    success = build_executable()
+    success = build_executable(args.profile, not args.no_benchmark)
     
     if success:
         print("💡 提示：")
         print("  - 可執行檔案位於 dist/ 目錄")
         print("  - 可以直接分發給其他使用者使用")
         print("  - 不需要安裝 Python 即可執行")
+        if args.profile == "onefile":
+            print("  - 需要更快的啟動速度時，可使用 --profile fast 打包成資料夾")
     else:
         print("打包失敗，請檢查錯誤訊息")
 
@@ -8,8 +8,12 @@ import subprocess
 import sys
 import os
 import shutil
+import argparse
 from pathlib import Path
 
+# 與通用打包腳本共用打包設定、模組排除清單與啟動時間測試
+from build_executable import BUILD_PROFILES, EXCLUDED_MODULES, report_build
+
 def check_pyinstaller():
     """檢查 PyInstaller 是否已安裝"""
     try:
@@ -24,7 +28,7 @@ def install_pyinstaller():
     subprocess.check_call([sys.executable, "-m", "pip", "install", "pyinstaller"])
     print("✅ PyInstaller 安裝完成")
 
-def build_macos_app():
+def build_macos_app(profile="onefile", benchmark=True):
     """打包成 macOS .app 應用程式"""
     script_path = Path(__file__).parent / "suno-subtitle-downloader-gui.py"
     
@@ -42,15 +46,18 @@ def build_macos_app():
     # PyInstaller 命令 - macOS 專用設定
     cmd = [
         "pyinstaller",
-        "--onefile",  # 打包成單一檔案
+        "--onefile" if profile == "onefile" else "--onedir",  # fast：.app 內為資料夾，啟動時不需解壓縮
         "--windowed",  # 不顯示終端視窗（macOS 使用 --windowed）
         f"--name={app_name}",  # 應用程式名稱
         "--osx-bundle-identifier=com.suno.subtitle.downloader",  # Bundle ID
         "--add-data=requirements.txt:.",  # 包含 requirements.txt
         "--hidden-import=tkinter",  # 確保 tkinter 被包含
         "--hidden-import=requests",  # 確保 requests 被包含
-        str(script_path)
     ]
+    if profile == "fast":
+        cmd.append("--noupx")
+        cmd.extend(f"--exclude-module={name}" for name in EXCLUDED_MODULES)
+    cmd.append(str(script_path))
     
     try:
         print("執行命令：")
@@ -82,6 +89,8 @@ def build_macos_app():
             print(f"   位置: {app_path.absolute()}")
             print(f"   大小: {get_folder_size(app_path)} MB")
             print()
+            report_build(profile, benchmark)
+            print()
             print("🚀 使用方式：")
             print("   1. 雙擊應用程式即可啟動")
             print("   2. 如果出現安全警告，請：")
@@ -165,8 +174,19 @@ def create_dmg():
         print("   提示：可以手動使用「磁碟工具程式」建立 DMG")
         return False
 
+def parse_args():
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="將 GUI 應用程式打包成 macOS .app")
+    parser.add_argument("--profile", choices=BUILD_PROFILES, default="onefile",
+                        help="onefile：單一執行檔（預設）；fast：onedir，雙擊後開啟較快")
+    parser.add_argument("--no-benchmark", action="store_true",
+                        help="打包後不執行啟動時間測試")
+    return parser.parse_args()
+
 def main():
     """主程式"""
+    args = parse_args()
+    
     print("🍎 macOS 應用程式打包工具")
     print("=" * 60)
     print()
@@ -190,7 +210,7 @@ def main():
             return
     
     # 打包
-    success = build_macos_app()
+    success = build_macos_app(args.profile, not args.no_benchmark)
     
     if success:
         # 詢問是否建立 DMG
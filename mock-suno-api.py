@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Suno API 模擬伺服器
+在本機提供 /api/gen/{歌曲ID}/aligned_lyrics/v2/、/api/clip/{歌曲ID}，
+以及分頁的 /api/playlist/{ID}/ 與 /api/profiles/{名稱} 端點，
+用於測量字幕下載工具的並行、重試與快取行為
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+
+
+ALIGNED_LYRICS_RE = re.compile(r'^/api/gen/([^/]+)/aligned_lyrics/v2/?$')
+CLIP_RE = re.compile(r'^/api/clip/([^/]+)/?$')
+PLAYLIST_RE = re.compile(r'^/api/playlist/([^/]+)/?$')
+PROFILE_RE = re.compile(r'^/api/profiles/([^/]+)/?$')
+STATS_PATH = '/__stats'
+
+# 回應內容分塊送出的大小
+WRITE_CHUNK_SIZE = 65536
+
+SYLLABLES = ['la', 'na', 'oh', 'yeah', 'love', 'night', 'light', 'heart', 'fly', 'away',
+             'star', 'rain', 'dream', 'fire', 'sky', 'home', 'time', 'run', 'go', 'shine']
+
+
+class RateLimiter:
+    """權杖桶限流：每秒補充 rate 個權杖，最多累積 burst 個"""
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self) -> Optional[float]:
+        """取得一個權杖；額度不足時回傳建議的 Retry-After 秒數"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            return (1 - self.tokens) / self.rate
+
+
+class MockSunoAPI:
+    """模擬 API 的狀態：回應內容、故障注入與統計"""
+    
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.random_lock = threading.Lock()
+        self.limiter = RateLimiter(args.rate_limit, args.burst) if args.rate_limit else None
+        self.missing = set(args.missing or [])
+        self.payloads: Dict[str, bytes] = {}
+        self.payloads_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+    
+    def reset_stats(self):
+        """統計歸零；進行中的請求數不受影響"""
+        with self.stats_lock:
+            self.started = time.monotonic()
+            self.requests = 0
+            self.statuses: Dict[str, int] = {}
+            self.bytes_sent = 0
+            self.in_flight = getattr(self, 'in_flight', 0)
+            self.max_in_flight = self.in_flight
+    
+    def begin(self):
+        with self.stats_lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+    
+    def end(self, status: int, size: int):
+        with self.stats_lock:
+            self.in_flight -= 1
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+            self.bytes_sent += size
+    
+    def stats(self) -> Dict:
+        with self.stats_lock:
+            elapsed = time.monotonic() - self.started
+            return {
+                'uptime_s': round(elapsed, 3),
+                'requests': self.requests,
+                'requests_per_s': round(self.requests / elapsed, 2) if elapsed else 0,
+                'statuses': dict(self.statuses),
+                'bytes_sent': self.bytes_sent,
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+            }
+    
+    def roll(self) -> float:
+        with self.random_lock:
+            return self.random.random()
+    
+    def delay(self) -> float:
+        """本次請求的延遲秒數（延遲 ± 抖動）"""
+        with self.random_lock:
+            jitter = self.random.uniform(-self.args.jitter, self.args.jitter)
+        return max(0.0, self.args.latency + jitter) / 1000
+    
+    def payload(self, song_id: str) -> Optional[bytes]:
+        """取得歌曲的回應內容；同一首歌曲每次回應相同，以便測試 ETag 與內容雜湊"""
+        with self.payloads_lock:
+            if song_id in self.payloads:
+                return self.payloads[song_id]
+        
+        fixture = Path(self.args.fixture) if self.args.fixture else None
+        if fixture and fixture.is_dir():
+            path = fixture / f"{song_id}.json"
+            body = path.read_bytes() if path.is_file() else None
+        elif fixture:
+            body = fixture.read_bytes()
+        else:
+            body = json.dumps(self.synthetic(song_id), ensure_ascii=False).encode('utf-8')
+        
+        with self.payloads_lock:
+            self.payloads[song_id] = body
+        return body
+    
+    def synthetic(self, song_id: str) -> Dict:
+        """依歌曲 ID 產生固定的合成歌詞資料"""
+        rng = random.Random(f"{self.args.seed}:{song_id}")
+        words = []
+        t = 0.5
+        for index in range(self.args.words):
+            text = rng.choice(SYLLABLES)
+            duration = rng.uniform(0.15, 0.6)
+            # 約每 7 個單詞換行，每 48 個單詞插入段落標記
+            line_break = rng.random() < 0.15
+            if index % 48 == 0:
+                text = f"[Verse {index // 48 + 1}]\n{text}"
+            words.append({
+                'word': text + ('\n' if line_break else ' '),
+                'success': True,
+                'start_s': round(t, 3),
+                'end_s': round(t + duration, 3),
+                'p_align': round(rng.uniform(0.5, 1.0), 3),
+            })
+            t += duration + rng.uniform(0.02, 0.3)
+        
+        data = {'aligned_words': words, 'hoot_cer': 0.1, 'is_streamed': False}
+        if self.args.padding_kb:
+            # 模擬回應中體積龐大、下載工具用不到的欄位
+            count = self.args.padding_kb * 1024 // 8
+            data['waveform_data'] = [round(rng.random(), 4) for _ in range(count)]
+        return data
+    
+    def clip(self, song_id: str) -> Dict:
+        """依歌曲 ID 產生固定的歌曲中繼資料"""
+        if self.args.title is not None:
+            title = self.args.title
+        else:
+            rng = random.Random(f"{self.args.seed}:title:{song_id}")
+            title = ' '.join(rng.choice(SYLLABLES).capitalize() for _ in range(2))
+        return {'id': song_id, 'title': title, 'status': 'complete'}
+    
+    def collection(self, name: str, page: int):
+        """播放清單或創作者頁面的第 page 頁（從 1 起算），回傳 (該頁歌曲, 總數)"""
+        total = self.args.collection_size
+        start = (page - 1) * self.args.page_size
+        clips = []
+        for index in range(max(0, start), min(total, start + self.args.page_size)):
+            digest = hashlib.sha256(f"{name}:{index}".encode('utf-8')).hexdigest()
+            song_id = f"{digest[:8]}-{digest[8:12]}-{digest[12:16]}-{digest[16:20]}-{digest[20:32]}"
+            clips.append(self.clip(song_id))
+        return clips, total
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """處理模擬 API 請求"""
+    
+    server_version = 'MockSunoAPI/1.0'
+    protocol_version = 'HTTP/1.1'
+    
+    @property
+    def api(self) -> MockSunoAPI:
+        return self.server.api
+    
+    def log_message(self, format, *args):
+        if self.api.args.verbose:
+            super().log_message(format, *args)
+    
+    def send_body(self, status: int, body: bytes = b'', headers: Optional[Dict[str, str]] = None,
+                  content_type: str = 'application/json'):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        for start in range(0, len(body), WRITE_CHUNK_SIZE):
+            self.wfile.write(body[start:start + WRITE_CHUNK_SIZE])
+        return len(body)
+    
+    def send_error_json(self, status: int, detail: str, headers: Optional[Dict[str, str]] = None) -> int:
+        body = json.dumps({'detail': detail}).encode('utf-8')
+        return self.send_body(status, body, headers)
+    
+    def do_GET(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        
+        if parsed.path == STATS_PATH:
+            body = json.dumps(self.api.stats(), indent=2).encode('utf-8')
+            if 'reset' in urllib.parse.parse_qs(parsed.query, keep_blank_values=True):
+                self.api.reset_stats()
+            self.send_body(200, body)
+            return
+        
+        for pattern, handler in ((ALIGNED_LYRICS_RE, self.handle_aligned_lyrics),
+                                 (CLIP_RE, self.handle_clip),
+                                 (PLAYLIST_RE, self.handle_playlist),
+                                 (PROFILE_RE, self.handle_profile)):
+            match = pattern.match(parsed.path)
+            if match:
+                break
+        else:
+            self.send_error_json(404, 'Not Found')
+            return
+        
+        self.api.begin()
+        status, size = 500, 0
+        try:
+            status, size = self.check_request(match.group(1)) or handler(match.group(1))
+        finally:
+            self.api.end(status, size)
+    
+    def check_request(self, song_id: str):
+        """套用延遲、驗證、限流與故障注入；請求應失敗時回傳 (狀態碼, 內容大小)"""
+        args = self.api.args
+        time.sleep(self.api.delay())
+        
+        authorization = self.headers.get('Authorization', '')
+        if not authorization.startswith('Bearer ') or (
+                args.cookie and authorization != f"Bearer {args.cookie}"):
+            return 401, self.send_error_json(401, 'Unauthorized')
+        
+        if self.api.limiter:
+            retry_after = self.api.limiter.acquire()
+            if retry_after is not None:
+                headers = {'Retry-After': str(max(1, round(retry_after)))}
+                return 429, self.send_error_json(429, 'Too Many Requests', headers)
+        
+        roll = self.api.roll()
+        if roll < args.unauthorized_rate:
+            return 401, self.send_error_json(401, 'Unauthorized')
+        roll -= args.unauthorized_rate
+        if roll < args.error_rate:
+            return 500, self.send_error_json(500, 'Internal Server Error')
+        roll -= args.error_rate
+        if song_id in self.api.missing or roll < args.not_found_rate:
+            return 404, self.send_error_json(404, 'Not Found')
+        return None
+    
+    def handle_clip(self, song_id: str):
+        """回傳 (狀態碼, 內容大小)"""
+        body = json.dumps(self.api.clip(song_id), ensure_ascii=False).encode('utf-8')
+        return 200, self.send_body(200, body)
+    
+    def page_number(self) -> int:
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        try:
+            return max(1, int(query.get('page', ['1'])[0]))
+        except ValueError:
+            return 1
+    
+    def handle_playlist(self, playlist_id: str):
+        """回傳 (狀態碼, 內容大小)"""
+        page = self.page_number()
+        clips, total = self.api.collection(playlist_id, page)
+        data = {
+            'id': playlist_id,
+            'playlist_clips': [{'clip': clip, 'relative_index': index} for index, clip in enumerate(clips)],
+            'num_total_results': total,
+            'current_page': page,
+        }
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        return 200, self.send_body(200, body)
+    
+    def handle_profile(self, handle: str):
+        """回傳 (狀態碼, 內容大小)"""
+        clips, total = self.api.collection(f"@{handle}", self.page_number())
+        body = json.dumps({'handle': handle, 'clips': clips, 'num_total_clips': total},
+                          ensure_ascii=False).encode('utf-8')
+        return 200, self.send_body(200, body)
+    
+    def handle_aligned_lyrics(self, song_id: str):
+        """回傳 (狀態碼, 內容大小)"""
+        args = self.api.args
+        body = self.api.payload(song_id)
+        if body is None:
+            return 404, self.send_error_json(404, 'Not Found')
+        
+        headers = {}
+        if not args.no_etag:
+            etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                return 304, self.send_body(304, headers=headers)
+        
+        return 200, self.send_body(200, body, headers)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """建立命令列參數解析器"""
+    parser = argparse.ArgumentParser(
+        description="在本機模擬 Suno aligned_lyrics API，供下載工具做吞吐量與回歸測試"
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='監聽位址（預設 127.0.0.1）')
+    parser.add_argument('--port', type=int, default=8765, help='監聽連接埠（預設 8765）')
+    parser.add_argument('--fixture', metavar='PATH',
+                        help='回應內容：JSON 檔案（所有歌曲共用）或目錄（{歌曲ID}.json）；預設產生合成資料')
+    parser.add_argument('--words', type=int, default=300, help='合成資料的單詞數量（預設 300）')
+    parser.add_argument('--padding-kb', type=int, default=0,
+                        help='在合成資料中加入約此大小的額外欄位，模擬大型回應')
+    parser.add_argument('--latency', type=float, default=0.0, help='每個請求的延遲（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延遲的隨機抖動範圍（± 毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回傳 500 的機率（0~1）')
+    parser.add_argument('--unauthorized-rate', type=float, default=0.0, help='回傳 401 的機率（0~1）')
+    parser.add_argument('--not-found-rate', type=float, default=0.0, help='回傳 404 的機率（0~1）')
+    parser.add_argument('--missing', action='append', metavar='SONG_ID',
+                        help='一律回傳 404 的歌曲 ID，可重複使用')
+    parser.add_argument('--cookie', help='只接受此 session cookie，其餘回傳 401；預設接受任何 Bearer 權杖')
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='每秒允許的請求數，超過時回傳 429 與 Retry-After（預設不限制）')
+    parser.add_argument('--burst', type=int, default=10, help='限流的突發容量（預設 10）')
+    parser.add_argument('--no-etag', action='store_true', help='不回傳 ETag，強制下載工具比對內容雜湊')
+    parser.add_argument('--collection-size', type=int, default=100,
+                        help='每個播放清單或創作者頁面的歌曲數（預設 100）')
+    parser.add_argument('--page-size', type=int, default=20, help='分頁端點每頁的歌曲數（預設 20）')
+    parser.add_argument('--title', help='所有歌曲共用的標題，用於測試同名歌曲的檔名；預設依歌曲 ID 產生')
+    parser.add_argument('--seed', type=int, default=0, help='隨機種子，固定故障注入與合成資料')
+    parser.add_argument('--verbose', action='store_true', help='輸出每個請求的存取紀錄')
+    return parser
+
+
+def main():
+    """主程式"""
+    args = build_parser().parse_args()
+    for name in ('error_rate', 'unauthorized_rate', 'not_found_rate'):
+        if not 0 <= getattr(args, name) <= 1:
+            print(f"❌ --{name.replace('_', '-')} 必須介於 0 與 1 之間")
+            sys.exit(1)
+    if args.page_size < 1:
+        print("❌ --page-size 必須大於 0")
+        sys.exit(1)
+    
+    server = ThreadingHTTPServer((args.host, args.port), MockRequestHandler)
+    server.daemon_threads = True
+    server.api = MockSunoAPI(args)
+    
+    base = f"http://{args.host}:{server.server_address[1]}"
+    print(f"🧪 模擬 Suno API 已啟動: {base}")
+    print(f"   端點: {base}/api/gen/<歌曲ID>/aligned_lyrics/v2/、{base}/api/clip/<歌曲ID>")
+    print(f"         {base}/api/playlist/<ID>/?page=N、{base}/api/profiles/<名稱>?page=N")
+    print(f"   統計: {base}{STATS_PATH}（加上 ?reset 可歸零）")
+    print(f"   使用: SUNO_API_BASE={base} python3 suno-subtitle-downloader.py urls.txt test-cookie ./out")
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 已停止")
+    finally:
+        server.server_close()
+        print(json.dumps(server.api.stats(), ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,488 @@ import http.server
 import socketserver
 import os
 import sys
-from urllib.parse import urlparse
+import json
+import time
+import socket
+import http.client
+import signal
+import hashlib
+import threading
+import importlib.util
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+
+# 字幕轉換端點
+CONVERT_PATH = '/api/convert'
+# 請求內容上限（位元組）
+CONVERT_MAX_BODY = int(os.environ.get('CONVERT_MAX_BODY', 2 * 1024 * 1024))
+# 轉換工作的並行數與等待中的上限，超過時回傳 503
+CONVERT_WORKERS = int(os.environ.get('CONVERT_WORKERS', min(4, os.cpu_count() or 1)))
+CONVERT_MAX_PENDING = CONVERT_WORKERS * 4
+# process：以多個行程做轉換，不會與靜態檔案服務搶 GIL；thread：不支援多行程的環境使用
+CONVERT_POOL = os.environ.get('CONVERT_POOL', 'process')
+# 結果快取的項目數（以請求內容雜湊為鍵）
+CONVERT_CACHE_SIZE = int(os.environ.get('CONVERT_CACHE_SIZE', 256))
+
+CONVERT_CONTENT_TYPES = {
+    'srt': 'application/x-subrip; charset=utf-8',
+    'lrc': 'text/plain; charset=utf-8',
+    'vtt': 'text/vtt; charset=utf-8',
+}
+
+# SIGTERM 後等待進行中請求完成的最長秒數
+DRAIN_TIMEOUT = float(os.environ.get('DRAIN_TIMEOUT', 20))
+# 預熱快取時最多讀取的位元組數
+WARM_CACHE_MAX_BYTES = int(os.environ.get('WARM_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# 健康檢查路徑：不受負載卸除與連線上限影響（Railway 的 healthcheckPath）
+HEALTH_PATH = '/'
+# 單次讀寫 socket 的逾時秒數，卡住的客戶端不會一直佔住執行緒
+REQUEST_TIMEOUT = float(os.environ.get('REQUEST_TIMEOUT', 30))
+# 請求列與標頭必須在此秒數內全部送達（防止逐位元組送資料的慢速攻擊）
+HEADER_TIMEOUT = float(os.environ.get('HEADER_TIMEOUT', 10))
+# 請求內容必須在此秒數內全部送達
+BODY_TIMEOUT = float(os.environ.get('BODY_TIMEOUT', 30))
+# 請求列長度與請求列加標頭的總大小上限（位元組），超過回傳 414 / 431
+MAX_REQUEST_LINE = int(os.environ.get('MAX_REQUEST_LINE', 8 * 1024))
+MAX_HEADER_BYTES = int(os.environ.get('MAX_HEADER_BYTES', 32 * 1024))
+# 同時開啟的連線上限；另保留少量連線只服務健康檢查，再超過則在接受連線時直接回傳 503
+MAX_CONNECTIONS = int(os.environ.get('MAX_CONNECTIONS', 256))
+HEALTH_RESERVE_CONNECTIONS = int(os.environ.get('HEALTH_RESERVE_CONNECTIONS', 16))
+# 同時處理的請求數；其餘請求排隊，排隊數超過 SHED_QUEUE_DEPTH 或等待超過 QUEUE_TIMEOUT 秒時回傳 503
+MAX_ACTIVE_REQUESTS = int(os.environ.get('MAX_ACTIVE_REQUESTS', 32))
+SHED_QUEUE_DEPTH = int(os.environ.get('SHED_QUEUE_DEPTH', 64))
+QUEUE_TIMEOUT = float(os.environ.get('QUEUE_TIMEOUT', 5))
+# listen() 的待接受連線數（socketserver 預設只有 5，流量突增時 SYN 會被丟棄）
+LISTEN_BACKLOG = int(os.environ.get('LISTEN_BACKLOG', 128))
+# 負載卸除的記錄最短間隔秒數，避免突增時洗版
+SHED_LOG_INTERVAL = 5.0
+
+# 各工具建置後的靜態檔案目錄
+DIST_DIRS = [
+    'audio-visualizer-source/dist',
+    'youtube-seo-source/dist',
+    'font-effects-source/dist',
+]
+IMPORTANT_FILES = ['index.html'] + [f"{dist_dir}/index.html" for dist_dir in DIST_DIRS]
+
+SUBTITLE_MODULE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'suno-subtitle-downloader.py')
+_subtitle_module = None
+
+
+def load_subtitle_module():
+    # 與命令列工具共用同一套分段與格式化邏輯（檔名含連字號，需以路徑載入）
+    global _subtitle_module
+    if _subtitle_module is None:
+        spec = importlib.util.spec_from_file_location('suno_subtitle_downloader', SUBTITLE_MODULE_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _subtitle_module = module
+    return _subtitle_module
+
+
+def convert_aligned_words(body, fmt):
+    # 在工作池中執行：解析 aligned_words 並產生字幕文字
+    module = load_subtitle_module()
+    data = json.loads(body.decode('utf-8'))
+    words = data.get('aligned_words') if isinstance(data, dict) else data
+    if not isinstance(words, list) or not words:
+        raise ValueError('aligned_words 為空或格式不正確')
+    segments = module.build_segments([word for word in words if isinstance(word, dict)])
+    if not segments:
+        raise ValueError('無法建立字幕段落')
+    _, generator, _ = module.SUBTITLE_FORMATS[fmt]
+    return generator(segments)
+
+
+class ResultCache:
+    # 以內容雜湊為鍵的 LRU 快取，多個請求執行緒共用
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+    
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+def reset_worker_signals():
+    # 轉換行程不沿用伺服器的 SIGTERM/SIGHUP 處理
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+
+
+def worker_context():
+    # 轉換行程在第一個轉換請求時才建立，此時伺服器已在監聽；
+    # 直接 fork 會讓轉換行程繼承監聽中的 socket，SIGTERM 後關閉 socket 時連接埠仍開著，
+    # 新連線不會被拒絕而是卡在 backlog。forkserver / spawn 以新的直譯器啟動，不會繼承 socket
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class SubtitleConverter:
+    def __init__(self):
+        if CONVERT_POOL == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=CONVERT_WORKERS, mp_context=worker_context(),
+                                                initializer=reset_worker_signals)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=CONVERT_WORKERS)
+        self.slots = threading.BoundedSemaphore(CONVERT_MAX_PENDING)
+        self.cache = ResultCache(CONVERT_CACHE_SIZE)
+    
+    def convert(self, key, body, fmt):
+        # 回傳 (內容, 是否命中快取)；工作池已滿時回傳 (None, False)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached, True
+        if not self.slots.acquire(blocking=False):
+            return None, False
+        try:
+            result = self.executor.submit(convert_aligned_words, body, fmt).result()
+        finally:
+            self.slots.release()
+        self.cache.put(key, result)
+        return result, False
+    
+    def shutdown(self):
+        # 在請求排空後呼叫：取消尚未開始的工作並等待轉換行程結束，
+        # 避免結束直譯器時工作池的喚醒管道已關閉而印出 Bad file descriptor
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def check_important_files():
+    for file_path in IMPORTANT_FILES:
+        if os.path.exists(file_path):
+            print(f"✅ Found: {file_path}")
+        else:
+            print(f"❌ Missing: {file_path}")
+
+
+def scan_static_files():
+    # 列出所有 dist 目錄中的檔案（以及根目錄的 index.html）
+    files = [path for path in ['index.html'] if os.path.isfile(path)]
+    for dist_dir in DIST_DIRS:
+        for root, _, names in os.walk(dist_dir):
+            files.extend(os.path.join(root, name) for name in names)
+    return files
+
+
+def warm_static_cache(reason):
+    # 讀過一次所有靜態檔案，讓作業系統快取住，第一批請求不會遇到冷快取延遲
+    started = time.monotonic()
+    count = total = 0
+    for path in scan_static_files():
+        if total >= WARM_CACHE_MAX_BYTES:
+            break
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    total += len(chunk)
+        except OSError:
+            continue
+        count += 1
+    print(f"🔥 Cache warmed ({reason}): {count} files, {total / (1024 * 1024):.1f} MB in {time.monotonic() - started:.2f}s")
+
+
+def reload_static():
+    # SIGHUP：重新掃描 dist 目錄並預熱快取，監聽中的 socket 不受影響
+    print("🔄 Reloading static files...")
+    check_important_files()
+    warm_static_cache('reload')
+
+
+class DeadlineReader:
+    # 包住連線的 rfile：限制期間內的讀取必須在期限前完成，readline 另有總位元組上限
+    # （socket 逾時只限制單次讀取，逐位元組慢慢送的客戶端不會觸發）
+    def __init__(self, rfile, connection, timeout):
+        self.rfile = rfile
+        self.connection = connection
+        self.timeout = timeout
+        self.deadline = None
+        self.remaining = None
+    
+    def limit(self, seconds, max_bytes=None):
+        self.deadline = time.monotonic() + seconds
+        self.remaining = max_bytes
+    
+    def unlimit(self):
+        self.deadline = self.remaining = None
+        self.connection.settimeout(self.timeout)
+    
+    def _arm(self):
+        # 把 socket 逾時縮短為剩餘時間，期限已過時直接逾時
+        if self.deadline is None:
+            return
+        left = self.deadline - time.monotonic()
+        if left <= 0:
+            raise socket.timeout('deadline exceeded')
+        self.connection.settimeout(min(left, self.timeout) if self.timeout else left)
+    
+    def readline(self, size=-1):
+        self._arm()
+        if self.remaining is not None and (size < 0 or size > self.remaining + 1):
+            size = self.remaining + 1
+        line = self.rfile.readline(size)
+        if self.remaining is not None:
+            self.remaining -= len(line)
+            if self.remaining < 0:
+                # parse_request 會把 LineTooLong 轉成 431
+                raise http.client.LineTooLong('header section')
+        return line
+    
+    def read(self, size=-1):
+        if self.deadline is None or size is None or size < 0:
+            return self.rfile.read(size)
+        chunks = []
+        while size > 0:
+            self._arm()
+            chunk = self.rfile.read1(min(size, 64 * 1024))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+    
+    def __getattr__(self, name):
+        return getattr(self.rfile, name)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    # 每個連線一個執行緒，轉換請求不會阻塞靜態檔案
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = LISTEN_BACKLOG
+    
+    def __init__(self, *args, **kwargs):
+        self.active_requests = 0
+        self.idle = threading.Condition()
+        # 同時處理的請求數與排隊中的請求數
+        self.slots = threading.BoundedSemaphore(MAX_ACTIVE_REQUESTS)
+        self.waiting = 0
+        self.shed_count = 0
+        self.last_shed_log = 0.0
+        self.shed_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+    
+    def process_request(self, request, client_address):
+        # 在接受連線的執行緒中計數，關閉時不會漏掉剛接受、尚未開始處理的請求
+        with self.idle:
+            full = self.active_requests >= MAX_CONNECTIONS + HEALTH_RESERVE_CONNECTIONS
+            if not full:
+                self.active_requests += 1
+        if full:
+            # 連同保留給健康檢查的連線也用完：不開執行緒，直接回應 503 並關閉
+            self.reject_connection(request)
+            return
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self.request_finished()
+            raise
+    
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.request_finished()
+    
+    def request_finished(self):
+        with self.idle:
+            self.active_requests -= 1
+            self.idle.notify_all()
+    
+    def reject_connection(self, request):
+        self.record_shed('connection limit')
+        try:
+            request.settimeout(0)
+            request.sendall(b'HTTP/1.0 503 Service Unavailable\r\nRetry-After: 1\r\n'
+                            b'Content-Length: 0\r\nConnection: close\r\n\r\n')
+        except OSError:
+            pass
+        self.shutdown_request(request)
+    
+    def over_capacity(self):
+        # 開啟的連線已進入保留給健康檢查的部分
+        return self.active_requests > MAX_CONNECTIONS
+    
+    def admit(self):
+        # 取得處理名額；排隊過長或等待逾時回傳 False，呼叫端應回應 503
+        if self.slots.acquire(blocking=False):
+            return True
+        with self.shed_lock:
+            if self.waiting >= SHED_QUEUE_DEPTH:
+                return False
+            self.waiting += 1
+        try:
+            return self.slots.acquire(timeout=QUEUE_TIMEOUT)
+        finally:
+            with self.shed_lock:
+                self.waiting -= 1
+    
+    def release(self):
+        self.slots.release()
+    
+    def record_shed(self, reason):
+        # 每 SHED_LOG_INTERVAL 秒最多記錄一次，附上期間內卸除的請求數
+        with self.shed_lock:
+            self.shed_count += 1
+            now = time.monotonic()
+            if now - self.last_shed_log < SHED_LOG_INTERVAL:
+                return
+            count, self.shed_count = self.shed_count, 0
+            self.last_shed_log = now
+            waiting = self.waiting
+        print(f"⚠️ Shedding load ({reason}): {count} request(s) rejected, "
+              f"{self.active_requests} connections open, {waiting} queued")
+    
+    def drain(self, timeout):
+        # 等待進行中的請求完成，回傳期限到時仍未完成的數量
+        deadline = time.monotonic() + timeout
+        with self.idle:
+            while self.active_requests:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.idle.wait(remaining)
+            return self.active_requests
 
 class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    converter = None
+    # StreamRequestHandler 以此設定 socket 逾時（每次讀寫）
+    timeout = REQUEST_TIMEOUT
+    
+    def setup(self):
+        super().setup()
+        self.rfile = DeadlineReader(self.rfile, self.connection, self.timeout)
+    
+    def handle_one_request(self):
+        # 與 BaseHTTPRequestHandler 相同，另外：
+        # 請求列與標頭有總時間與大小上限；讀完標頭後才決定是否卸除（健康檢查不受影響）
+        try:
+            self.rfile.limit(HEADER_TIMEOUT, MAX_HEADER_BYTES)
+            self.raw_requestline = self.rfile.readline(MAX_REQUEST_LINE + 1)
+            if len(self.raw_requestline) > MAX_REQUEST_LINE:
+                self.requestline = ''
+                self.request_version = ''
+                self.command = ''
+                self.send_error(414)
+                return
+            if not self.raw_requestline:
+                self.close_connection = True
+                return
+            if not self.parse_request():
+                return
+            self.rfile.unlimit()
+            handler = getattr(self, 'do_' + self.command, None)
+            if handler is None:
+                self.send_error(501, f"Unsupported method ({self.command!r})")
+                return
+            if self.is_health_check():
+                handler()
+            elif self.server.over_capacity() or not self.server.admit():
+                self.shed()
+                return
+            else:
+                try:
+                    handler()
+                finally:
+                    self.server.release()
+            self.wfile.flush()
+        except socket.timeout as e:
+            self.log_error("Request timed out: %r", e)
+            self.close_connection = True
+    
+    def is_health_check(self):
+        return self.command in ('GET', 'HEAD') and urlparse(self.path).path == HEALTH_PATH
+    
+    def shed(self):
+        self.server.record_shed('queue full')
+        self.close_connection = True
+        self.send_text(503, 'Server busy, retry later', headers={'Retry-After': '1', 'Connection': 'close'})
+    
+    def send_text(self, status, text, content_type='text/plain; charset=utf-8', headers=None):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != CONVERT_PATH:
+            self.send_error(404, "Not found")
+            return
+        
+        fmt = parse_qs(url.query).get('format', ['srt'])[0].lower()
+        if fmt not in CONVERT_CONTENT_TYPES:
+            self.send_error(400, f"Unsupported format: {fmt}")
+            return
+        
+        # 限制請求大小，未提供長度的請求直接拒絕
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self.send_error(411, "Content-Length required")
+            return
+        if length < 0 or length > CONVERT_MAX_BODY:
+            self.send_error(413, "Request body too large")
+            return
+        # 內容必須在 BODY_TIMEOUT 秒內送達
+        self.rfile.limit(BODY_TIMEOUT)
+        body = self.rfile.read(length)
+        self.rfile.unlimit()
+        if len(body) < length:
+            self.close_connection = True
+            return
+        
+        key = f"{fmt}:{hashlib.sha256(body).hexdigest()}"
+        etag = f'"{key}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        
+        try:
+            result, hit = self.converter.convert(key, body, fmt)
+        except (ValueError, UnicodeDecodeError) as e:
+            # json.JSONDecodeError 也是 ValueError
+            self.send_error(400, "Invalid aligned_words", str(e))
+            return
+        except Exception as e:
+            print(f"❌ Conversion failed: {e}")
+            self.send_error(500, "Conversion failed")
+            return
+        
+        if result is None:
+            self.send_text(503, 'Converter busy, retry later', headers={'Retry-After': '1'})
+            return
+        
+        self.send_text(200, result, CONVERT_CONTENT_TYPES[fmt], {
+            'ETag': etag,
+            'X-Cache': 'HIT' if hit else 'MISS',
+        })
+    
     def do_GET(self):
         # 處理根路徑
         if self.path == '/':
@@ -50,30 +529,50 @@ def main():
     print(f"📁 Working directory: {os.getcwd()}")
     
     # 檢查重要文件是否存在
-    important_files = [
-        'index.html',
-        'audio-visualizer-source/dist/index.html',
-        'youtube-seo-source/dist/index.html',
-        'font-effects-source/dist/index.html'
-    ]
-    
-    for file_path in important_files:
-        if os.path.exists(file_path):
-            print(f"✅ Found: {file_path}")
-        else:
-            print(f"❌ Missing: {file_path}")
+    check_important_files()
+    
+    CustomHTTPRequestHandler.converter = SubtitleConverter()
     
     # 確保綁定到所有接口
     try:
-        with socketserver.TCPServer(("0.0.0.0", PORT), CustomHTTPRequestHandler) as httpd:
+        with ThreadingHTTPServer(("0.0.0.0", PORT), CustomHTTPRequestHandler) as httpd:
             print(f"🚀 Server running at http://0.0.0.0:{PORT}")
             print(f"🚀 Server running at http://localhost:{PORT}")
             print(f"🚀 Health check available at http://0.0.0.0:{PORT}/")
+            print(f"🎵 Subtitle conversion: POST {CONVERT_PATH}?format=srt|lrc|vtt ({CONVERT_WORKERS} {CONVERT_POOL} workers)")
+            print(f"🛡️ Limits: {MAX_CONNECTIONS} connections, {MAX_ACTIVE_REQUESTS} active requests, "
+                  f"queue {SHED_QUEUE_DEPTH}, header timeout {HEADER_TIMEOUT:g}s, request timeout {REQUEST_TIMEOUT:g}s")
+            
+            # SIGTERM：停止接受新連線，等待進行中的請求完成後再結束
+            # （shutdown() 會等待 serve_forever 結束，必須在其他執行緒呼叫）
+            stopping = threading.Event()
+            
+            def request_shutdown(signum, frame):
+                if not stopping.is_set():
+                    stopping.set()
+                    print("🛑 SIGTERM received, draining...")
+                    threading.Thread(target=httpd.shutdown, daemon=True).start()
+            
+            signal.signal(signal.SIGTERM, request_shutdown)
+            # SIGHUP：重新掃描並預熱快取，不關閉監聽中的 socket（Windows 沒有 SIGHUP）
+            if hasattr(signal, 'SIGHUP'):
+                signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(
+                    target=reload_static, daemon=True).start())
+            threading.Thread(target=warm_static_cache, args=('startup',), daemon=True).start()
+            
             try:
                 httpd.serve_forever()
             except KeyboardInterrupt:
                 print("\n🛑 Server stopped")
-                sys.exit(0)
+            finally:
+                httpd.socket.close()
+                remaining = httpd.drain(DRAIN_TIMEOUT)
+                if remaining:
+                    print(f"⚠️ Drain timeout after {DRAIN_TIMEOUT:g}s, {remaining} request(s) still in flight")
+                else:
+                    print("✅ All in-flight requests finished")
+                CustomHTTPRequestHandler.converter.shutdown()
+            sys.exit(0)
     except Exception as e:
         print(f"❌ Server failed to start: {e}")
         sys.exit(1)
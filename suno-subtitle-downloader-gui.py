@@ -4,13 +4,17 @@ Suno 字幕下載工具 - 圖形界面版本
 從 Suno 歌曲網址下載 SRT 和 LRC 格式字幕檔案
 """
 
+import os
 import re
 import json
+import time
+import queue
 import threading
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tkinter import ttk, messagebox, filedialog, scrolledtext
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 from datetime import datetime
 
 try:
@@ -23,18 +27,142 @@ except ImportError:
     exit(1)
 
 
+# API 位址；可用環境變數 SUNO_API_BASE 指向本機的模擬伺服器（mock-suno-api.py）
+API_BASE = os.environ.get('SUNO_API_BASE', 'https://studio-api.prod.suno.com').rstrip('/')
+
+# 主執行緒處理背景事件的間隔（毫秒）
+EVENT_POLL_INTERVAL_MS = 100
+# 每次處理的事件上限，避免大量日誌一次佔滿主執行緒
+MAX_EVENTS_PER_POLL = 5000
+# 日誌區域保留的最大行數
+MAX_LOG_LINES = 2000
+
+# 批次下載預設與最大並行數
+DEFAULT_WORKERS = 3
+MAX_WORKERS = 8
+# 每首歌曲的預設整體期限（秒），0 表示不限制
+DEFAULT_ITEM_TIMEOUT = 120
+
+# HTTP 連線與讀取逾時（秒）；讀取逾時會再依項目剩餘時間縮短
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+# 分段時每處理多少個單詞檢查一次是否已取消
+CANCEL_CHECK_INTERVAL = 256
+
+# 佇列項目狀態
+STATUS_PENDING = "等待中"
+STATUS_RUNNING = "下載中"
+STATUS_SUCCESS = "完成"
+STATUS_FAILED = "失敗"
+STATUS_CANCELLED = "已取消"
+
+
+class DownloadCancelled(Exception):
+    """下載被取消或超過期限"""
+
+
+class CancelToken:
+    """協作式取消權杖
+
+    在抓取、分段與寫入之間檢查是否應停止。可設定整體期限（秒），
+    並可掛在上層權杖之下：上層取消時，所有子權杖一併視為已取消；
+    子權杖的期限不會晚於上層權杖的期限。
+    與命令列版本（suno-subtitle-downloader.py）的 CancelToken 相同，修改時兩邊一起更新；
+    GUI 打包成獨立執行檔，不載入命令列版本的檔案。
+    """
+    
+    def __init__(self, timeout: Optional[float] = None, parent: Optional['CancelToken'] = None):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self.parent = parent
+        self.deadline = time.monotonic() + timeout if timeout else None
+        if parent is not None and parent.deadline is not None:
+            self.deadline = parent.deadline if self.deadline is None else min(self.deadline, parent.deadline)
+        self.reason = ''
+        self._detach = parent.add_callback(self.cancel) if parent is not None else None
+    
+    def cancel(self, reason: str = '已取消'):
+        """要求停止，並執行已登記的回呼（例如關閉進行中的連線）"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+    
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """登記取消時要執行的回呼，回傳可移除此回呼的函式"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                
+                def remove():
+                    with self._lock:
+                        if callback in self._callbacks:
+                            self._callbacks.remove(callback)
+                return remove
+        callback()
+        return lambda: None
+    
+    def close(self):
+        """工作結束後與上層權杖解除關聯，避免長批次累積回呼"""
+        if self._detach is not None:
+            self._detach()
+            self._detach = None
+    
+    def remaining(self) -> Optional[float]:
+        """距離期限的剩餘秒數，沒有期限時回傳 None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+    
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel('超過期限')
+            return True
+        return False
+    
+    def check(self):
+        """已取消或超過期限時拋出 DownloadCancelled"""
+        if self.cancelled:
+            raise DownloadCancelled(self.reason)
+    
+    def sleep(self, seconds: float):
+        """等待指定秒數（不超過期限）；期間被取消時立即拋出 DownloadCancelled"""
+        remaining = self.remaining()
+        self._event.wait(seconds if remaining is None else min(seconds, remaining))
+        self.check()
+
+
 class SunoSubtitleDownloaderGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Suno 字幕下載工具")
-        self.root.geometry("700x600")
+        self.root.geometry("800x780")
         self.root.resizable(True, True)
         
         # 設定樣式
         style = ttk.Style()
         style.theme_use('clam')
         
+        # 背景執行緒不可直接操作 Tk 元件，所有 UI 更新都透過此佇列交給主執行緒
+        self.events = queue.Queue()
+        
+        # 批次佇列：Treeview 項目 ID -> {'url': ..., 'status': ...}
+        self.items: Dict[str, Dict] = {}
+        self.batch_token = CancelToken()
+        
         self.setup_ui()
+        self.root.after(EVENT_POLL_INTERVAL_MS, self.process_events)
         
     def setup_ui(self):
         """建立使用者界面"""
@@ -55,13 +183,26 @@ class SunoSubtitleDownloaderGUI:
         )
         title_label.grid(row=0, column=0, columnspan=3, pady=(0, 20))
         
-        # 歌曲 URL 輸入
+        # 歌曲 URL 輸入（每行一個，可一次貼上多個）
         ttk.Label(main_frame, text="歌曲 URL:").grid(
-            row=1, column=0, sticky=tk.W, pady=5
+            row=1, column=0, sticky=(tk.W, tk.N), pady=5
         )
-        self.url_var = tk.StringVar()
-        url_entry = ttk.Entry(main_frame, textvariable=self.url_var, width=50)
-        url_entry.grid(row=1, column=1, columnspan=2, sticky=(tk.W, tk.E), pady=5)
+        self.url_text = scrolledtext.ScrolledText(
+            main_frame,
+            height=4,
+            width=50,
+            wrap=tk.NONE,
+            font=("Consolas", 9)
+        )
+        self.url_text.grid(row=1, column=1, sticky=(tk.W, tk.E), pady=5)
+        
+        load_btn = ttk.Button(
+            main_frame,
+            text="從檔案載入...",
+            command=self.load_urls_from_file,
+            width=15
+        )
+        load_btn.grid(row=1, column=2, sticky=(tk.E, tk.N), padx=(5, 0), pady=5)
         
         # Session Cookie 輸入
         ttk.Label(main_frame, text="Session Cookie:").grid(
@@ -101,14 +242,63 @@ class SunoSubtitleDownloaderGUI:
         )
         browse_btn.grid(row=3, column=2, sticky=tk.E, padx=(5, 0))
         
-        # 下載按鈕
-        self.download_btn = ttk.Button(
+        # 並行數量
+        ttk.Label(main_frame, text="並行數量:").grid(
+            row=4, column=0, sticky=tk.W, pady=5
+        )
+        self.workers_var = tk.IntVar(value=DEFAULT_WORKERS)
+        workers_spinbox = ttk.Spinbox(
             main_frame,
+            from_=1,
+            to=MAX_WORKERS,
+            textvariable=self.workers_var,
+            width=5,
+            state="readonly"
+        )
+        workers_spinbox.grid(row=4, column=1, sticky=tk.W, pady=5)
+        
+        # 單首期限
+        timeout_frame = ttk.Frame(main_frame)
+        timeout_frame.grid(row=4, column=1, columnspan=2, sticky=tk.E, pady=5)
+        ttk.Label(timeout_frame, text="單首期限（秒，0 為不限）:").grid(row=0, column=0, padx=(0, 5))
+        self.timeout_var = tk.IntVar(value=DEFAULT_ITEM_TIMEOUT)
+        timeout_spinbox = ttk.Spinbox(
+            timeout_frame,
+            from_=0,
+            to=3600,
+            increment=10,
+            textvariable=self.timeout_var,
+            width=6
+        )
+        timeout_spinbox.grid(row=0, column=1)
+        
+        # 操作按鈕
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=5, column=0, columnspan=3, pady=15)
+        
+        self.download_btn = ttk.Button(
+            button_frame,
             text="開始下載",
             command=self.start_download,
             style="Accent.TButton"
         )
-        self.download_btn.grid(row=4, column=0, columnspan=3, pady=20)
+        self.download_btn.grid(row=0, column=0, padx=5)
+        
+        self.retry_btn = ttk.Button(
+            button_frame,
+            text="重試失敗項目",
+            command=self.retry_failed,
+            state=tk.DISABLED
+        )
+        self.retry_btn.grid(row=0, column=1, padx=5)
+        
+        self.cancel_btn = ttk.Button(
+            button_frame,
+            text="取消",
+            command=self.cancel_download,
+            state=tk.DISABLED
+        )
+        self.cancel_btn.grid(row=0, column=2, padx=5)
         
         # 進度條
         self.progress_var = tk.StringVar(value="就緒")
@@ -117,25 +307,54 @@ class SunoSubtitleDownloaderGUI:
             textvariable=self.progress_var,
             font=("Arial", 10)
         )
-        progress_label.grid(row=5, column=0, columnspan=3, pady=5)
+        progress_label.grid(row=6, column=0, columnspan=3, pady=5)
         
         self.progress_bar = ttk.Progressbar(
             main_frame,
-            mode='indeterminate',
+            mode='determinate',
             length=400
         )
-        self.progress_bar.grid(row=6, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
+        self.progress_bar.grid(row=7, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
+        
+        # 下載佇列
+        queue_frame = ttk.LabelFrame(main_frame, text="下載佇列", padding="5")
+        queue_frame.grid(row=8, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
+        queue_frame.columnconfigure(0, weight=1)
+        queue_frame.rowconfigure(0, weight=1)
+        main_frame.rowconfigure(8, weight=1)
+        
+        self.queue_tree = ttk.Treeview(
+            queue_frame,
+            columns=("url", "status", "message"),
+            show="headings",
+            height=6
+        )
+        self.queue_tree.heading("url", text="歌曲 URL")
+        self.queue_tree.heading("status", text="狀態")
+        self.queue_tree.heading("message", text="訊息")
+        self.queue_tree.column("url", width=360)
+        self.queue_tree.column("status", width=80, anchor=tk.CENTER)
+        self.queue_tree.column("message", width=260)
+        self.queue_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        queue_scrollbar = ttk.Scrollbar(
+            queue_frame,
+            orient=tk.VERTICAL,
+            command=self.queue_tree.yview
+        )
+        queue_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.queue_tree.configure(yscrollcommand=queue_scrollbar.set)
         
         # 日誌區域
         log_frame = ttk.LabelFrame(main_frame, text="執行日誌", padding="5")
-        log_frame.grid(row=7, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=10)
+        log_frame.grid(row=9, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=10)
         log_frame.columnconfigure(0, weight=1)
         log_frame.rowconfigure(0, weight=1)
-        main_frame.rowconfigure(7, weight=1)
+        main_frame.rowconfigure(9, weight=1)
         
         self.log_text = scrolledtext.ScrolledText(
             log_frame,
-            height=10,
+            height=8,
             wrap=tk.WORD,
             font=("Consolas", 9)
         )
@@ -149,14 +368,14 @@ class SunoSubtitleDownloaderGUI:
             relief=tk.SUNKEN,
             anchor=tk.W
         )
-        status_bar.grid(row=8, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
+        status_bar.grid(row=10, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
         
         # 初始日誌
         self.log("歡迎使用 Suno 字幕下載工具！")
-        self.log("請輸入歌曲 URL 和 Session Cookie，然後點擊「開始下載」")
+        self.log("請輸入歌曲 URL（每行一個）和 Session Cookie，然後點擊「開始下載」")
         
     def log(self, message: str, level: str = "INFO"):
-        """記錄日誌訊息"""
+        """記錄日誌訊息（可從任何執行緒呼叫）"""
         timestamp = datetime.now().strftime("%H:%M:%S")
         prefix = {
             "INFO": "ℹ️",
@@ -166,9 +385,68 @@ class SunoSubtitleDownloaderGUI:
         }.get(level, "ℹ️")
         
         log_message = f"[{timestamp}] {prefix} {message}\n"
-        self.log_text.insert(tk.END, log_message)
+        self.post("log", log_message)
+        
+    def post(self, kind: str, *args):
+        """將 UI 事件放入佇列，由主執行緒統一處理"""
+        self.events.put((kind, args))
+        
+    def process_events(self):
+        """在主執行緒中批次處理佇列中的事件"""
+        pending_lines = []
+        try:
+            for _ in range(MAX_EVENTS_PER_POLL):
+                kind, args = self.events.get_nowait()
+                if kind == "log":
+                    pending_lines.append(args[0])
+                    continue
+                
+                # 先輸出已累積的日誌，確保訊息順序與對話框一致
+                self.flush_log(pending_lines)
+                pending_lines = []
+                self.handle_event(kind, args)
+        except queue.Empty:
+            pass
+        finally:
+            self.flush_log(pending_lines)
+            self.root.after(EVENT_POLL_INTERVAL_MS, self.process_events)
+            
+    def handle_event(self, kind: str, args: tuple):
+        """處理單一非日誌事件"""
+        if kind == "progress":
+            self.progress_var.set(args[0])
+        elif kind == "status":
+            self.status_var.set(args[0])
+        elif kind == "error":
+            messagebox.showerror(*args)
+        elif kind == "info":
+            messagebox.showinfo(*args)
+        elif kind == "item":
+            item_id, status, message = args
+            self.items[item_id]['status'] = status
+            self.queue_tree.set(item_id, "status", status)
+            self.queue_tree.set(item_id, "message", message)
+            if status in (STATUS_SUCCESS, STATUS_FAILED, STATUS_CANCELLED):
+                self.progress_bar['value'] += 1
+                self.progress_var.set(
+                    f"進度：{int(self.progress_bar['value'])}/{int(self.progress_bar['maximum'])}"
+                )
+        elif kind == "done":
+            self.set_running(False)
+            
+    def flush_log(self, lines: List[str]):
+        """一次寫入多行日誌，並限制日誌區域的總行數"""
+        if not lines:
+            return
+        
+        self.log_text.insert(tk.END, ''.join(lines))
+        
+        # 'end-1c' 位於最後一個換行之後，行號減一即為實際日誌行數
+        line_count = int(self.log_text.index('end-1c').split('.')[0]) - 1
+        if line_count > MAX_LOG_LINES:
+            self.log_text.delete('1.0', f"{line_count - MAX_LOG_LINES + 1}.0")
+        
         self.log_text.see(tk.END)
-        self.root.update_idletasks()
         
     def show_cookie_help(self):
         """顯示 Cookie 取得說明"""
@@ -195,6 +473,27 @@ class SunoSubtitleDownloaderGUI:
         
         messagebox.showinfo("如何取得 Session Cookie", help_text)
         
+    def load_urls_from_file(self):
+        """從文字檔載入 URL 清單（每行一個）"""
+        file_path = filedialog.askopenfilename(
+            title="選擇 URL 清單檔案",
+            filetypes=[("文字檔", "*.txt"), ("所有檔案", "*.*")]
+        )
+        if not file_path:
+            return
+        
+        try:
+            content = Path(file_path).read_text(encoding='utf-8')
+        except Exception as e:
+            messagebox.showerror("錯誤", f"無法讀取檔案：{e}")
+            return
+        
+        existing = self.url_text.get('1.0', tk.END).strip()
+        if existing:
+            self.url_text.insert(tk.END, '\n')
+        self.url_text.insert(tk.END, content.strip())
+        self.log(f"已從檔案載入 URL 清單: {file_path}")
+        
     def browse_output_dir(self):
         """選擇輸出目錄"""
         directory = filedialog.askdirectory(
@@ -237,7 +536,7 @@ class SunoSubtitleDownloaderGUI:
         """檢查是否只有括號內容"""
         return bool(re.match(r'^\([^)]*\)$', text.strip()))
         
-    def build_segments(self, words: List[Dict]) -> List[Dict]:
+    def build_segments(self, words: List[Dict], token: Optional[CancelToken] = None) -> List[Dict]:
         """將單詞資料轉換為字幕段落"""
         words = sorted(words, key=lambda x: x.get('start_s', 0))
         
@@ -259,7 +558,10 @@ class SunoSubtitleDownloaderGUI:
             current_start = None
             current_end = None
         
-        for word_data in words:
+        for index, word_data in enumerate(words):
+            if token is not None and index % CANCEL_CHECK_INTERVAL == 0:
+                token.check()
+            
             word = word_data.get('word')
             if not word:
                 continue
@@ -334,68 +636,126 @@ class SunoSubtitleDownloaderGUI:
         
         return '\n'.join(lines)
         
-    def download_subtitles(self):
-        """下載字幕檔案（在背景執行緒中執行）"""
-        song_url = self.url_var.get().strip()
-        session_cookie = self.cookie_var.get().strip()
-        output_dir = self.output_dir_var.get().strip()
+    def fetch_json(self, url: str, headers: Dict[str, str], token: CancelToken):
+        """發出 GET 請求並解析 JSON，回傳 (response, data)，錯誤狀態時 data 為 None
+
+        請求在輔助執行緒中進行；權杖被取消或到期時立即拋出 DownloadCancelled，
+        工作執行緒不必等待仍卡在連線上的請求。
+        """
+        token.check()
+        
+        finished = threading.Event()
+        outcome = {}
+        
+        def run():
+            try:
+                outcome['result'] = self.fetch_json_blocking(url, headers, token)
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                finished.set()
+        
+        remove_callback = token.add_callback(finished.set)
+        try:
+            threading.Thread(target=run, daemon=True).start()
+            finished.wait(token.remaining())
+        finally:
+            remove_callback()
         
-        # 驗證輸入
-        if not song_url:
-            self.log("錯誤：請輸入歌曲 URL", "ERROR")
-            messagebox.showerror("錯誤", "請輸入歌曲 URL")
-            self.download_btn.config(state=tk.NORMAL)
-            self.progress_bar.stop()
-            return
+        token.check()
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+        
+    def fetch_json_blocking(self, url: str, headers: Dict[str, str], token: CancelToken):
+        """以串流方式發出 GET 請求並解析 JSON
+
+        讀取逾時會依權杖剩餘時間縮短；權杖被取消時會關閉連線並停止讀取。
+        """
+        connect_timeout, read_timeout = CONNECT_TIMEOUT, READ_TIMEOUT
+        remaining = token.remaining()
+        if remaining is not None:
+            connect_timeout = max(0.1, min(connect_timeout, remaining))
+            read_timeout = max(0.1, min(read_timeout, remaining))
+        
+        try:
+            response = requests.get(
+                url,
+                headers=headers,
+                timeout=(connect_timeout, read_timeout),
+                stream=True
+            )
+        except requests.exceptions.RequestException:
+            # 因期限縮短的逾時視為取消
+            token.check()
+            raise
+        remove_callback = token.add_callback(response.close)
+        try:
+            if not response.ok:
+                response.close()
+                return response, None
             
-        if not session_cookie:
-            self.log("錯誤：請輸入 Session Cookie", "ERROR")
-            messagebox.showerror("錯誤", "請輸入 Session Cookie")
-            self.download_btn.config(state=tk.NORMAL)
-            self.progress_bar.stop()
-            return
+            chunks = []
+            for chunk in response.iter_content(chunk_size=65536):
+                token.check()
+                chunks.append(chunk)
+            token.check()
+            
+            return response, json.loads(b''.join(chunks).decode(response.encoding or 'utf-8'))
+        except requests.exceptions.RequestException:
+            # 權杖關閉連線造成的錯誤視為取消
+            token.check()
+            raise
+        finally:
+            remove_callback()
         
+    def write_outputs(self, files: Dict[Path, str], token: CancelToken):
+        """先寫成 .part 暫存檔，確認未取消後才一次改名；取消或失敗時清除暫存檔"""
+        parts = []
+        try:
+            for path, content in files.items():
+                token.check()
+                part_path = path.with_name(path.name + '.part')
+                parts.append(part_path)
+                part_path.write_text(content, encoding='utf-8')
+            
+            token.check()
+            for path in files:
+                os.replace(path.with_name(path.name + '.part'), path)
+        except BaseException:
+            for part_path in parts:
+                try:
+                    part_path.unlink()
+                except FileNotFoundError:
+                    pass
+            raise
+        
+    def download_subtitles(self, song_url: str, session_cookie: str, output_path: Path,
+                           token: CancelToken) -> Tuple[bool, str]:
+        """下載單一歌曲的字幕檔案（在背景執行緒中執行），回傳 (是否成功, 訊息)
+
+        取消或超過期限時拋出 DownloadCancelled。
+        """
         # 提取歌曲 ID
         song_id = self.extract_song_id(song_url)
         if not song_id:
-            self.log(f"錯誤：無法從 URL 中提取歌曲 ID", "ERROR")
-            messagebox.showerror(
-                "錯誤",
-                "無法從 URL 中提取歌曲 ID\n\n請確認 URL 格式為：https://suno.com/song/[歌曲ID]"
-            )
-            self.download_btn.config(state=tk.NORMAL)
-            self.progress_bar.stop()
-            return
+            self.log(f"錯誤：無法從 URL 中提取歌曲 ID: {song_url}", "ERROR")
+            return False, "無法從 URL 中提取歌曲 ID"
         
-        self.log(f"歌曲 ID: {song_id}", "INFO")
-        
-        # 設定輸出目錄
-        output_path = Path(output_dir) if output_dir else Path.cwd()
-        try:
-            output_path.mkdir(parents=True, exist_ok=True)
-        except Exception as e:
-            self.log(f"錯誤：無法建立輸出目錄 - {e}", "ERROR")
-            messagebox.showerror("錯誤", f"無法建立輸出目錄：{e}")
-            self.download_btn.config(state=tk.NORMAL)
-            self.progress_bar.stop()
-            return
+        self.log(f"[{song_id}] 正在請求字幕資料...", "INFO")
         
         # 準備 API 請求
-        api_url = f"https://studio-api.prod.suno.com/api/gen/{song_id}/aligned_lyrics/v2/"
+        api_url = f"{API_BASE}/api/gen/{song_id}/aligned_lyrics/v2/"
         headers = {
             'Authorization': f'Bearer {session_cookie}',
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
         
-        self.log("正在請求字幕資料...", "INFO")
-        self.progress_var.set("正在連接 API...")
-        
         try:
-            response = requests.get(api_url, headers=headers, timeout=30)
+            response, data = self.fetch_json(api_url, headers, token)
             
-            if not response.ok:
+            if data is None:
                 error_msg = f"API 回傳錯誤狀態碼: {response.status_code}"
-                self.log(error_msg, "ERROR")
                 
                 if response.status_code == 401:
                     detail = "請確認 session cookie 是否有效，建議重新登入 Suno 後取得新的 cookie"
@@ -404,94 +764,249 @@ class SunoSubtitleDownloaderGUI:
                 else:
                     detail = f"HTTP {response.status_code}"
                 
-                messagebox.showerror("錯誤", f"{error_msg}\n\n{detail}")
-                self.download_btn.config(state=tk.NORMAL)
-                self.progress_bar.stop()
-                return
+                self.log(f"[{song_id}] {error_msg}（{detail}）", "ERROR")
+                return False, error_msg
             
-            data = response.json()
             words = data.get('aligned_words', [])
             
             if not isinstance(words, list) or not words:
-                self.log("錯誤：該歌曲沒有字幕資料", "ERROR")
-                messagebox.showerror("錯誤", "該歌曲沒有字幕資料（aligned_words 為空）")
-                self.download_btn.config(state=tk.NORMAL)
-                self.progress_bar.stop()
-                return
+                self.log(f"[{song_id}] 錯誤：該歌曲沒有字幕資料", "ERROR")
+                return False, "該歌曲沒有字幕資料（aligned_words 為空）"
             
-            self.log(f"成功取得 {len(words)} 個單詞資料", "SUCCESS")
-            self.progress_var.set("正在處理字幕資料...")
+            self.log(f"[{song_id}] 成功取得 {len(words)} 個單詞資料", "SUCCESS")
             
             # 建立字幕段落
-            segments = self.build_segments(words)
+            segments = self.build_segments(words, token)
             if not segments:
-                self.log("錯誤：無法建立字幕段落", "ERROR")
-                messagebox.showerror("錯誤", "無法建立字幕段落")
-                self.download_btn.config(state=tk.NORMAL)
-                self.progress_bar.stop()
-                return
+                self.log(f"[{song_id}] 錯誤：無法建立字幕段落", "ERROR")
+                return False, "無法建立字幕段落"
             
-            self.log(f"已建立 {len(segments)} 個字幕段落", "SUCCESS")
-            self.progress_var.set("正在生成檔案...")
+            self.log(f"[{song_id}] 已建立 {len(segments)} 個字幕段落", "SUCCESS")
             
             # 生成檔案名稱
             filename = self.get_safe_filename('', song_id)
             
-            # 生成 SRT
-            srt_content = self.generate_srt(segments)
+            # 生成 SRT 與 LRC
             srt_path = output_path / f"{filename}.srt"
-            srt_path.write_text(srt_content, encoding='utf-8')
-            self.log(f"已儲存 SRT: {srt_path}", "SUCCESS")
-            
-            # 生成 LRC
-            lrc_content = self.generate_lrc(segments)
             lrc_path = output_path / f"{filename}.lrc"
-            lrc_path.write_text(lrc_content, encoding='utf-8')
-            self.log(f"已儲存 LRC: {lrc_path}", "SUCCESS")
+            self.write_outputs({
+                srt_path: self.generate_srt(segments),
+                lrc_path: self.generate_lrc(segments),
+            }, token)
+            self.log(f"[{song_id}] 已儲存 SRT: {srt_path}", "SUCCESS")
+            self.log(f"[{song_id}] 已儲存 LRC: {lrc_path}", "SUCCESS")
             
-            self.progress_var.set("下載完成！")
-            self.status_var.set(f"成功下載到: {output_path}")
-            
-            messagebox.showinfo(
-                "下載完成",
-                f"✅ 字幕檔案已成功下載！\n\n"
-                f"SRT: {srt_path.name}\n"
-                f"LRC: {lrc_path.name}\n\n"
-                f"儲存位置: {output_path}"
-            )
+            return True, f"{srt_path.name}, {lrc_path.name}"
             
+        except DownloadCancelled as e:
+            self.log(f"[{song_id}] 已停止：{e}", "WARNING")
+            raise
         except requests.exceptions.RequestException as e:
             error_msg = f"網路請求錯誤: {e}"
-            self.log(error_msg, "ERROR")
-            messagebox.showerror("錯誤", error_msg)
         except json.JSONDecodeError as e:
             error_msg = f"JSON 解析錯誤: {e}"
-            self.log(error_msg, "ERROR")
-            messagebox.showerror("錯誤", error_msg)
         except Exception as e:
             error_msg = f"發生錯誤: {e}"
-            self.log(error_msg, "ERROR")
-            messagebox.showerror("錯誤", error_msg)
-        finally:
-            self.download_btn.config(state=tk.NORMAL)
-            self.progress_bar.stop()
+        
+        self.log(f"[{song_id}] {error_msg}", "ERROR")
+        return False, error_msg
+        
+    def process_item(self, item_id: str, song_url: str, session_cookie: str,
+                     output_path: Path, timeout: Optional[float], batch_token: CancelToken) -> str:
+        """處理佇列中的單一項目（在工作執行緒中執行），回傳最終狀態
+
+        每個項目有自己的期限（從開始執行時起算），逾時只會讓該項目失敗。
+        """
+        token = CancelToken(timeout, batch_token)
+        try:
+            if batch_token.cancelled:
+                self.post("item", item_id, STATUS_CANCELLED, "")
+                return STATUS_CANCELLED
             
-    def start_download(self):
-        """開始下載（在背景執行緒中執行）"""
-        self.download_btn.config(state=tk.DISABLED)
-        self.progress_bar.start(10)
-        self.progress_var.set("準備中...")
+            self.post("item", item_id, STATUS_RUNNING, "")
+            try:
+                ok, message = self.download_subtitles(song_url, session_cookie, output_path, token)
+            except DownloadCancelled as e:
+                status = STATUS_CANCELLED if batch_token.cancelled else STATUS_FAILED
+                self.post("item", item_id, status, str(e))
+                return status
+            
+            status = STATUS_SUCCESS if ok else STATUS_FAILED
+            self.post("item", item_id, status, message)
+            return status
+        finally:
+            token.close()
+        
+    def process_batch(self, jobs: List[Tuple[str, str]], session_cookie: str,
+                      output_dir: str, workers: int, timeout: Optional[float],
+                      batch_token: CancelToken):
+        """以工作執行緒池處理整個批次（在背景執行緒中執行）"""
+        output_path = Path(output_dir) if output_dir else Path.cwd()
+        try:
+            output_path.mkdir(parents=True, exist_ok=True)
+        except Exception as e:
+            self.log(f"錯誤：無法建立輸出目錄 - {e}", "ERROR")
+            for item_id, _ in jobs:
+                self.post("item", item_id, STATUS_FAILED, "無法建立輸出目錄")
+            self.post("error", "錯誤", f"無法建立輸出目錄：{e}")
+            self.post("done")
+            return
+        
+        self.log(f"開始批次下載 {len(jobs)} 首歌曲（並行數量 {workers}）")
+        
+        counts = {STATUS_SUCCESS: 0, STATUS_FAILED: 0, STATUS_CANCELLED: 0}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    self.process_item, item_id, song_url,
+                    session_cookie, output_path, timeout, batch_token
+                )
+                for item_id, song_url in jobs
+            ]
+            for future in as_completed(futures):
+                counts[future.result()] += 1
+        
+        summary = (
+            f"成功 {counts[STATUS_SUCCESS]}、失敗 {counts[STATUS_FAILED]}、"
+            f"取消 {counts[STATUS_CANCELLED]}"
+        )
+        self.log(f"批次下載結束：{summary}", "SUCCESS" if counts[STATUS_SUCCESS] == len(jobs) else "WARNING")
+        self.post("status", f"{summary}，儲存位置: {output_path}")
+        
+        if counts[STATUS_SUCCESS] == len(jobs):
+            self.post(
+                "info",
+                "下載完成",
+                f"✅ 字幕檔案已成功下載！\n\n"
+                f"共 {len(jobs)} 首歌曲\n\n"
+                f"儲存位置: {output_path}"
+            )
+        elif not batch_token.cancelled:
+            self.post(
+                "error",
+                "部分下載失敗",
+                f"{summary}\n\n可以點擊「重試失敗項目」重新下載失敗的歌曲"
+            )
+        self.post("done")
+        
+    def get_urls(self) -> List[str]:
+        """取得輸入框中的 URL 清單（忽略空行與 # 註解）"""
+        urls = []
+        for line in self.url_text.get('1.0', tk.END).splitlines():
+            line = line.strip()
+            if line and not line.startswith('#'):
+                urls.append(line)
+        return urls
+        
+    def set_running(self, running: bool):
+        """切換下載中 / 閒置時的按鈕狀態"""
+        self.download_btn.config(state=tk.DISABLED if running else tk.NORMAL)
+        self.cancel_btn.config(state=tk.NORMAL if running else tk.DISABLED)
+        
+        has_failed = any(
+            item['status'] in (STATUS_FAILED, STATUS_CANCELLED)
+            for item in self.items.values()
+        )
+        self.retry_btn.config(
+            state=tk.NORMAL if not running and has_failed else tk.DISABLED
+        )
+        
+    def run_batch(self, item_ids: List[str]):
+        """在背景執行緒中執行指定的佇列項目"""
+        # Tk 變數只在主執行緒讀取，再交給背景執行緒
+        session_cookie = self.cookie_var.get().strip()
+        output_dir = self.output_dir_var.get().strip()
+        workers = max(1, min(MAX_WORKERS, self.workers_var.get()))
+        try:
+            timeout = max(0, int(self.timeout_var.get())) or None
+        except (tk.TclError, ValueError):
+            timeout = DEFAULT_ITEM_TIMEOUT
+        
+        if not session_cookie:
+            self.log("錯誤：請輸入 Session Cookie", "ERROR")
+            messagebox.showerror("錯誤", "請輸入 Session Cookie")
+            return
+        
+        jobs = []
+        for item_id in item_ids:
+            self.items[item_id]['status'] = STATUS_PENDING
+            self.queue_tree.set(item_id, "status", STATUS_PENDING)
+            self.queue_tree.set(item_id, "message", "")
+            jobs.append((item_id, self.items[item_id]['url']))
+        
+        self.batch_token = CancelToken()
+        self.set_running(True)
+        self.progress_bar.config(maximum=len(jobs), value=0)
+        self.progress_var.set(f"進度：0/{len(jobs)}")
         self.status_var.set("正在下載...")
         
-        # 在背景執行緒中執行下載
-        thread = threading.Thread(target=self.download_subtitles, daemon=True)
+        thread = threading.Thread(
+            target=self.process_batch,
+            args=(jobs, session_cookie, output_dir, workers, timeout, self.batch_token),
+            daemon=True
+        )
         thread.start()
+            
+    def start_download(self):
+        """以輸入框中的 URL 建立新的下載佇列並開始下載"""
+        urls = self.get_urls()
+        if not urls:
+            self.log("錯誤：請輸入歌曲 URL", "ERROR")
+            messagebox.showerror("錯誤", "請輸入歌曲 URL")
+            return
+        
+        if not self.cookie_var.get().strip():
+            self.log("錯誤：請輸入 Session Cookie", "ERROR")
+            messagebox.showerror("錯誤", "請輸入 Session Cookie")
+            return
+        
+        # 重建佇列
+        self.queue_tree.delete(*self.queue_tree.get_children())
+        self.items.clear()
+        for song_url in urls:
+            item_id = self.queue_tree.insert("", tk.END, values=(song_url, STATUS_PENDING, ""))
+            self.items[item_id] = {'url': song_url, 'status': STATUS_PENDING}
+        
+        self.run_batch(list(self.items))
+        
+    def retry_failed(self):
+        """重新下載失敗或已取消的項目"""
+        item_ids = [
+            item_id for item_id, item in self.items.items()
+            if item['status'] in (STATUS_FAILED, STATUS_CANCELLED)
+        ]
+        if not item_ids:
+            return
+        
+        self.log(f"重試 {len(item_ids)} 個項目")
+        self.run_batch(item_ids)
+        
+    def cancel_download(self):
+        """取消整個批次，包含正在下載的項目"""
+        self.batch_token.cancel()
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.log("正在取消，進行中的項目會停止並清除未完成的檔案...", "WARNING")
+        self.status_var.set("正在取消...")
+
+
+# 打包腳本的啟動時間測試：設定此環境變數時，第一個視窗畫出後把時間寫入指定檔案並結束
+STARTUP_PROBE_ENV = 'SUNO_STARTUP_PROBE'
 
 
 def main():
     """主程式"""
     root = tk.Tk()
     app = SunoSubtitleDownloaderGUI(root)
+    
+    probe_path = os.environ.get(STARTUP_PROBE_ENV)
+    if probe_path:
+        def report_startup():
+            root.wait_visibility(root)
+            root.update_idletasks()
+            Path(probe_path).write_text(repr(time.time()), encoding='utf-8')
+            root.destroy()
+        root.after(0, report_startup)
+    
     root.mainloop()
 
 
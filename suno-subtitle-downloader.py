@@ -4,12 +4,39 @@ Suno 字幕下載工具
 從 Suno 歌曲網址下載 SRT 和 LRC 格式字幕檔案
 """
 
+import os
 import re
 import sys
+import math
+import bisect
+import codecs
+import io
+import itertools
 import json
+import time
+import hashlib
+import signal
+import struct
+import zlib
+import tarfile
+import zipfile
+import multiprocessing
+import sqlite3
+import argparse
+import queue
+import threading
 import urllib.parse
+import ctypes
+import ctypes.util
+import select
+import collections
+import http.cookiejar
+import http.server
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple
 
 try:
     import requests
@@ -19,20 +46,407 @@ except ImportError:
     sys.exit(1)
 
 
+# API 位址；可用環境變數 SUNO_API_BASE 或 --api-base 指向本機的模擬伺服器（mock-suno-api.py）
+DEFAULT_API_BASE = 'https://studio-api.prod.suno.com'
+API_BASE = os.environ.get('SUNO_API_BASE', DEFAULT_API_BASE).rstrip('/')
+
+# 工具版本；寫入同步清單，版本變更時會重新產生所有字幕
+TOOL_VERSION = '1.1.0'
+# 輸出目錄中的同步清單檔名
+MANIFEST_NAME = '.suno-manifest.json'
+# 內容定址儲存（--dedup）的物件目錄，位於輸出目錄下
+OBJECTS_DIR_NAME = '.objects'
+# 每記錄多少首歌曲就把同步清單寫回磁碟一次
+MANIFEST_SAVE_INTERVAL = 50
+
+# 歌曲標題快取檔；可用環境變數 SUNO_METADATA_CACHE 指定，預設位於使用者快取目錄
+METADATA_CACHE_PATH = Path(
+    os.environ.get('SUNO_METADATA_CACHE') or
+    Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'suno-subtitle-downloader' / 'metadata.json'
+)
+# 標題快取每新增多少筆就寫回磁碟一次
+METADATA_SAVE_INTERVAL = 50
+# 字幕已取得後，最多再等待歌曲標題多少秒（標題只影響檔名）
+TITLE_WAIT_SECONDS = 10.0
+
+# SQLite 字幕庫每累積多少首歌曲提交一次交易
+STORE_BATCH_SIZE = 50
+
+# 工作日誌每累積多少筆記錄或經過多少秒就 fsync 一次
+JOURNAL_SYNC_RECORDS = 32
+JOURNAL_SYNC_SECONDS = 1.0
+
+# 封存檔索引每累積多少首歌曲 fsync 一次
+ARCHIVE_SYNC_SONGS = 64
+
+# HTTP 連線與讀取逾時（秒）；讀取逾時會再依工作剩餘時間縮短
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+# 共用連線池的最小大小；應涵蓋同時進行的請求數，否則多出的連線用完即丟
+HTTP_POOL_SIZE = 32
+# 分段時每處理多少個單詞檢查一次是否已取消
+CANCEL_CHECK_INTERVAL = 256
+
+# 列舉播放清單或創作者頁面時同時請求的頁數、每秒請求上限與遇到 429/5xx 的重試次數
+PAGE_WORKERS = 4
+PAGE_RATE_LIMIT = 5.0
+PAGE_RETRIES = 3
+
+# 分段管線（--pipeline）：分段行程數、寫入執行緒數與各階段之間的佇列長度
+PIPELINE_CPU_WORKERS = os.cpu_count() or 2
+PIPELINE_WRITE_WORKERS = 2
+PIPELINE_QUEUE_SIZE = 32
+
+# retime 檔案數少於此值時直接在目前行程處理，省去啟動行程池的成本
+RETIME_PARALLEL_MIN_FILES = 16
+
+
+class DownloadCancelled(Exception):
+    """下載被取消或超過期限"""
+
+
+class CancelToken:
+    """協作式取消權杖
+
+    在抓取、分段與寫入之間檢查是否應停止。可設定整體期限（秒），
+    並可掛在上層權杖之下：上層取消時，所有子權杖一併視為已取消；
+    子權杖的期限不會晚於上層權杖的期限。
+    GUI 版本有相同的實作（GUI 打包成獨立執行檔），修改時兩邊一起更新。
+    """
+    
+    def __init__(self, timeout: Optional[float] = None, parent: Optional['CancelToken'] = None):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self.parent = parent
+        self.deadline = time.monotonic() + timeout if timeout else None
+        if parent is not None and parent.deadline is not None:
+            self.deadline = parent.deadline if self.deadline is None else min(self.deadline, parent.deadline)
+        self.reason = ''
+        self._detach = parent.add_callback(self.cancel) if parent is not None else None
+    
+    def cancel(self, reason: str = '已取消'):
+        """要求停止，並執行已登記的回呼（例如關閉進行中的連線）"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+    
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """登記取消時要執行的回呼，回傳可移除此回呼的函式"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                
+                def remove():
+                    with self._lock:
+                        if callback in self._callbacks:
+                            self._callbacks.remove(callback)
+                return remove
+        callback()
+        return lambda: None
+    
+    def close(self):
+        """工作結束後與上層權杖解除關聯，避免長批次累積回呼"""
+        if self._detach is not None:
+            self._detach()
+            self._detach = None
+    
+    def remaining(self) -> Optional[float]:
+        """距離期限的剩餘秒數，沒有期限時回傳 None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+    
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel('超過期限')
+            return True
+        return False
+    
+    def check(self):
+        """已取消或超過期限時拋出 DownloadCancelled"""
+        if self.cancelled:
+            raise DownloadCancelled(self.reason)
+    
+    def sleep(self, seconds: float):
+        """等待指定秒數（不超過期限）；期間被取消時立即拋出 DownloadCancelled"""
+        remaining = self.remaining()
+        self._event.wait(seconds if remaining is None else min(seconds, remaining))
+        self.check()
+
+
+class RateLimiter:
+    """權杖桶限流：每秒最多 rate 個請求，最多累積 burst 個；可在多個執行緒間共用"""
+    
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, token: CancelToken):
+        """等到可以發出下一個請求；等待期間可被權杖中斷"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            token.sleep(delay)
+
+
+def sha256_text(content: str) -> str:
+    """計算字串（UTF-8）的 SHA-256"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class Manifest:
+    """輸出目錄中的同步清單
+
+    記錄每首歌曲的 ETag、API 回應內容雜湊、工具版本與輸出檔案雜湊。
+    重新執行時用來發出條件式請求，或比對雜湊後略過沒有變更的歌曲。
+    另外記錄每首歌曲在此目錄使用的檔名，確保重新執行時檔名不變。
+    可在多個工作執行緒間共用。
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.songs: Dict[str, Dict] = {}
+        self.filenames: Dict[str, str] = {}
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+            if isinstance(data.get('songs'), dict):
+                self.songs = data['songs']
+            if isinstance(data.get('filenames'), dict):
+                self.filenames = data['filenames']
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError):
+            print(f"⚠️ 同步清單格式錯誤，將重新建立: {path}")
+        # 以 casefold 比對，避免在不分大小寫的檔案系統（macOS、Windows）上互相覆寫
+        self._claimed = {stem.casefold() for stem in self.filenames.values()}
+    
+    @classmethod
+    def for_dir(cls, output_path: Path) -> 'Manifest':
+        return cls(output_path / MANIFEST_NAME)
+    
+    def claimed_filename(self, song_id: str) -> Optional[str]:
+        """歌曲在此目錄已使用的檔名（不含副檔名），尚未指定時回傳 None"""
+        with self._lock:
+            return self.filenames.get(song_id)
+    
+    def claim_filename(self, song_id: str, title: str) -> str:
+        """為歌曲指定此目錄中不與其他歌曲重複的檔名（不含副檔名）
+
+        先指定的歌曲使用標題本身，標題相同的其他歌曲加上歌曲 ID 前 8 碼
+        （仍重複時使用完整 ID）。檔名一經指定即固定，重新執行不會因處理順序而改名。
+        """
+        with self._lock:
+            stem = self.filenames.get(song_id)
+            if stem is not None:
+                return stem
+            base = get_safe_filename(title, song_id)
+            for stem in (base, f"{base} ({song_id[:8]})", f"{base} ({song_id})"):
+                if stem.casefold() not in self._claimed:
+                    break
+            self.filenames[song_id] = stem
+            self._claimed.add(stem.casefold())
+            self._unsaved += 1
+            return stem
+    
+    def get(self, song_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self.songs.get(song_id)
+            return dict(entry) if entry else None
+    
+    def outputs_intact(self, song_id: str, output_path: Path, names: List[str]) -> bool:
+        """上次的輸出檔案是否都還在且內容未被修改，並由目前版本的工具產生"""
+        entry = self.get(song_id)
+        if not entry or entry.get('tool_version') != TOOL_VERSION:
+            return False
+        
+        outputs = entry.get('outputs') or {}
+        if sorted(outputs) != sorted(names):
+            return False
+        
+        for name, digest in outputs.items():
+            # 以 --dedup 寫出的檔案是物件的硬連結，比對 inode 即可，不必讀取內容
+            try:
+                if os.path.samefile(output_path / name, object_path(output_path / OBJECTS_DIR_NAME, digest)):
+                    continue
+            except OSError:
+                pass
+            try:
+                content = (output_path / name).read_bytes()
+            except OSError:
+                return False
+            if hashlib.sha256(content).hexdigest() != digest:
+                return False
+        return True
+    
+    def record(self, song_id: str, etag: Optional[str], content_hash: str, outputs: Dict[str, str]):
+        """記錄一首歌曲的同步狀態，累積一定數量後寫回磁碟"""
+        with self._lock:
+            self.songs[song_id] = {
+                'etag': etag,
+                'content_hash': content_hash,
+                'tool_version': TOOL_VERSION,
+                'outputs': outputs,
+                'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            }
+            self._unsaved += 1
+            should_save = self._unsaved >= MANIFEST_SAVE_INTERVAL
+        if should_save:
+            self.save()
+    
+    def save(self):
+        """以暫存檔加改名的方式寫回，避免中途中斷留下損壞的清單"""
+        with self._lock:
+            if not self._unsaved:
+                return
+            content = json.dumps(
+                {'tool_version': TOOL_VERSION, 'songs': self.songs, 'filenames': self.filenames},
+                ensure_ascii=False, indent=1, sort_keys=True
+            )
+            self._unsaved = 0
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            tmp_path.write_text(content, encoding='utf-8')
+            os.replace(tmp_path, self.path)
+
+
+class MetadataCache:
+    """歌曲標題的持久快取
+
+    存於使用者快取目錄（見 METADATA_CACHE_PATH），跨輸出目錄與多次執行共用，
+    已知標題的歌曲不必再向 API 查詢。可在多個工作執行緒間共用。
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.songs: Dict[str, Dict] = self._load()
+    
+    @classmethod
+    def default(cls) -> 'MetadataCache':
+        return cls(METADATA_CACHE_PATH)
+    
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+            if isinstance(data.get('songs'), dict):
+                return data['songs']
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError, OSError):
+            print(f"⚠️ 標題快取無法讀取，將重新建立: {self.path}")
+        return {}
+    
+    def get_title(self, song_id: str) -> Optional[str]:
+        """快取中的標題；沒有記錄時回傳 None（空字串表示歌曲沒有標題）"""
+        with self._lock:
+            entry = self.songs.get(song_id)
+        if isinstance(entry, dict) and isinstance(entry.get('title'), str):
+            return entry['title']
+        return None
+    
+    def put(self, song_id: str, title: str):
+        """記錄一首歌曲的標題，累積一定數量後寫回磁碟"""
+        with self._lock:
+            self.songs[song_id] = {
+                'title': title,
+                'fetched_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            }
+            self._unsaved += 1
+            should_save = self._unsaved >= METADATA_SAVE_INTERVAL
+        if should_save:
+            self.save()
+    
+    def save(self):
+        """併入磁碟上其他行程新增的記錄後，以暫存檔加改名的方式寫回"""
+        with self._lock:
+            if not self._unsaved:
+                return
+            self._unsaved = 0
+            songs = self._load()
+            songs.update(self.songs)
+            self.songs = songs
+            content = json.dumps({'songs': songs}, ensure_ascii=False, sort_keys=True)
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                tmp_path.write_text(content, encoding='utf-8')
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                # 快取只影響效能，寫入失敗不應中斷下載
+                print(f"⚠️ 無法寫入標題快取: {e}")
+
+
+SONG_URL_RE = re.compile(r'suno\.(?:com|ai)/song/([^/?#&\s]+)', re.I)
+UUID_RE = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.I)
+
+
 def extract_song_id(url: str) -> Optional[str]:
-    """從 Suno URL 中提取歌曲 ID"""
-    # 支援多種 URL 格式
-    patterns = [
-        r'suno\.com/song/([a-zA-Z0-9_-]+)',
-        r'suno\.com/song/([^/?]+)',
-    ]
+    """從 Suno URL 中提取歌曲 ID
+
+    網域與路徑不分大小寫（含 www. 等子網域與舊的 suno.ai），忽略查詢字串、
+    片段與 ID 之後的路徑。UUID 格式的 ID 轉成小寫：UUID 不分大小寫，
+    同一首歌曲不會因網址大小寫不同而被當成兩首。
+    """
+    match = SONG_URL_RE.search(url.strip())
+    if not match:
+        return None
+    song_id = urllib.parse.unquote(match.group(1))
+    if UUID_RE.fullmatch(song_id):
+        return song_id.lower()
+    return song_id
+
+
+def canonical_song_url(song_id: str) -> str:
+    """歌曲的標準網址"""
+    return f"https://suno.com/song/{song_id}"
+
+
+class UniqueSongs:
+    """正規化歌曲網址並依歌曲 ID 去除重複
+
+    依序產生每首歌曲第一次出現時的標準網址（見 canonical_song_url），之後的重複項目略過，
+    數量記在 duplicates。無法提取 ID 的網址原樣產生，由下載時回報錯誤。
+    """
     
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
+    def __init__(self, song_urls: Iterable[str]):
+        self.song_urls = song_urls
+        self.seen = set()
+        self.duplicates = 0
     
-    return None
+    def __iter__(self) -> Iterator[str]:
+        for url in self.song_urls:
+            song_id = extract_song_id(url)
+            if song_id is None:
+                yield url
+                continue
+            if song_id in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(song_id)
+            yield canonical_song_url(song_id)
 
 
 def get_safe_filename(title: str, song_id: str) -> str:
@@ -58,30 +472,94 @@ def is_paren_only(text: str) -> bool:
     return bool(re.match(r'^\([^)]*\)$', text.strip()))
 
 
-def build_segments(words: List[Dict]) -> List[Dict]:
-    """將單詞資料轉換為字幕段落"""
-    # 按開始時間排序
-    words = sorted(words, key=lambda x: x.get('start_s', 0))
+class WordTimings:
+    """逐字時間的欄式儲存
+
+    starts / ends 為 array('d')，texts 為對應的文字；第 i 個字幕段落包含
+    line_offsets[i] 到 line_offsets[i + 1] 之間的單詞。由 build_segments
+    在建立段落的同一次走訪中填入，不必重新解析 API 回應。
+    """
     
-    segments = []
+    __slots__ = ('starts', 'ends', 'texts', 'line_offsets')
+    
+    def __init__(self):
+        self.starts = array('d')
+        self.ends = array('d')
+        self.texts: List[str] = []
+        self.line_offsets = array('I', [0])
+    
+    def __len__(self) -> int:
+        return len(self.texts)
+    
+    def append(self, start: float, end: float, text: str):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.texts.append(text)
+    
+    def close_line(self):
+        self.line_offsets.append(len(self.texts))
+    
+    def discard_open_line(self):
+        """捨棄尚未結束段落中的單詞"""
+        keep = self.line_offsets[-1]
+        del self.starts[keep:]
+        del self.ends[keep:]
+        del self.texts[keep:]
+    
+    def line(self, index: int) -> List[Tuple[float, float, str]]:
+        """第 index 個段落的 (start, end, text) 清單"""
+        begin, end = self.line_offsets[index], self.line_offsets[index + 1]
+        return list(zip(self.starts[begin:end], self.ends[begin:end], self.texts[begin:end]))
+
+
+class WordsOutOfOrder(Exception):
+    """串流中的單詞不是依開始時間排序"""
+
+
+def iter_segments(words: Iterable[Dict], token: Optional[CancelToken] = None,
+                  word_timings: Optional[WordTimings] = None,
+                  require_sorted: bool = False) -> Iterator[Dict]:
+    """逐一產生字幕段落（單詞須已依開始時間排序）
+
+    每個段落在遇到換行時立即產生，可直接接在串流解析之後，
+    讓下載、解析與分段同時進行。require_sorted=True 時若發現
+    單詞未排序會拋出 WordsOutOfOrder，由呼叫端改用 build_segments。
+    給定 word_timings 時，會在同一次走訪中記錄每個段落內各單詞的時間。
+    """
     current_text = ''
     current_start = None
     current_end = None
+    last_start = -math.inf
     
-    def push_segment():
+    def take_segment() -> Optional[Dict]:
         nonlocal current_text, current_start, current_end
         text = current_text.strip()
+        segment = None
         if current_start is not None and text:
-            segments.append({
+            segment = {
                 'start': current_start,
                 'end': current_end,
                 'text': text
-            })
+            }
+            if word_timings is not None:
+                word_timings.close_line()
+        elif word_timings is not None:
+            word_timings.discard_open_line()
         current_text = ''
         current_start = None
         current_end = None
+        return segment
     
-    for word_data in words:
+    for index, word_data in enumerate(words):
+        if token is not None and index % CANCEL_CHECK_INTERVAL == 0:
+            token.check()
+        
+        if require_sorted:
+            word_start = word_data.get('start_s', 0)
+            if word_start < last_start:
+                raise WordsOutOfOrder()
+            last_start = word_start
+        
         word = word_data.get('word')
         if not word:
             continue
@@ -110,16 +588,35 @@ def build_segments(words: List[Dict]) -> List[Dict]:
                 current_end = max(current_end, word_data.get('end_s', 0))
                 current_text += (' ' if current_text else '') + part
             
+            if word_timings is not None:
+                word_start = word_data.get('start_s', current_start) or 0.0
+                word_timings.append(word_start, word_data.get('end_s', word_start), part)
+            
             # 如果不是最後一部分，推送段落
             if i < len(parts) - 1:
-                push_segment()
+                segment = take_segment()
+                if segment:
+                    yield segment
         
         if has_double_newline or has_single_newline:
-            push_segment()
-    
-    push_segment()  # 推送最後一個段落
+            segment = take_segment()
+            if segment:
+                yield segment
     
-    return segments
+    segment = take_segment()  # 推送最後一個段落
+    if segment:
+        yield segment
+
+
+def build_segments(words: List[Dict], token: Optional[CancelToken] = None,
+                   word_timings: Optional[WordTimings] = None) -> List[Dict]:
+    """將單詞資料轉換為字幕段落
+
+    給定 word_timings 時，會在同一次走訪中記錄每個段落內各單詞的時間。
+    """
+    # 按開始時間排序
+    words = sorted(words, key=lambda x: x.get('start_s', 0))
+    return list(iter_segments(words, token, word_timings))
 
 
 def format_srt_time(seconds: float) -> str:
@@ -143,6 +640,27 @@ def format_lrc_time(seconds: float) -> str:
     return f"[{minutes:02d}:{secs:02d}.{cs:02d}]"
 
 
+def format_lrc_word_time(seconds: float) -> str:
+    """將秒數轉換為增強型 LRC 的逐字時間標記 <MM:SS.xx>"""
+    return f"<{format_lrc_time(seconds)[1:-1]}>"
+
+
+def format_vtt_time(seconds: float) -> str:
+    """將秒數轉換為 WebVTT 時間格式 (HH:MM:SS.mmm)"""
+    return format_srt_time(seconds).replace(',', '.')
+
+
+def format_ass_time(seconds: float) -> str:
+    """將秒數轉換為 ASS 時間格式 H:MM:SS.cc"""
+    total_cs = int(round(seconds * 100))
+    hours = total_cs // 360000
+    minutes = (total_cs % 360000) // 6000
+    secs = (total_cs % 6000) // 100
+    cs = total_cs % 100
+    
+    return f"{hours:d}:{minutes:02d}:{secs:02d}.{cs:02d}"
+
+
 def generate_srt(segments: List[Dict]) -> str:
     """生成 SRT 格式字幕"""
     lines = []
@@ -155,6 +673,17 @@ def generate_srt(segments: List[Dict]) -> str:
     return '\n'.join(lines)
 
 
+def generate_vtt(segments: List[Dict]) -> str:
+    """生成 WebVTT 格式字幕"""
+    lines = ['WEBVTT', '']
+    for seg in segments:
+        lines.append(f"{format_vtt_time(seg['start'])} --> {format_vtt_time(seg['end'])}")
+        lines.append(seg['text'])
+        lines.append('')
+    
+    return '\n'.join(lines)
+
+
 def generate_lrc(segments: List[Dict]) -> str:
     """生成 LRC 格式字幕"""
     lines = []
@@ -164,137 +693,3191 @@ def generate_lrc(segments: List[Dict]) -> str:
     return '\n'.join(lines)
 
 
-def download_subtitles(song_url: str, session_cookie: str, output_dir: Optional[str] = None) -> bool:
-    """下載字幕檔案"""
-    # 提取歌曲 ID
-    song_id = extract_song_id(song_url)
-    if not song_id:
-        print(f"❌ 錯誤：無法從 URL 中提取歌曲 ID")
-        print(f"   請確認 URL 格式為：https://suno.com/song/[歌曲ID]")
-        return False
+class LyricTimeline:
+    """依播放時間查詢歌詞的索引
+
+    由字幕段落（或逐字時間）建立，段落在 start <= t < end 期間為「作用中」。
+    以段落開始時間做二分搜尋，再以結束時間的最大值線段樹找出仍作用中的段落，
+    單點查詢為 O(log n)，區間查詢為 O((k + 1) log n)（k 為結果數量），
+    一個長段落與大量短段落重疊時也一樣。
+    逐格渲染請使用 cursor()：播放時間單調遞增時，沒有重疊段落的查詢攤銷 O(1)。
+    """
     
-    print(f"📝 歌曲 ID: {song_id}")
+    def __init__(self, segments: List[Dict]):
+        self.segments = sorted(segments, key=lambda seg: seg['start'])
+        self.starts = [seg['start'] for seg in self.segments]
+        self.ends = [seg['end'] for seg in self.segments]
+        # max_ends[i] = max(ends[0..i])，單調遞增，可 O(1) 判定某位置之前是否還有作用中的段落
+        self.max_ends = list(itertools.accumulate(self.ends, max))
+        # 結束時間的最大值線段樹，葉節點位於 [tree_size, tree_size + n)
+        self.tree_size = 1
+        while self.tree_size < len(self.ends):
+            self.tree_size *= 2
+        self.end_tree = array('d', [-math.inf]) * (2 * self.tree_size)
+        self.end_tree[self.tree_size:self.tree_size + len(self.ends)] = array('d', self.ends)
+        for node in range(self.tree_size - 1, 0, -1):
+            self.end_tree[node] = max(self.end_tree[2 * node], self.end_tree[2 * node + 1])
     
-    # 設定輸出目錄
-    if output_dir:
-        output_path = Path(output_dir)
-    else:
-        output_path = Path.cwd()
+    @classmethod
+    def from_words(cls, words: List[Dict]) -> 'LyricTimeline':
+        """以 aligned_words 的逐字時間建立索引（每個單詞為一個區間）"""
+        segments = []
+        for word_data in words:
+            text = strip_meta(word_data.get('word') or '').strip()
+            start = word_data.get('start_s')
+            if not text or start is None:
+                continue
+            segments.append({
+                'start': start,
+                'end': start if word_data.get('end_s') is None else word_data['end_s'],
+                'text': text
+            })
+        return cls(segments)
     
-    output_path.mkdir(parents=True, exist_ok=True)
+    def __len__(self) -> int:
+        return len(self.segments)
     
-    # 準備 API 請求
-    api_url = f"https://studio-api.prod.suno.com/api/gen/{song_id}/aligned_lyrics/v2/"
-    headers = {
-        'Authorization': f'Bearer {session_cookie}',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
+    @property
+    def duration(self) -> float:
+        return self.max_ends[-1] if self.max_ends else 0.0
     
-    print(f"🌐 正在請求字幕資料...")
+    def resolve(self, last_started: int, t: float) -> Optional[int]:
+        """已知最後一個 start <= t 的段落位置，找出 t 時作用中的段落"""
+        if last_started < 0:
+            return None
+        if self.ends[last_started] > t:
+            return last_started
+        # 大多數時間點落在段落之間的空檔，O(1) 即可判定沒有重疊段落
+        if last_started == 0 or self.max_ends[last_started - 1] <= t:
+            return None
+        return self.last_active(last_started - 1, t)
     
-    try:
-        response = requests.get(api_url, headers=headers, timeout=30)
-        
-        if not response.ok:
-            print(f"❌ API 回傳錯誤狀態碼: {response.status_code}")
-            if response.status_code == 401:
-                print("   請確認 session cookie 是否有效")
-                print("   建議：在 suno.com 登出後重新登入，然後重新取得 cookie")
-            elif response.status_code == 404:
-                print("   該歌曲可能不存在或沒有字幕資料")
-            return False
-        
-        data = response.json()
-        words = data.get('aligned_words', [])
-        
-        if not isinstance(words, list) or not words:
-            print("❌ 該歌曲沒有字幕資料（aligned_words 為空）")
-            return False
-        
-        print(f"✅ 成功取得 {len(words)} 個單詞資料")
-        
-        # 建立字幕段落
-        segments = build_segments(words)
-        if not segments:
-            print("❌ 無法建立字幕段落")
-            return False
-        
-        print(f"📄 已建立 {len(segments)} 個字幕段落")
+    def last_active(self, last: int, t: float) -> Optional[int]:
+        """位置 <= last 的段落中，最後一個 end > t 者的位置，O(log n)"""
+        tree = self.end_tree
+        node = last + self.tree_size
+        if tree[node] > t:
+            return last
+        # 由葉節點往上走：目前節點是右子節點時，左兄弟緊接在已檢查的範圍之前
+        while node > 1:
+            if node & 1 and tree[node - 1] > t:
+                node -= 1
+                # 往下找最右邊的 end > t 的葉節點
+                while node < self.tree_size:
+                    node = 2 * node + 1 if tree[2 * node + 1] > t else 2 * node
+                return node - self.tree_size
+            node //= 2
+        return None
+    
+    def index_at(self, t: float) -> Optional[int]:
+        """t 時作用中的段落位置（重疊時取最晚開始者），沒有則回傳 None"""
+        return self.resolve(bisect.bisect_right(self.starts, t) - 1, t)
+    
+    def at(self, t: float) -> Optional[Dict]:
+        """t 時作用中的段落"""
+        index = self.index_at(t)
+        return None if index is None else self.segments[index]
+    
+    def indices_between(self, start: float, end: float) -> List[int]:
+        """與 [start, end) 重疊的所有段落位置，依開始時間排序"""
+        indices = []
+        index = bisect.bisect_left(self.starts, end) - 1
+        while index >= 0:
+            index = self.last_active(index, start)
+            if index is None:
+                break
+            indices.append(index)
+            index -= 1
+        indices.reverse()
+        return indices
+    
+    def between(self, start: float, end: float) -> List[Dict]:
+        """與 [start, end) 重疊的所有段落"""
+        return [self.segments[index] for index in self.indices_between(start, end)]
+    
+    def cursor(self) -> 'TimelineCursor':
+        return TimelineCursor(self)
+    
+    def frame_indices(self, fps: float, duration: Optional[float] = None) -> List[Optional[int]]:
+        """以 fps 逐格取樣，回傳每一格作用中的段落位置（無歌詞為 None）
+
+        沒有重疊段落時整體為 O(段落數 + 格數)，最差情況為 O(段落數 + 格數 × log 段落數)，
+        適合離線渲染一次算出所有畫格。
+        """
+        if fps <= 0:
+            raise ValueError('fps 必須大於 0')
+        if duration is None:
+            duration = self.duration
         
-        # 生成檔案名稱（使用歌曲 ID，因為我們無法從 API 取得標題）
-        filename = get_safe_filename('', song_id)
+        cursor = self.cursor()
+        frame_count = int(math.ceil(duration * fps))
+        return [cursor.index_at(frame / fps) for frame in range(frame_count)]
+
+
+class TimelineCursor:
+    """LyricTimeline 的播放游標
+
+    記住上一次查詢的位置，時間單調遞增時只需向前推進（有重疊段落時另加 O(log n)）；
+    時間倒退（例如使用者拖曳進度）時以二分搜尋重新定位。
+    """
+    
+    def __init__(self, timeline: LyricTimeline):
+        self.timeline = timeline
+        self._started = 0  # starts 中 <= 上次查詢時間的數量
+        self._last_time = -math.inf
+    
+    def index_at(self, t: float) -> Optional[int]:
+        timeline = self.timeline
+        if t < self._last_time:
+            self._started = bisect.bisect_right(timeline.starts, t)
+        else:
+            starts = timeline.starts
+            while self._started < len(starts) and starts[self._started] <= t:
+                self._started += 1
+        self._last_time = t
+        return timeline.resolve(self._started - 1, t)
+    
+    def at(self, t: float) -> Optional[Dict]:
+        index = self.index_at(t)
+        return None if index is None else self.timeline.segments[index]
+
+
+def generate_enhanced_lrc(segments: List[Dict], word_timings: WordTimings) -> str:
+    """生成增強型 LRC（每個單詞前加上 <MM:SS.xx> 時間標記）"""
+    lines = []
+    for index, seg in enumerate(segments):
+        parts = [format_lrc_time(seg['start'])]
+        for start, _, text in word_timings.line(index):
+            parts.append(f"{format_lrc_word_time(start)}{text} ")
+        parts.append(format_lrc_word_time(seg['end']))
+        lines.append(''.join(parts))
+    
+    return '\n'.join(lines)
+
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+WrapStyle: 0
+ScaledBorderAndShadow: yes
+PlayResX: 1920
+PlayResY: 1080
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,64,&H00FFFFFF,&H0000FFFF,&H00000000,&H64000000,0,0,0,0,100,100,0,0,1,3,0,2,60,60,80,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def generate_ass(segments: List[Dict], word_timings: WordTimings) -> str:
+    """生成 ASS 卡拉 OK 字幕（每個單詞以 \\k 標記持續時間，單位為百分之一秒）"""
+    lines = [ASS_HEADER.rstrip('\n')]
+    for index, seg in enumerate(segments):
+        line_start = seg['start']
+        words = word_timings.line(index)
         
-        # 生成 SRT
-        srt_content = generate_srt(segments)
-        srt_path = output_path / f"{filename}.srt"
-        srt_path.write_text(srt_content, encoding='utf-8')
-        print(f"✅ 已儲存 SRT: {srt_path}")
+        # 以相對於段落開始的累積位置計算 \k，避免逐字四捨五入累積誤差
+        boundaries = [start for start, _, _ in words[1:]] + [seg['end']]
+        position = 0
+        parts = []
+        for (start, _, text), boundary in zip(words, boundaries):
+            next_position = max(position, int(round((boundary - line_start) * 100)))
+            safe_text = text.replace('{', '(').replace('}', ')')
+            parts.append(f"{{\\k{next_position - position}}}{safe_text} ")
+            position = next_position
         
-        # 生成 LRC
-        lrc_content = generate_lrc(segments)
-        lrc_path = output_path / f"{filename}.lrc"
-        lrc_path.write_text(lrc_content, encoding='utf-8')
-        print(f"✅ 已儲存 LRC: {lrc_path}")
+        lines.append(
+            f"Dialogue: 0,{format_ass_time(line_start)},{format_ass_time(seg['end'])},"
+            f"Default,,0,0,0,,{''.join(parts).rstrip()}"
+        )
+    
+    return '\n'.join(lines) + '\n'
+
+
+# 字幕格式：名稱 -> (副檔名, 產生函式, 是否需要逐字時間)
+SUBTITLE_FORMATS = {
+    'srt': ('.srt', generate_srt, False),
+    'lrc': ('.lrc', generate_lrc, False),
+    'vtt': ('.vtt', generate_vtt, False),
+    'elrc': ('.words.lrc', generate_enhanced_lrc, True),
+    'ass': ('.ass', generate_ass, True),
+}
+DEFAULT_FORMATS = ['srt', 'lrc']
+
+
+def parse_formats(value: str) -> List[str]:
+    """解析以逗號分隔的格式清單（供 argparse 使用）"""
+    formats = [name.strip().lower() for name in value.split(',') if name.strip()]
+    unknown = [name for name in formats if name not in SUBTITLE_FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(
+            f"不支援的格式：{', '.join(unknown) or value}（可用：{', '.join(SUBTITLE_FORMATS)}）"
+        )
+    return formats
+
+
+def formats_need_words(formats: List[str]) -> bool:
+    """這些格式是否需要逐字時間"""
+    return any(SUBTITLE_FORMATS[name][2] for name in formats)
+
+
+def render_formats(segments: List[Dict], word_timings: Optional[WordTimings],
+                   formats: List[str]) -> Dict[str, str]:
+    """以同一份分段結果產生多種格式，回傳 {格式名稱: 內容}"""
+    rendered = {}
+    for name in formats:
+        _, generator, needs_words = SUBTITLE_FORMATS[name]
+        rendered[name] = generator(segments, word_timings) if needs_words else generator(segments)
+    return rendered
+
+
+SRT_TIMING_RE = re.compile(
+    r'(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})'
+)
+LRC_TIME_RE = re.compile(r'\[(\d+):(\d{1,2}(?:\.\d{1,3})?)\]')
+LRC_WORD_TIME_RE = re.compile(r'<(\d+):(\d{1,2}(?:\.\d{1,3})?)>')
+
+
+def parse_srt(text: str) -> List[Dict]:
+    """解析 SRT 字幕，回傳與 build_segments 相同格式的段落"""
+    segments = []
+    text = text.replace('\r\n', '\n').replace('\r', '\n').strip()
+    for block in re.split(r'\n[ \t]*\n', text):
+        lines = block.split('\n')
+        # 時間行通常是第二行（第一行為序號），容許省略序號
+        for i, line in enumerate(lines[:2]):
+            match = SRT_TIMING_RE.search(line)
+            if not match:
+                continue
+            h1, m1, s1, ms1, h2, m2, s2, ms2 = match.groups()
+            segments.append({
+                'start': int(h1) * 3600 + int(m1) * 60 + int(s1) + int(ms1.ljust(3, '0')) / 1000,
+                'end': int(h2) * 3600 + int(m2) * 60 + int(s2) + int(ms2.ljust(3, '0')) / 1000,
+                'text': '\n'.join(lines[i + 1:]).strip(),
+            })
+            break
+    
+    return segments
+
+
+def parse_lrc(text: str) -> Tuple[List[str], List[Dict]]:
+    """解析 LRC（含增強型逐字 LRC），回傳 (標頭行, 段落)
+
+    標頭行為 [ar:...] 等不含時間的行，原樣保留。
+    逐字時間標記存放在段落的 'marks'：[(時間, 標記後的文字), ...]，
+    'prefix' 為第一個逐字標記之前的文字。LRC 沒有結束時間，
+    段落的 'end' 取最後一個逐字標記或下一行的開始時間。
+    """
+    headers = []
+    segments = []
+    for line in text.splitlines():
+        starts = []
+        pos = 0
+        match = LRC_TIME_RE.match(line)
+        while match:
+            starts.append(int(match.group(1)) * 60 + float(match.group(2)))
+            pos = match.end()
+            match = LRC_TIME_RE.match(line, pos)
         
-        return True
+        if not starts:
+            if line.strip():
+                headers.append(line)
+            continue
         
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 網路請求錯誤: {e}")
-        return False
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON 解析錯誤: {e}")
-        return False
-    except Exception as e:
-        print(f"❌ 發生錯誤: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+        pieces = LRC_WORD_TIME_RE.split(line[pos:])
+        marks = [
+            (int(pieces[i]) * 60 + float(pieces[i + 1]), pieces[i + 2])
+            for i in range(1, len(pieces), 3)
+        ]
+        # 同一行可有多個時間標記（重複的歌詞），各自成為一個段落
+        for start in starts:
+            segments.append({
+                'start': start,
+                'end': start,
+                'text': ''.join([pieces[0]] + [mark_text for _, mark_text in marks]),
+                'prefix': pieces[0],
+                'marks': marks,
+            })
+    
+    segments.sort(key=lambda seg: seg['start'])
+    for i, seg in enumerate(segments):
+        if seg['marks']:
+            seg['end'] = max(seg['start'], seg['marks'][-1][0])
+        elif i + 1 < len(segments):
+            seg['end'] = segments[i + 1]['start']
+    
+    return headers, segments
 
 
-def main():
-    """主程式"""
-    print("=" * 60)
-    print("🎵 Suno 字幕下載工具")
-    print("=" * 60)
-    print()
+def generate_lrc_document(headers: List[str], segments: List[Dict]) -> str:
+    """將 parse_lrc 的結果寫回 LRC，保留標頭與逐字時間標記"""
+    lines = list(headers)
+    for seg in segments:
+        marks = seg.get('marks')
+        if not marks:
+            lines.append(f"{format_lrc_time(seg['start'])}{seg['text']}")
+            continue
+        parts = [format_lrc_time(seg['start']), seg.get('prefix', '')]
+        for mark_time, mark_text in marks:
+            parts.append(f"{format_lrc_word_time(mark_time)}{mark_text}")
+        lines.append(''.join(parts))
     
-    # 取得輸入
-    if len(sys.argv) >= 3:
-        song_url = sys.argv[1]
-        session_cookie = sys.argv[2]
-        output_dir = sys.argv[3] if len(sys.argv) > 3 else None
-    else:
-        print("使用方法：")
-        print(f"  python3 {sys.argv[0]} <歌曲URL> <session_cookie> [輸出目錄]")
-        print()
-        print("參數說明：")
-        print("  歌曲URL: Suno 歌曲頁面網址，例如：https://suno.com/song/xxxxx")
-        print("  session_cookie: 從瀏覽器取得的 __session cookie 值")
-        print("  輸出目錄: (選填) 儲存檔案的路徑，預設為當前目錄")
-        print()
-        print("如何取得 session cookie：")
-        print("  1. 在瀏覽器中登入 suno.com")
-        print("  2. 按 F12 開啟開發者工具")
-        print("  3. 切換到「Application」或「儲存空間」標籤")
-        print("  4. 在 Cookies 中找到 suno.com")
-        print("  5. 複製 __session 的值")
-        print()
+    return '\n'.join(lines)
+
+
+def retime_times(times: array, offset: float = 0.0, scale: float = 1.0) -> array:
+    """對整個時間陣列一次套用 t * scale + offset"""
+    return array('d', [t * scale + offset for t in times])
+
+
+def retime_segments(segments: List[Dict], offset: float = 0.0, scale: float = 1.0,
+                    clamp_start: float = 0.0, clamp_end: Optional[float] = None) -> List[Dict]:
+    """平移、縮放並夾限段落時間
+
+    所有時間（開始、結束與逐字標記）先收集成一個欄式陣列一次轉換，
+    再依序取回。完全落在 [clamp_start, clamp_end) 之外的段落會被移除，
+    跨越邊界的段落則夾在邊界上。
+    """
+    times = array('d')
+    for seg in segments:
+        times.append(seg['start'])
+        times.append(seg['end'])
+        times.extend(mark_time for mark_time, _ in seg.get('marks') or ())
+    
+    shifted = retime_times(times, offset, scale)
+    upper = math.inf if clamp_end is None else clamp_end
+    
+    result = []
+    pos = 0
+    for seg in segments:
+        marks = seg.get('marks') or ()
+        start, end = shifted[pos], shifted[pos + 1]
+        mark_times = shifted[pos + 2:pos + 2 + len(marks)]
+        pos += 2 + len(marks)
         
-        # 互動式輸入
-        song_url = input("請輸入 Suno 歌曲 URL: ").strip()
-        if not song_url:
-            print("❌ 未輸入 URL")
-            sys.exit(1)
+        if start >= upper or (end <= clamp_start and start < clamp_start):
+            continue
         
-        session_cookie = input("請輸入 __session cookie: ").strip()
+        retimed = dict(seg)
+        retimed['start'] = min(max(start, clamp_start), upper)
+        retimed['end'] = min(max(end, clamp_start), upper)
+        if marks:
+            retimed['marks'] = [
+                (min(max(mark_time, clamp_start), upper), mark_text)
+                for mark_time, (_, mark_text) in zip(mark_times, marks)
+            ]
+        result.append(retimed)
+    
+    return result
+
+
+def retime_text(text: str, kind: str, offset: float = 0.0, scale: float = 1.0,
+                clamp_start: float = 0.0, clamp_end: Optional[float] = None) -> Tuple[str, int, int]:
+    """重新計時一份 SRT 或 LRC 內容，回傳 (新內容, 原段落數, 新段落數)"""
+    if kind == 'srt':
+        segments = parse_srt(text)
+        retimed = retime_segments(segments, offset, scale, clamp_start, clamp_end)
+        return generate_srt(retimed), len(segments), len(retimed)
+    
+    headers, segments = parse_lrc(text)
+    retimed = retime_segments(segments, offset, scale, clamp_start, clamp_end)
+    return generate_lrc_document(headers, retimed), len(segments), len(retimed)
+
+
+RETIME_KINDS = {'.srt': 'srt', '.lrc': 'lrc'}
+
+
+def retime_file(job: Tuple[str, str, Dict]) -> Tuple[str, Optional[str]]:
+    """重新計時單一檔案（供行程池呼叫），回傳 (來源路徑, 錯誤訊息或 None)"""
+    source, destination, options = job
+    try:
+        text = Path(source).read_text(encoding='utf-8-sig')
+        content, _, _ = retime_text(text, RETIME_KINDS[Path(source).suffix.lower()], **options)
+        Path(destination).parent.mkdir(parents=True, exist_ok=True)
+        write_outputs({Path(destination): content})
+    except (OSError, UnicodeDecodeError, ValueError) as e:
+        return source, str(e)
+    return source, None
+
+
+class SubtitleStore:
+    """SQLite 字幕庫
+
+    保存歌曲、字幕段落與原始單詞時間，並在歌曲 ID 與時間上建立索引，
+    下游工具不必掃描檔案系統即可查詢。寫入會先暫存，累積 STORE_BATCH_SIZE
+    首歌曲後以單一交易批次提交；可在多個工作執行緒間共用。
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS songs (
+            song_id TEXT PRIMARY KEY,
+            title TEXT,
+            content_hash TEXT,
+            tool_version TEXT,
+            updated_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS segments (
+            song_id TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            start REAL NOT NULL,
+            end REAL NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (song_id, idx)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS segments_by_time ON segments (song_id, start);
+        CREATE INDEX IF NOT EXISTS segments_by_start ON segments (start);
+        CREATE TABLE IF NOT EXISTS words (
+            song_id TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            start REAL,
+            end REAL,
+            word TEXT NOT NULL,
+            PRIMARY KEY (song_id, idx)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS words_by_time ON words (song_id, start);
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+    
+    def has_song(self, song_id: str, content_hash: Optional[str]) -> bool:
+        """字幕庫中是否已有此歌曲，且內容雜湊相同"""
+        with self._lock:
+            for pending in reversed(self._pending):
+                if pending[0] == song_id:
+                    return pending[2] == content_hash
+            row = self.conn.execute(
+                'SELECT content_hash FROM songs WHERE song_id = ?', (song_id,)
+            ).fetchone()
+        return row is not None and row[0] == content_hash
+    
+    def put(self, song_id: str, title: str, content_hash: str,
+            words: List[Dict], segments: List[Dict]):
+        """暫存一首歌曲，累積到批次大小時提交"""
+        with self._lock:
+            self._pending.append((song_id, title, content_hash, words, segments))
+            should_flush = len(self._pending) >= STORE_BATCH_SIZE
+        if should_flush:
+            self.flush()
+    
+    def flush(self):
+        """以單一交易寫入所有暫存的歌曲（同一首歌曲的舊資料會被取代）"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            
+            updated_at = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+            song_ids = [(item[0],) for item in pending]
+            with self.conn:
+                self.conn.executemany('DELETE FROM segments WHERE song_id = ?', song_ids)
+                self.conn.executemany('DELETE FROM words WHERE song_id = ?', song_ids)
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO songs VALUES (?, ?, ?, ?, ?)',
+                    [(song_id, title, content_hash, TOOL_VERSION, updated_at)
+                     for song_id, title, content_hash, _, _ in pending]
+                )
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?, ?)',
+                    [(song_id, idx, seg['start'], seg['end'], seg['text'])
+                     for song_id, _, _, _, segments in pending
+                     for idx, seg in enumerate(segments)]
+                )
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO words VALUES (?, ?, ?, ?, ?)',
+                    [(song_id, idx, word.get('start_s'), word.get('end_s'), word.get('word') or '')
+                     for song_id, _, _, words, _ in pending
+                     for idx, word in enumerate(words)]
+                )
+    
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.conn.close()
+    
+    def song_ids(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self.conn.execute('SELECT song_id FROM songs ORDER BY song_id')]
+    
+    def get_title(self, song_id: str) -> str:
+        with self._lock:
+            row = self.conn.execute('SELECT title FROM songs WHERE song_id = ?', (song_id,)).fetchone()
+        return (row[0] or '') if row else ''
+    
+    def get_words(self, song_id: str) -> List[Dict]:
+        """依原始順序取回 aligned_words 格式的單詞資料"""
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT start, end, word FROM words WHERE song_id = ? ORDER BY idx', (song_id,)
+            ).fetchall()
+        return [{'start_s': start, 'end_s': end, 'word': word} for start, end, word in rows]
+    
+    def get_segments(self, song_id: str, start: Optional[float] = None,
+                     end: Optional[float] = None) -> List[Dict]:
+        """取回字幕段落；給定時間範圍時只回傳與 [start, end) 重疊的段落"""
+        query = 'SELECT start, end, text FROM segments WHERE song_id = ?'
+        params: list = [song_id]
+        if end is not None:
+            query += ' AND start < ?'
+            params.append(end)
+        if start is not None:
+            query += ' AND end > ?'
+            params.append(start)
+        query += ' ORDER BY start'
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [{'start': s, 'end': e, 'text': text} for s, e, text in rows]
+
+
+class JobJournal:
+    """批次工作的檢查點日誌
+
+    只附加寫入的 JSON Lines 檔案，每行記錄一首歌曲的狀態變化
+    （started / done / failed）。fsync 以批次進行：累積 JOURNAL_SYNC_RECORDS
+    筆或經過 JOURNAL_SYNC_SECONDS 秒才同步一次。程序中斷後以同一份日誌
+    重新執行，已完成的歌曲會直接略過，不再發出網路請求。
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.states = self.load_states(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+    
+    @staticmethod
+    def read_records(path: Path) -> List[Dict]:
+        """讀取日誌中的所有記錄；忽略中斷時寫到一半的最後一行"""
+        records = []
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return records
+    
+    @classmethod
+    def load_states(cls, path: Path) -> Dict[str, Dict]:
+        """每首歌曲的最後一筆記錄"""
+        states = {}
+        for record in cls.read_records(path):
+            if 'key' in record:
+                states[record['key']] = record
+        return states
+    
+    @staticmethod
+    def job_key(song_url: str) -> str:
+        return extract_song_id(song_url) or song_url
+    
+    def is_done(self, song_url: str) -> bool:
+        state = self.states.get(self.job_key(song_url))
+        return bool(state) and state.get('state') == 'done'
+    
+    def append(self, record: Dict):
+        record = dict(record, ts=time.strftime('%Y-%m-%dT%H:%M:%S%z'))
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            if 'key' in record:
+                self.states[record['key']] = record
+            self._file.write(line)
+            self._unsynced += 1
+            if (self._unsynced >= JOURNAL_SYNC_RECORDS
+                    or time.monotonic() - self._last_sync >= JOURNAL_SYNC_SECONDS):
+                self._sync()
+    
+    def mark(self, song_url: str, state: str):
+        self.append({'key': self.job_key(song_url), 'url': song_url, 'state': state})
+    
+    def reset(self):
+        """清空日誌，之前記錄的歌曲不再視為已完成"""
+        with self._lock:
+            self._file.flush()
+            self._file.truncate(0)
+            self._sync()
+            self.states = {}
+    
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+    
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync()
+            self._file.close()
+
+
+class SubtitleArchive:
+    """將所有字幕寫入單一封存檔（zip 或 tar），可依大小分片
+
+    每首歌曲的各格式成為封存檔中的成員，並在旁邊的 {封存檔}.index.jsonl
+    記錄每個成員所在的分片、位移與大小，之後可直接 seek 讀取單一歌曲
+    （見 read_member），不必掃描整個封存檔；即使程序中斷、zip 尚未寫入
+    中央目錄，索引中的成員仍可讀取。以相同路徑重新執行會接續寫入；
+    是否分片由既有索引決定，重新執行時不能切換（分片大小可以改變）。
+    """
+    
+    # zip 本地檔頭：簽章、版本、旗標、壓縮方式、時間、日期、CRC、壓縮後大小、原始大小、檔名長度、額外欄位長度
+    ZIP_LOCAL_HEADER = struct.Struct('<4s5H3I2H')
+    
+    def __init__(self, path: Path, shard_size: Optional[int] = None):
+        suffix = path.suffix.lower()
+        if suffix not in ('.zip', '.tar'):
+            raise ValueError(f"不支援的封存格式：{path.name}（請使用 .zip 或 .tar）")
+        self.path = path
+        self.kind = suffix[1:]
+        self.shard_size = shard_size
+        self.index_path = path.with_name(path.name + '.index.jsonl')
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        
+        self.entries = self.load_index(self.index_path)
+        # 切換分片方式會讓新成員寫到另一種檔名，索引同時指向兩種配置
+        if self.entries:
+            sharded = any(entry.get('file', path.name) != path.name for entry in self.entries.values())
+            if sharded and not shard_size:
+                raise ValueError(f"{path.name} 是分片封存檔，接續寫入時必須指定分片大小（--archive-shard-size）")
+            if not sharded and shard_size:
+                raise ValueError(f"{path.name} 是未分片的封存檔，不能改為分片；請指定新的封存檔路徑")
+        self.songs: Dict[str, Dict] = {}
+        for entry in self.entries.values():
+            song = self.songs.setdefault(entry['song_id'], {'content_hash': entry['content_hash'], 'names': set()})
+            if song['content_hash'] != entry['content_hash']:
+                song.update(content_hash=entry['content_hash'], names=set())
+            song['names'].add(entry['name'])
+        
+        self.shard = max([entry['shard'] for entry in self.entries.values()], default=1)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._index = open(self.index_path, 'a', encoding='utf-8')
+        self._open_shard()
+    
+    @staticmethod
+    def load_index(index_path: Path) -> Dict[str, Dict]:
+        """讀取索引，同名成員以最後一筆為準"""
+        entries = {}
+        for record in JobJournal.read_records(index_path):
+            if 'name' in record:
+                entries[record['name']] = record
+        return entries
+    
+    def shard_path(self, shard: int) -> Path:
+        """分片檔案路徑；未分片時就是封存檔本身"""
+        if not self.shard_size:
+            return self.path
+        return self.path.with_name(f"{self.path.stem}-{shard:05d}{self.path.suffix}")
+    
+    def _open_shard(self):
+        path = self.shard_path(self.shard)
+        mode = 'a' if path.exists() else 'w'
+        if self.kind == 'zip':
+            self._archive = zipfile.ZipFile(path, mode, compression=zipfile.ZIP_DEFLATED)
+        else:
+            self._archive = tarfile.open(path, mode, format=tarfile.PAX_FORMAT, encoding='utf-8')
+    
+    def _position(self) -> int:
+        if self.kind == 'zip':
+            return self._archive.fp.tell()
+        return self._archive.offset
+    
+    def has_song(self, song_id: str, content_hash: Optional[str], names: List[str]) -> bool:
+        """封存檔中是否已有此內容雜湊產生的這些成員"""
+        song = self.songs.get(song_id)
+        return bool(song) and song['content_hash'] == content_hash and set(names) <= song['names']
+    
+    def add(self, song_id: str, content_hash: str, files: Dict[str, str]):
+        """寫入一首歌曲的所有格式；同一首歌曲的成員一定在同一個分片"""
+        with self._lock:
+            if self.shard_size and self._position() >= self.shard_size:
+                self._archive.close()
+                self.shard += 1
+                self._open_shard()
+            
+            records = []
+            for name, content in files.items():
+                data = content.encode('utf-8')
+                record = {
+                    'name': name,
+                    'song_id': song_id,
+                    'content_hash': content_hash,
+                    'shard': self.shard,
+                    'file': self.shard_path(self.shard).name,
+                    'size': len(data),
+                }
+                if self.kind == 'zip':
+                    info = zipfile.ZipInfo(name, time.localtime()[:6])
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    self._archive.writestr(info, data)
+                    record.update(offset=info.header_offset, compressed_size=info.compress_size,
+                                  compression=info.compress_type)
+                else:
+                    info = tarfile.TarInfo(name)
+                    info.size = len(data)
+                    info.mtime = int(time.time())
+                    header = info.tobuf(self._archive.format, self._archive.encoding, self._archive.errors)
+                    offset = self._archive.offset + len(header)
+                    self._archive.addfile(info, io.BytesIO(data))
+                    record['offset'] = offset
+                records.append(record)
+            
+            # 封存檔內容先寫到磁碟，索引才記錄，索引中的成員一定可讀
+            if self.kind == 'zip':
+                self._archive.fp.flush()
+            else:
+                self._archive.fileobj.flush()
+            for record in records:
+                self._index.write(json.dumps(record, ensure_ascii=False) + '\n')
+                self.entries[record['name']] = record
+            self._index.flush()
+            self.songs[song_id] = {'content_hash': content_hash, 'names': set(files)}
+            
+            self._unsynced += 1
+            if self._unsynced >= ARCHIVE_SYNC_SONGS:
+                self._sync()
+    
+    def _sync(self):
+        archive_file = self._archive.fp if self.kind == 'zip' else self._archive.fileobj
+        os.fsync(archive_file.fileno())
+        os.fsync(self._index.fileno())
+        self._unsynced = 0
+    
+    def close(self):
+        with self._lock:
+            if self._index.closed:
+                return
+            self._archive.close()
+            self._index.flush()
+            os.fsync(self._index.fileno())
+            self._index.close()
+    
+    @classmethod
+    def read_member(cls, directory: Path, entry: Dict) -> str:
+        """依索引記錄直接讀取一個成員的內容（directory 為封存檔所在目錄）"""
+        with open(directory / entry['file'], 'rb') as f:
+            f.seek(entry['offset'])
+            if 'compressed_size' not in entry:
+                return f.read(entry['size']).decode('utf-8')
+            
+            header = f.read(cls.ZIP_LOCAL_HEADER.size)
+            fields = cls.ZIP_LOCAL_HEADER.unpack(header)
+            if fields[0] != b'PK\x03\x04':
+                raise ValueError(f"索引位移不是 zip 成員開頭：{entry['name']}")
+            f.seek(fields[9] + fields[10], os.SEEK_CUR)
+            data = f.read(entry['compressed_size'])
+        
+        if entry.get('compression') == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -15)
+        return data.decode('utf-8')
+
+
+def run_cancellable(func: Callable, token: CancelToken):
+    """在輔助執行緒中執行可能阻塞的呼叫（例如等待回應標頭）
+
+    權杖被取消或到期時立即拋出 DownloadCancelled，
+    工作執行緒不必等待仍卡在連線上的請求。
+    """
+    token.check()
+    
+    finished = threading.Event()
+    outcome = {}
+    
+    def run():
+        try:
+            outcome['result'] = func()
+        except BaseException as e:
+            outcome['error'] = e
+        finally:
+            finished.set()
+    
+    remove_callback = token.add_callback(finished.set)
+    try:
+        threading.Thread(target=run, daemon=True).start()
+        finished.wait(token.remaining())
+    finally:
+        remove_callback()
+    
+    token.check()
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+_http_session: Optional[requests.Session] = None
+_http_pool_size = 0
+_http_session_lock = threading.Lock()
+
+
+def http_session(pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    """所有 API 請求共用的 Session，重複使用 keep-alive 連線
+
+    第一次呼叫時建立；之後傳入較大的 pool_size 會放大連線池。
+    """
+    global _http_session, _http_pool_size
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = requests.Session()
+            # 不保存伺服器設定的 cookie，使用不同 session cookie 的工作不會互相影響
+            _http_session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        if pool_size > _http_pool_size:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            _http_session.mount('http://', adapter)
+            _http_session.mount('https://', adapter)
+            _http_pool_size = pool_size
+        return _http_session
+
+
+def open_response(url: str, headers: Dict[str, str], token: CancelToken):
+    """以串流模式發出 GET 請求，收到回應標頭即返回
+
+    連線與讀取逾時會依權杖剩餘時間縮短。請求經由共用的連線池（見 http_session）。
+    """
+    connect_timeout, read_timeout = CONNECT_TIMEOUT, READ_TIMEOUT
+    remaining = token.remaining()
+    if remaining is not None:
+        connect_timeout = max(0.1, min(connect_timeout, remaining))
+        read_timeout = max(0.1, min(read_timeout, remaining))
+    
+    try:
+        return http_session().get(
+            url,
+            headers=headers,
+            timeout=(connect_timeout, read_timeout),
+            stream=True
+        )
+    except requests.exceptions.RequestException:
+        # 因期限縮短的逾時視為取消
+        token.check()
+        raise
+
+
+def iter_response_body(response, token: CancelToken, digest=None) -> Iterator[bytes]:
+    """逐塊讀取回應內容；權杖被取消時會關閉連線並停止讀取"""
+    remove_callback = token.add_callback(response.close)
+    try:
+        for chunk in response.iter_content(chunk_size=65536):
+            token.check()
+            if digest is not None:
+                digest.update(chunk)
+            yield chunk
+        token.check()
+    except requests.exceptions.RequestException:
+        # 權杖關閉連線造成的錯誤視為取消
+        token.check()
+        raise
+    finally:
+        remove_callback()
+        response.close()
+
+
+def fetch_json(url: str, headers: Dict[str, str], token: Optional[CancelToken] = None):
+    """發出 GET 請求並解析 JSON，回傳 (response, data, 回應內容 SHA-256)
+
+    錯誤狀態或 304 Not Modified 時 data 與雜湊皆為 None。
+    等待回應的過程可被權杖中斷（見 run_cancellable）。
+    """
+    token = token or CancelToken()
+    response = run_cancellable(lambda: open_response(url, headers, token), token)
+    if not response.ok or response.status_code == 304:
+        response.close()
+        return response, None, None
+    
+    digest = hashlib.sha256()
+    body = b''.join(iter_response_body(response, token, digest))
+    data = json.loads(body.decode(response.encoding or 'utf-8'))
+    return response, data, digest.hexdigest()
+
+
+class AlignedWordsParser:
+    """aligned_lyrics 回應的增量 JSON 解析器
+
+    逐塊餵入位元組，只解析頂層物件中的 aligned_words 陣列：每個單詞物件
+    一完整就立即回傳，不必等待整份回應下載完，也不會為其他欄位建立物件。
+    已處理的文字會從緩衝區移除，記憶體用量與回應大小無關。
+    """
+    
+    TOKEN_RE = re.compile(r'["{}\[\]:,]')
+    STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+    SEPARATOR_RE = re.compile(r'[\s,]*')
+    
+    def __init__(self, encoding: str = 'utf-8'):
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._depth = 0
+        self._last_string = None
+        self._key = None
+        self._started = False
+        self.state = 'seek'  # seek -> words -> rest
+    
+    def feed(self, chunk: bytes) -> List[Dict]:
+        """餵入一塊位元組，回傳這次新解析完成的單詞"""
+        self._buffer += self._decoder.decode(chunk)
+        return self._parse(final=False)
+    
+    def close(self) -> List[Dict]:
+        """回應結束，回傳剩餘的單詞；內容不完整時拋出 JSONDecodeError"""
+        self._buffer += self._decoder.decode(b'', final=True)
+        words = self._parse(final=True)
+        if self.state == 'words':
+            raise json.JSONDecodeError('aligned_words 陣列未結束', self._buffer, 0)
+        if not self._started:
+            raise json.JSONDecodeError('回應內容為空', self._buffer, 0)
+        return words
+    
+    def _parse(self, final: bool) -> List[Dict]:
+        buffer = self._buffer
+        pos = 0
+        words = []
+        
+        if not self._started:
+            stripped = buffer.lstrip()
+            if stripped:
+                if not stripped.startswith('{'):
+                    raise json.JSONDecodeError('回應不是 JSON 物件', buffer, 0)
+                self._started = True
+        
+        while True:
+            if self.state == 'seek':
+                pos, entered = self._seek(buffer, pos)
+                if not entered:
+                    break
+            elif self.state == 'words':
+                pos = self.SEPARATOR_RE.match(buffer, pos).end()
+                if pos >= len(buffer):
+                    break
+                if buffer[pos] == ']':
+                    self.state = 'rest'
+                    pos += 1
+                    continue
+                try:
+                    word, pos = self._json.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break
+                if isinstance(word, dict):
+                    words.append(word)
+            else:
+                # aligned_words 之後的欄位不需要，直接丟棄
+                pos = len(buffer)
+                break
+        
+        self._buffer = buffer[pos:]
+        return words
+    
+    def _seek(self, buffer: str, pos: int) -> Tuple[int, bool]:
+        """在頂層物件中尋找 aligned_words 陣列的開頭，回傳 (位置, 是否已進入陣列)"""
+        while True:
+            match = self.TOKEN_RE.search(buffer, pos)
+            if not match:
+                return len(buffer), False
+            
+            char = match.group()
+            if char == '"':
+                string = self.STRING_RE.match(buffer, match.start())
+                if not string:
+                    # 字串尚未接收完整，保留到下一塊
+                    return match.start(), False
+                if self._depth == 1:
+                    self._last_string = string.group()
+                pos = string.end()
+                continue
+            
+            pos = match.end()
+            if char == ':':
+                if self._depth == 1 and self._last_string:
+                    self._key = json.loads(self._last_string)
+            elif char == ',':
+                if self._depth == 1:
+                    self._key = None
+            elif char in '{[':
+                self._depth += 1
+                if char == '[' and self._depth == 2 and self._key == 'aligned_words':
+                    self.state = 'words'
+                    return pos, True
+            else:
+                self._depth -= 1
+
+
+def stream_aligned_words(response, token: CancelToken, digest=None,
+                         retained: Optional[List[Dict]] = None) -> Iterator[Dict]:
+    """邊下載邊解析 aligned_words，逐一產生只含 word / start_s / end_s 的單詞資料
+
+    給定 retained 時，產生的單詞也會附加到此清單（供排序後備與字幕庫使用）。
+    """
+    parser = AlignedWordsParser(response.encoding or 'utf-8')
+    
+    def compact(batch: List[Dict]) -> Iterator[Dict]:
+        for word_data in batch:
+            word = {
+                'word': word_data.get('word'),
+                'start_s': word_data.get('start_s', 0),
+                'end_s': word_data.get('end_s', 0),
+            }
+            if retained is not None:
+                retained.append(word)
+            yield word
+    
+    for chunk in iter_response_body(response, token, digest):
+        yield from compact(parser.feed(chunk))
+    yield from compact(parser.close())
+
+
+def write_outputs(files: Dict[Path, str], token: Optional[CancelToken] = None):
+    """寫入多個輸出檔案
+
+    先全部寫成 .part 暫存檔，確認未取消後才一次改名；
+    中途取消或失敗時會清除已寫出的暫存檔，不留下不完整的字幕。
+    """
+    token = token or CancelToken()
+    parts = []
+    try:
+        for path, content in files.items():
+            token.check()
+            part_path = path.with_name(path.name + '.part')
+            parts.append(part_path)
+            part_path.write_text(content, encoding='utf-8')
+        
+        token.check()
+        for path in files:
+            os.replace(path.with_name(path.name + '.part'), path)
+    except BaseException:
+        for part_path in parts:
+            try:
+                part_path.unlink()
+            except FileNotFoundError:
+                pass
+        raise
+
+
+class APIError(Exception):
+    """API 回傳錯誤狀態碼"""
+    
+    def __init__(self, status_code: int):
+        super().__init__(f"API 回傳錯誤狀態碼: {status_code}")
+        self.status_code = status_code
+
+
+def aligned_lyrics_url(song_id: str) -> str:
+    """歌曲字幕資料的 API 網址"""
+    return f"{API_BASE}/api/gen/{song_id}/aligned_lyrics/v2/"
+
+
+def clip_url(song_id: str) -> str:
+    """歌曲中繼資料（標題等）的 API 網址"""
+    return f"{API_BASE}/api/clip/{song_id}"
+
+
+def api_headers(session_cookie: str) -> Dict[str, str]:
+    """API 請求共用的標頭"""
+    return {
+        'Authorization': f'Bearer {session_cookie}',
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    }
+
+
+class SingleFlight:
+    """合併同時進行的相同請求
+
+    同一個鍵同時只會執行一次 func，其他呼叫者等待並取得同一個結果或例外。
+    結果只在請求進行期間共用，完成後的呼叫會重新執行。
+    執行中的呼叫者被取消時，仍在等待且未被取消的呼叫者會重新發出請求。
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[Tuple, Future] = {}
+    
+    def do(self, key: Tuple, func: Callable, token: Optional[CancelToken] = None):
+        while True:
+            with self.lock:
+                future = self.calls.get(key)
+                leader = future is None
+                if leader:
+                    future = self.calls[key] = Future()
+            if leader:
+                try:
+                    result = func()
+                except BaseException as e:
+                    future.set_exception(e)
+                    raise
+                else:
+                    future.set_result(result)
+                    return result
+                finally:
+                    with self.lock:
+                        del self.calls[key]
+            
+            done = threading.Event()
+            future.add_done_callback(lambda _: done.set())
+            remove = token.add_callback(done.set) if token is not None else None
+            try:
+                # 期限不會觸發回呼，等待時間不超過剩餘時間
+                while not done.wait(token.remaining() if token is not None else None):
+                    token.check()
+            finally:
+                if remove is not None:
+                    remove()
+            if token is not None:
+                token.check()
+            try:
+                return future.result()
+            except DownloadCancelled:
+                # 取消的是執行中的呼叫者，不是自己
+                continue
+
+
+_in_flight = SingleFlight()
+
+
+def fetch_song_title(song_id: str, session_cookie: str, token: CancelToken,
+                     metadata: Optional[MetadataCache] = None) -> str:
+    """取得歌曲標題並寫入標題快取，錯誤狀態碼拋出 APIError；同時進行的相同請求會合併"""
+    
+    def request() -> str:
+        response, data, _ = fetch_json(clip_url(song_id), api_headers(session_cookie), token)
+        if data is None:
+            raise APIError(response.status_code)
+        title = data.get('title') if isinstance(data, dict) else None
+        return title.strip() if isinstance(title, str) else ''
+    
+    title = _in_flight.do(('title', song_id, session_cookie), request, token)
+    if metadata is not None:
+        metadata.put(song_id, title)
+    return title
+
+
+def submit_background(func: Callable) -> Future:
+    """在背景執行緒中執行 func，回傳其 Future
+
+    用於與主要請求同時發出的次要請求；func 應自行依權杖停止。
+    """
+    future = Future()
+    
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+    
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+class TitleLookup:
+    """與字幕請求同時在背景查詢歌曲標題
+
+    標題不在標題快取中且 needed 為 True 時才發出請求。查詢使用歌曲權杖的子權杖，
+    不會超過歌曲的期限；result() 最多等待 TITLE_WAIT_SECONDS 秒，且不超過剩餘時間的一半，
+    留下時間寫入字幕。查詢失敗、逾時或被取消時回傳 None，呼叫端改用歌曲 ID 命名，
+    不在同步清單中指定檔名，下次執行會再查詢。用完後必須呼叫 close()。
+    """
+    
+    def __init__(self, song_id: str, session_cookie: str, token: CancelToken,
+                 metadata: MetadataCache, needed: bool):
+        self.song_id = song_id
+        self.parent = token
+        self.token = CancelToken(parent=token)
+        self.title = metadata.get_title(song_id)
+        self.future = None
+        if self.title is None and needed:
+            self.future = submit_background(
+                lambda: fetch_song_title(song_id, session_cookie, self.token, metadata)
+            )
+    
+    def result(self) -> Optional[str]:
+        if self.future is None:
+            return self.title
+        future, self.future = self.future, None
+        remaining = self.parent.remaining()
+        wait_seconds = TITLE_WAIT_SECONDS if remaining is None else min(TITLE_WAIT_SECONDS, remaining / 2)
+        try:
+            self.title = future.result(timeout=wait_seconds)
+        except FutureTimeoutError:
+            self.token.cancel('標題查詢逾時')
+            print(f"⚠️ [{self.song_id}] 歌曲標題查詢逾時，改用歌曲 ID 命名")
+        except DownloadCancelled as e:
+            print(f"⚠️ [{self.song_id}] 歌曲標題查詢已停止，改用歌曲 ID 命名: {e}")
+        except (APIError, requests.exceptions.RequestException, ValueError) as e:
+            print(f"⚠️ [{self.song_id}] 無法取得歌曲標題，改用歌曲 ID 命名: {e}")
+        return self.title
+    
+    def close(self):
+        self.token.cancel('不再需要標題')
+        self.token.close()
+
+
+def fetch_subtitles(song_id: str, session_cookie: str, token: CancelToken,
+                    need_word_timings: bool = False, etag: Optional[str] = None) -> Optional[Dict]:
+    """取得歌曲的字幕資料並分段，不輸出任何訊息
+
+    回傳 {'etag', 'content_hash', 'words', 'segments', 'word_timings'}；
+    給定的 etag 與伺服器相同（304）時回傳 None，錯誤狀態碼拋出 APIError。
+    回應是邊下載邊解析與分段的，不必先緩衝整份內容。
+    同時對同一首歌曲發出的相同請求只送出一次，結果由所有呼叫者共用（見 SingleFlight），
+    回傳的內容不可修改。
+    """
+    key = ('subtitles', song_id, session_cookie, need_word_timings, etag)
+    return _in_flight.do(
+        key, lambda: request_subtitles(song_id, session_cookie, token, need_word_timings, etag), token
+    )
+
+
+def request_subtitles(song_id: str, session_cookie: str, token: CancelToken,
+                      need_word_timings: bool = False, etag: Optional[str] = None) -> Optional[Dict]:
+    """實際發出 fetch_subtitles 的請求"""
+    headers = api_headers(session_cookie)
+    if etag:
+        headers['If-None-Match'] = etag
+    
+    url = aligned_lyrics_url(song_id)
+    response = run_cancellable(lambda: open_response(url, headers, token), token)
+    if response.status_code == 304:
+        response.close()
+        return None
+    if not response.ok:
+        response.close()
+        raise APIError(response.status_code)
+    
+    digest = hashlib.sha256()
+    words: List[Dict] = []
+    word_stream = stream_aligned_words(response, token, digest, words)
+    word_timings = WordTimings() if need_word_timings else None
+    try:
+        segments = list(iter_segments(word_stream, token, word_timings, require_sorted=True))
+    except WordsOutOfOrder:
+        # API 未依時間排序時，讀完剩餘內容後改以排序後的完整清單分段
+        for _ in word_stream:
+            pass
+        word_timings = WordTimings() if need_word_timings else None
+        segments = build_segments(words, token, word_timings)
+    finally:
+        word_stream.close()
+    
+    return {
+        'etag': response.headers.get('ETag'),
+        'content_hash': digest.hexdigest(),
+        'words': words,
+        'segments': segments,
+        'word_timings': word_timings,
+    }
+
+
+def object_path(objects_dir: Path, digest: str) -> Path:
+    """內容雜湊對應的物件路徑（以前兩碼分目錄，避免單一目錄過大）"""
+    return objects_dir / digest[:2] / digest
+
+
+def write_deduplicated(files: Dict[Path, str], objects_dir: Path,
+                       token: Optional[CancelToken] = None) -> Tuple[int, int]:
+    """以內容定址方式寫入輸出檔案，回傳 (新寫入的物件數, 重新連結的檔案數)
+
+    每份內容只在 objects_dir 存一次，各歌曲的檔名為該物件的硬連結；
+    物件已存在時不再寫入內容，檔名已指向同一物件時完全不做任何 I/O。
+    檔案系統不支援硬連結時改為寫入一般檔案。連結以 .part 暫存名建立後再改名，
+    讀取端不會看到不完整的檔案。
+    """
+    token = token or CancelToken()
+    written = linked = 0
+    for path, content in files.items():
+        token.check()
+        data = content.encode('utf-8')
+        target = object_path(objects_dir, hashlib.sha256(data).hexdigest())
+        
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            part_path = target.with_name(f"{target.name}.{threading.get_ident()}.part")
+            part_path.write_bytes(data)
+            os.replace(part_path, target)
+            written += 1
+        
+        try:
+            if os.path.samefile(path, target):
+                continue
+        except OSError:
+            pass
+        
+        part_path = path.with_name(path.name + '.part')
+        try:
+            part_path.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            os.link(target, part_path)
+        except OSError:
+            part_path.write_bytes(data)
+        os.replace(part_path, path)
+        linked += 1
+    return written, linked
+
+
+def previous_sync_state(song_id: str, filename: Optional[str], output_path: Path, manifest: Manifest,
+                        formats: List[str], write_files: bool = True,
+                        store: Optional[SubtitleStore] = None,
+                        archive: Optional[SubtitleArchive] = None) -> Optional[Dict]:
+    """可沿用的上次同步狀態（用來發出條件式請求）；必須重新產生時回傳 None
+
+    上次的輸出檔案、字幕庫與封存檔都還保有相同內容時才能沿用。
+    檔名還不知道時必然尚未以此檔名輸出過。
+    """
+    output_names = [
+        f"{filename}{SUBTITLE_FORMATS[name][0]}" for name in formats
+    ] if filename is not None else []
+    if filename is None and (write_files or archive is not None):
+        return None
+    if not manifest.outputs_intact(song_id, output_path, output_names if write_files else []):
+        return None
+    previous = manifest.get(song_id)
+    if store is not None and not store.has_song(song_id, previous.get('content_hash')):
+        return None
+    if archive is not None and not archive.has_song(song_id, previous.get('content_hash'), output_names):
+        return None
+    return previous
+
+
+def fetch_aligned_body(song_id: str, session_cookie: str, token: CancelToken,
+                       etag: Optional[str] = None) -> Optional[Dict]:
+    """取得字幕 API 的完整回應內容但不解析，供分段管線交給其他行程處理
+
+    回傳 {'etag', 'content_hash', 'body', 'encoding'}；給定的 etag 與伺服器相同（304）
+    時回傳 None，錯誤狀態碼拋出 APIError。content_hash 與 fetch_subtitles 相同。
+    同時進行的相同請求會合併（見 SingleFlight）。
+    """
+    key = ('body', song_id, session_cookie, etag)
+    return _in_flight.do(key, lambda: request_aligned_body(song_id, session_cookie, token, etag), token)
+
+
+def request_aligned_body(song_id: str, session_cookie: str, token: CancelToken,
+                         etag: Optional[str] = None) -> Optional[Dict]:
+    """實際發出 fetch_aligned_body 的請求"""
+    headers = api_headers(session_cookie)
+    if etag:
+        headers['If-None-Match'] = etag
+    url = aligned_lyrics_url(song_id)
+    response = run_cancellable(lambda: open_response(url, headers, token), token)
+    if response.status_code == 304:
+        response.close()
+        return None
+    if not response.ok:
+        response.close()
+        raise APIError(response.status_code)
+    
+    digest = hashlib.sha256()
+    body = b''.join(iter_response_body(response, token, digest))
+    return {
+        'etag': response.headers.get('ETag'),
+        'content_hash': digest.hexdigest(),
+        'body': body,
+        'encoding': response.encoding or 'utf-8',
+    }
+
+
+def render_aligned_body(body: bytes, encoding: str, formats: List[str], keep_words: bool = False) -> Dict:
+    """解析字幕 API 回應、分段並產生各格式字幕（在分段管線的行程池中執行）
+
+    回傳 {'word_count', 'segment_count', 'rendered', 'words', 'segments'}；
+    keep_words=False 時不回傳單詞與段落，減少行程間傳遞的資料量。
+    """
+    data = json.loads(body.decode(encoding))
+    entries = data.get('aligned_words') if isinstance(data, dict) else None
+    words = [
+        {'word': entry.get('word'), 'start_s': entry.get('start_s', 0), 'end_s': entry.get('end_s', 0)}
+        for entry in entries or [] if isinstance(entry, dict)
+    ]
+    word_timings = WordTimings() if formats_need_words(formats) else None
+    segments = build_segments(words, word_timings=word_timings)
+    return {
+        'word_count': len(words),
+        'segment_count': len(segments),
+        'rendered': render_formats(segments, word_timings, formats) if segments else {},
+        'words': words if keep_words else None,
+        'segments': segments if keep_words else None,
+    }
+
+
+def download_subtitles(song_url: str, session_cookie: str, output_dir: Optional[str] = None,
+                       token: Optional[CancelToken] = None, manifest: Optional[Manifest] = None,
+                       force: bool = False, store: Optional[SubtitleStore] = None,
+                       write_files: bool = True, formats: Optional[List[str]] = None,
+                       archive: Optional[SubtitleArchive] = None, dedup: bool = False,
+                       metadata: Optional[MetadataCache] = None) -> bool:
+    """下載字幕檔案
+
+    依輸出目錄的同步清單做增量同步：先以 ETag 發出條件式請求，
+    若伺服器未回傳 ETag 則比對回應內容雜湊，沒有變更的歌曲不會重寫檔案。
+    force=True 時忽略同步清單，一律重新下載並寫入。
+    給定 store 時會同時寫入 SQLite 字幕庫；write_files=False 時只寫入字幕庫。
+    formats 為要輸出的格式名稱（見 SUBTITLE_FORMATS），預設為 SRT 與 LRC。
+    給定 archive 時各格式寫入封存檔（通常搭配 write_files=False）。
+    dedup=True 時以內容定址方式寫入，相同內容的字幕只存一份（見 write_deduplicated）。
+    檔名取自歌曲標題：標題不在標題快取（metadata）中時，與字幕請求同時向 API 查詢，
+    不會增加每首歌曲的等待時間；同名歌曲的檔名由同步清單決定（見 Manifest.claim_filename）。
+    """
+    # 提取歌曲 ID
+    song_id = extract_song_id(song_url)
+    if not song_id:
+        print(f"❌ 錯誤：無法從 URL 中提取歌曲 ID")
+        print(f"   請確認 URL 格式為：https://suno.com/song/[歌曲ID]")
+        return False
+    
+    print(f"📝 歌曲 ID: {song_id}")
+    token = token or CancelToken()
+    
+    # 設定輸出目錄
+    if output_dir:
+        output_path = Path(output_dir)
+    else:
+        output_path = Path.cwd()
+    
+    output_path.mkdir(parents=True, exist_ok=True)
+    
+    # 未由批次傳入時，單獨使用此輸出目錄的同步清單
+    owns_manifest = manifest is None
+    if owns_manifest:
+        manifest = Manifest.for_dir(output_path)
+    owns_metadata = metadata is None
+    if owns_metadata:
+        metadata = MetadataCache.default()
+    
+    # 檔名：已在此目錄指定過的沿用；標題未知時與字幕請求同時查詢
+    formats = formats or DEFAULT_FORMATS
+    filename = manifest.claimed_filename(song_id)
+    title_lookup = TitleLookup(song_id, session_cookie, token, metadata,
+                               filename is None or store is not None)
+    title = title_lookup.title
+    if filename is None and title is not None:
+        filename = manifest.claim_filename(song_id, title)
+    
+    previous = None
+    if not force:
+        previous = previous_sync_state(song_id, filename, output_path, manifest, formats,
+                                       write_files, store, archive)
+    print(f"🌐 正在請求字幕資料...")
+    
+    try:
+        result = fetch_subtitles(song_id, session_cookie, token, formats_need_words(formats),
+                                 previous.get('etag') if previous else None)
+        
+        if result is None:
+            print(f"⏭ [{song_id}] 字幕未變更，略過")
+            return True
+        
+        words = result['words']
+        segments = result['segments']
+        word_timings = result['word_timings']
+        content_hash = result['content_hash']
+        
+        if not words:
+            print("❌ 該歌曲沒有字幕資料（aligned_words 為空）")
+            return False
+        
+        print(f"✅ 成功取得 {len(words)} 個單詞資料")
+        
+        if previous and previous.get('content_hash') == content_hash:
+            print(f"⏭ [{song_id}] 字幕內容雜湊相同，略過")
+            return True
+        
+        # 建立字幕段落
+        if not segments:
+            print("❌ 無法建立字幕段落")
+            return False
+        
+        print(f"📄 已建立 {len(segments)} 個字幕段落")
+        
+        # 標題只影響檔名；查詢失敗或逾時時改用歌曲 ID，且不指定檔名，下次執行會再查詢
+        title = title_lookup.result()
+        if filename is None and title is not None:
+            filename = manifest.claim_filename(song_id, title)
+        if title:
+            print(f"🎵 歌曲標題: {title}")
+        output_files = {
+            name: output_path / f"{filename or get_safe_filename('', song_id)}{SUBTITLE_FORMATS[name][0]}"
+            for name in formats
+        }
+        
+        # 生成各格式字幕
+        files = {}
+        if write_files or archive is not None:
+            rendered = render_formats(segments, word_timings, formats)
+        if write_files:
+            files = {output_files[name]: content for name, content in rendered.items()}
+            if dedup:
+                write_deduplicated(files, output_path / OBJECTS_DIR_NAME, token)
+            else:
+                write_outputs(files, token)
+            for name in formats:
+                print(f"✅ 已儲存 {name.upper()}: {output_files[name]}")
+        
+        if archive is not None:
+            token.check()
+            archive.add(song_id, content_hash, {
+                output_files[name].name: content for name, content in rendered.items()
+            })
+            print(f"✅ 已寫入封存檔: {archive.path}")
+        
+        if store is not None:
+            token.check()
+            store.put(song_id, title or '', content_hash, words, segments)
+            print(f"✅ 已寫入字幕庫: {store.path}")
+        
+        manifest.record(
+            song_id,
+            result['etag'],
+            content_hash,
+            {path.name: sha256_text(content) for path, content in files.items()}
+        )
+        return True
+        
+    except DownloadCancelled as e:
+        print(f"⏹ [{song_id}] 已停止：{e}")
+        return False
+    except APIError as e:
+        print(f"❌ {e}")
+        if e.status_code == 401:
+            print("   請確認 session cookie 是否有效")
+            print("   建議：在 suno.com 登出後重新登入，然後重新取得 cookie")
+        elif e.status_code == 404:
+            print("   該歌曲可能不存在或沒有字幕資料")
+        return False
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 網路請求錯誤: {e}")
+        return False
+    except json.JSONDecodeError as e:
+        print(f"❌ JSON 解析錯誤: {e}")
+        return False
+    except Exception as e:
+        print(f"❌ 發生錯誤: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        title_lookup.close()
+        if owns_manifest:
+            manifest.save()
+        if owns_metadata:
+            metadata.save()
+
+
+def read_url_list(path: Path) -> List[str]:
+    """讀取 URL 清單檔案（每行一個，忽略空行與 # 註解）"""
+    urls = []
+    for line in path.read_text(encoding='utf-8').splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            urls.append(line)
+    return urls
+
+
+# 可展開成多首歌曲的網址：播放清單與創作者頁面
+PLAYLIST_URL_RE = re.compile(r'suno\.com/playlist/([a-zA-Z0-9_-]+)', re.I)
+PROFILE_URL_RE = re.compile(r'suno\.com/@([a-zA-Z0-9_.-]+)', re.I)
+
+
+def collection_page_url(url: str) -> Optional[Callable[[int], str]]:
+    """播放清單或創作者頁面網址對應的分頁 API 網址產生函式；其他網址回傳 None"""
+    match = PLAYLIST_URL_RE.search(url)
+    if match:
+        playlist_id = match.group(1)
+        return lambda page: f"{API_BASE}/api/playlist/{playlist_id}/?page={page}"
+    match = PROFILE_URL_RE.search(url)
+    if match:
+        handle = urllib.parse.quote(match.group(1))
+        return lambda page: f"{API_BASE}/api/profiles/{handle}?page={page}&clips_sort_by=created_at"
+    return None
+
+
+def parse_collection_page(data) -> Tuple[List[Dict], Optional[int]]:
+    """從一頁結果取出歌曲（含 id 與 title）與歌曲總數（未提供時為 None）"""
+    if not isinstance(data, dict):
+        raise ValueError('分頁回應格式錯誤')
+    if 'playlist_clips' in data:
+        entries = [entry.get('clip', entry) for entry in data.get('playlist_clips') or []
+                   if isinstance(entry, dict)]
+        total = data.get('num_total_results')
+    else:
+        entries = data.get('clips') or []
+        total = data.get('num_total_clips', data.get('num_total_results'))
+    clips = [clip for clip in entries if isinstance(clip, dict) and clip.get('id')]
+    return clips, total if isinstance(total, int) else None
+
+
+def fetch_collection_page(page_url: str, session_cookie: str, token: CancelToken,
+                          limiter: Optional[RateLimiter] = None) -> Tuple[List[Dict], Optional[int]]:
+    """取得一頁歌曲；遇到 429 依 Retry-After 等待、5xx 稍候後重試"""
+    for attempt in range(PAGE_RETRIES + 1):
+        if limiter is not None:
+            limiter.acquire(token)
+        response, data, _ = fetch_json(page_url, api_headers(session_cookie), token)
+        if data is not None:
+            return parse_collection_page(data)
+        status = response.status_code
+        if attempt == PAGE_RETRIES or (status != 429 and status < 500):
+            raise APIError(status)
+        try:
+            delay = float(response.headers.get('Retry-After', ''))
+        except ValueError:
+            delay = 2 ** attempt
+        token.sleep(min(delay, 60))
+    raise APIError(status)
+
+
+class SongSource:
+    """批次下載的歌曲來源：依序產生歌曲網址，並展開播放清單與創作者頁面
+
+    展開時先取得第一頁得知總數與每頁大小，其餘頁面以 workers 個執行緒同時請求
+    （受 limiter 限流）。每頁一完成就產生其中的歌曲，下載工作池可在後面的頁面
+    仍在載入時開始處理；分頁中的標題會寫入標題快取，下載時不必再查詢。
+    列舉失敗的來源記在 failed。
+    """
+    
+    def __init__(self, urls: List[str], session_cookie: str, token: CancelToken,
+                 metadata: Optional[MetadataCache] = None, workers: int = PAGE_WORKERS,
+                 rate_limit: float = PAGE_RATE_LIMIT):
+        self.urls = urls
+        self.session_cookie = session_cookie
+        self.token = token
+        self.metadata = metadata
+        self.workers = max(1, workers)
+        self.limiter = RateLimiter(rate_limit, self.workers) if rate_limit > 0 else None
+        self.failed: List[str] = []
+    
+    @staticmethod
+    def has_collections(urls: List[str]) -> bool:
+        return any(collection_page_url(url) for url in urls)
+    
+    def __iter__(self) -> Iterator[str]:
+        for url in self.urls:
+            page_url = collection_page_url(url)
+            if page_url is None:
+                yield url
+                continue
+            try:
+                yield from self.expand(url, page_url)
+            except DownloadCancelled:
+                return
+            except (APIError, ValueError, requests.exceptions.RequestException) as e:
+                print(f"❌ 無法列舉 {url}: {e}")
+                self.failed.append(url)
+    
+    def expand(self, url: str, page_url: Callable[[int], str]) -> Iterator[str]:
+        """依完成順序產生集合中各歌曲的網址"""
+        token = CancelToken(parent=self.token)
+        seen = set()
+        
+        def fetch(page: int):
+            return fetch_collection_page(page_url(page), self.session_cookie, token, self.limiter)
+        
+        def songs(clips: List[Dict]) -> Iterator[str]:
+            for clip in clips:
+                song_id = str(clip['id'])
+                # 分頁期間新增的歌曲會讓後面的頁面重複出現前一頁的項目
+                if song_id in seen:
+                    continue
+                seen.add(song_id)
+                if self.metadata is not None and isinstance(clip.get('title'), str):
+                    self.metadata.put(song_id, clip['title'].strip())
+                yield canonical_song_url(song_id)
+        
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            clips, total = fetch(1)
+            page_size = len(clips)
+            last_page = None
+            if total is not None and page_size:
+                last_page = max(1, math.ceil(total / page_size))
+            if total is not None:
+                print(f"📂 {url}：共 {total} 首，{last_page or 1} 頁")
+            else:
+                print(f"📂 {url}：正在列舉...")
+            yield from songs(clips)
+            
+            # 總數未知時持續往後請求，直到出現空白或不足一頁的頁面
+            next_page = 2
+            pending = {}
+            while page_size:
+                while (len(pending) < self.workers and
+                       (last_page is None or next_page <= last_page)):
+                    pending[executor.submit(fetch, next_page)] = next_page
+                    next_page += 1
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page = pending.pop(future)
+                    clips, _ = future.result()
+                    if len(clips) < page_size and (last_page is None or page < last_page):
+                        last_page = page
+                    yield from songs(clips)
+                # 已知的最後一頁之後還在請求的頁面不再需要
+                for future, page in list(pending.items()):
+                    if last_page is not None and page > last_page and future.cancel():
+                        del pending[future]
+            print(f"📂 {url}：列舉完成，{len(seen)} 首")
+        finally:
+            token.cancel('列舉結束')
+            token.close()
+            executor.shutdown(wait=True)
+
+
+def download_job(song_url: str, session_cookie: str, output_dir: Optional[str],
+                 timeout: Optional[float], parent: CancelToken,
+                 manifest: Optional[Manifest] = None, force: bool = False,
+                 store: Optional[SubtitleStore] = None, write_files: bool = True,
+                 journal: Optional[JobJournal] = None, formats: Optional[List[str]] = None,
+                 archive: Optional[SubtitleArchive] = None, dedup: bool = False,
+                 metadata: Optional[MetadataCache] = None) -> bool:
+    """執行單一批次項目；期限從項目開始執行時起算"""
+    token = CancelToken(timeout, parent)
+    try:
+        if token.cancelled:
+            return False
+        if journal is not None:
+            journal.mark(song_url, 'started')
+        ok = download_subtitles(
+            song_url, session_cookie, output_dir, token, manifest, force, store, write_files,
+            formats, archive, dedup, metadata
+        )
+        if journal is not None:
+            journal.mark(song_url, 'done' if ok else 'failed')
+        return ok
+    finally:
+        token.close()
+
+
+def download_batch(song_urls: Iterable[str], session_cookie: str, output_dir: Optional[str] = None,
+                   workers: int = 1, timeout: Optional[float] = None,
+                   token: Optional[CancelToken] = None, force: bool = False,
+                   store: Optional[SubtitleStore] = None, write_files: bool = True,
+                   journal: Optional[JobJournal] = None, formats: Optional[List[str]] = None,
+                   archive: Optional[SubtitleArchive] = None, dedup: bool = False,
+                   metadata: Optional[MetadataCache] = None,
+                   progress: Optional[Callable[[str, bool], None]] = None) -> Tuple[int, int]:
+    """並行下載多首歌曲，回傳 (成功數量, 歌曲總數)
+
+    每首歌曲有各自的期限，卡住的項目只會逾時失敗，不會拖住整個工作池。
+    按下 Ctrl+C 時會取消所有進行中的項目並等待它們清理完畢。
+    給定 journal 時，日誌中已完成的歌曲直接計為成功，不再重新下載。
+    song_urls 可以是邊列舉邊產生的迭代器（見 SongSource），
+    只會預先提交少量項目，前面的歌曲不必等整份清單列舉完畢就開始下載。
+    給定 progress 時，每首歌曲完成後以 (歌曲網址, 是否成功) 呼叫。
+    歌曲網址會先正規化，同一首歌曲只下載一次（見 UniqueSongs）。
+    """
+    token = token or CancelToken()
+    workers = max(1, workers)
+    succeeded = total = skipped = 0
+    # 清單先整份去除重複，工作日誌記錄的總數才是實際的歌曲數；迭代器則邊產生邊去除
+    unique = UniqueSongs(song_urls)
+    song_urls = list(unique) if isinstance(song_urls, list) else unique
+    
+    if journal is not None:
+        if isinstance(song_urls, list):
+            journal.append({'event': 'job', 'total': len(song_urls)})
+        else:
+            journal.append({'event': 'job'})
+    
+    output_path = Path(output_dir) if output_dir else Path.cwd()
+    output_path.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest.for_dir(output_path)
+    metadata = metadata or MetadataCache.default()
+    source = iter(song_urls)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < workers * 2:
+                    try:
+                        song_url = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    except KeyboardInterrupt:
+                        print("\n⏹ 收到中斷，正在取消進行中的下載...")
+                        token.cancel('使用者中斷')
+                        exhausted = True
+                        break
+                    total += 1
+                    if journal is not None and journal.is_done(song_url):
+                        succeeded += 1
+                        skipped += 1
+                        continue
+                    future = executor.submit(
+                        download_job, song_url, session_cookie, output_dir,
+                        timeout, token, manifest, force, store, write_files, journal, formats,
+                        archive, dedup, metadata
+                    )
+                    pending[future] = song_url
+                if not pending:
+                    continue
+                try:
+                    done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                except KeyboardInterrupt:
+                    print("\n⏹ 收到中斷，正在取消進行中的下載...")
+                    token.cancel('使用者中斷')
+                    continue
+                for future in done:
+                    song_url = pending.pop(future)
+                    ok = future.result()
+                    succeeded += 1 if ok else 0
+                    if progress is not None:
+                        progress(song_url, ok)
+    finally:
+        manifest.save()
+        metadata.save()
+        if store is not None:
+            store.flush()
+        if journal is not None and not isinstance(song_urls, list):
+            # 展開後的歌曲數量在列舉結束後才知道
+            journal.append({'event': 'total', 'total': total})
+    
+    if unique.duplicates:
+        print(f"🔁 略過 {unique.duplicates} 個重複的歌曲網址")
+    if skipped:
+        print(f"⏭ 依工作日誌略過 {skipped} 首已完成的歌曲")
+    return succeeded, total
+
+
+class StageStats:
+    """分段管線單一階段的統計
+
+    busy 為實際處理的時間，blocked 為處理完後等待下游佇列空出位置的時間（背壓）。
+    使用率 = busy /（經過時間 × 工作者數），使用率最高的階段就是吞吐量的瓶頸。
+    """
+    
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self._lock = threading.Lock()
+    
+    def add(self, busy: float, blocked: float = 0.0):
+        with self._lock:
+            self.items += 1
+            self.busy += busy
+            self.blocked += blocked
+    
+    def utilization(self, elapsed: float) -> float:
+        return min(1.0, self.busy / (elapsed * self.workers)) if elapsed > 0 else 0.0
+    
+    def summary(self, elapsed: float) -> str:
+        average = self.busy / self.items * 1000 if self.items else 0.0
+        return (f"{self.name}：{self.workers} 個工作者，處理 {self.items} 首，"
+                f"使用率 {self.utilization(elapsed):.0%}，平均 {average:.0f} ms/首，"
+                f"等待下游 {self.blocked:.1f} 秒")
+
+
+class DownloadPipeline:
+    """批次下載的分段管線：擷取（執行緒）→ 分段與格式化（行程池）→ 寫入（執行緒）
+
+    各階段之間以有界佇列相連，下游較慢時上游會停下來等待（背壓），
+    無論輸入清單多大，同時在記憶體中的歌曲數都不超過各佇列長度的總和。
+    同步清單、字幕庫、封存檔、工作日誌與標題快取的行為與 download_batch 相同；
+    每首歌曲的期限（timeout）只套用在擷取階段。結束時輸出各階段的使用率。
+    """
+    
+    def __init__(self, session_cookie: str, output_dir: Optional[str] = None,
+                 fetch_workers: int = 4, cpu_workers: int = PIPELINE_CPU_WORKERS,
+                 write_workers: int = PIPELINE_WRITE_WORKERS, queue_size: int = PIPELINE_QUEUE_SIZE,
+                 timeout: Optional[float] = None, token: Optional[CancelToken] = None,
+                 force: bool = False, store: Optional[SubtitleStore] = None,
+                 write_files: bool = True, journal: Optional[JobJournal] = None,
+                 formats: Optional[List[str]] = None, archive: Optional[SubtitleArchive] = None,
+                 dedup: bool = False, metadata: Optional[MetadataCache] = None,
+                 progress: Optional[Callable[[str, bool], None]] = None):
+        self.session_cookie = session_cookie
+        self.output_path = Path(output_dir) if output_dir else Path.cwd()
+        self.timeout = timeout
+        self.token = token or CancelToken()
+        self.force = force
+        self.store = store
+        self.write_files = write_files
+        self.journal = journal
+        self.formats = formats or DEFAULT_FORMATS
+        self.archive = archive
+        self.dedup = dedup
+        self.metadata = metadata or MetadataCache.default()
+        self.progress = progress
+        self.manifest: Optional[Manifest] = None
+        
+        self.stages = [
+            StageStats('擷取', max(1, fetch_workers)),
+            StageStats('分段', max(1, cpu_workers)),
+            StageStats('寫入', max(1, write_workers)),
+        ]
+        queue_size = max(1, queue_size)
+        self.queues = [queue.Queue(queue_size) for _ in self.stages]
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.succeeded = 0
+    
+    def run(self, song_urls: Iterable[str]) -> Tuple[int, int]:
+        """處理所有歌曲，回傳 (成功數量, 歌曲總數)；重複的歌曲只處理一次（見 UniqueSongs）"""
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        self.manifest = Manifest.for_dir(self.output_path)
+        total = skipped = 0
+        unique = UniqueSongs(song_urls)
+        song_urls = list(unique) if isinstance(song_urls, list) else unique
+        if self.journal is not None:
+            if isinstance(song_urls, list):
+                self.journal.append({'event': 'job', 'total': len(song_urls)})
+            else:
+                self.journal.append({'event': 'job'})
+        
+        started = time.monotonic()
+        self.pool = ProcessPoolExecutor(max_workers=self.stages[1].workers)
+        workers = [self._fetch_worker, self._segment_worker, self._write_worker]
+        threads = [
+            [threading.Thread(target=worker, daemon=True) for _ in range(stage.workers)]
+            for stage, worker in zip(self.stages, workers)
+        ]
+        for stage_threads in threads:
+            for thread in stage_threads:
+                thread.start()
+        
+        try:
+            source = iter(song_urls)
+            while not self.token.cancelled:
+                try:
+                    song_url = next(source)
+                except StopIteration:
+                    break
+                total += 1
+                if self.journal is not None and self.journal.is_done(song_url):
+                    with self._lock:
+                        self.succeeded += 1
+                    skipped += 1
+                    continue
+                self._put(self.queues[0], song_url)
+        except KeyboardInterrupt:
+            print("\n⏹ 收到中斷，正在取消進行中的下載...")
+            self.token.cancel('使用者中斷')
+        finally:
+            # 依序關閉各階段：上游全部結束後才通知下游，佇列中的項目都會被處理或標記失敗
+            for stage_queue, stage_threads in zip(self.queues, threads):
+                for _ in stage_threads:
+                    self._put(stage_queue, None)
+                self._join(stage_threads)
+            self.pool.shutdown()
+            self.manifest.save()
+            self.metadata.save()
+            if self.store is not None:
+                self.store.flush()
+            if self.journal is not None and not isinstance(song_urls, list):
+                self.journal.append({'event': 'total', 'total': total})
+        
+        elapsed = time.monotonic() - started
+        if unique.duplicates:
+            print(f"🔁 略過 {unique.duplicates} 個重複的歌曲網址")
+        if skipped:
+            print(f"⏭ 依工作日誌略過 {skipped} 首已完成的歌曲")
+        print(f"📈 分段管線統計（{elapsed:.1f} 秒）")
+        for stage in self.stages:
+            print(f"   {stage.summary(elapsed)}")
+        bottleneck = max(self.stages, key=lambda stage: stage.utilization(elapsed))
+        if bottleneck.items:
+            print(f"   瓶頸：{bottleneck.name}")
+        return self.succeeded, total
+    
+    def _put(self, stage_queue: queue.Queue, item) -> float:
+        """放入下一階段的佇列，佇列已滿時等待；回傳等待的秒數"""
+        started = time.monotonic()
+        while True:
+            try:
+                stage_queue.put(item, timeout=0.5)
+                return time.monotonic() - started
+            except queue.Full:
+                continue
+    
+    def _join(self, threads: List[threading.Thread]):
+        for thread in threads:
+            while thread.is_alive():
+                try:
+                    thread.join(0.5)
+                except KeyboardInterrupt:
+                    print("\n⏹ 收到中斷，正在取消進行中的下載...")
+                    self.token.cancel('使用者中斷')
+    
+    def _finish(self, song_url: str, ok: bool, message: str):
+        """記錄一首歌曲的最終結果"""
+        if self.journal is not None:
+            self.journal.mark(song_url, 'done' if ok else 'failed')
+        with self._lock:
+            if ok:
+                self.succeeded += 1
+        if self.progress is not None:
+            self.progress(song_url, ok)
+        song_id = extract_song_id(song_url) or song_url
+        print(f"{'✅' if ok else '❌'} [{song_id}] {message}")
+    
+    def _fetch_worker(self):
+        while True:
+            song_url = self.queues[0].get()
+            if song_url is None:
+                return
+            started = time.monotonic()
+            item = self._fetch(song_url)
+            busy = time.monotonic() - started
+            blocked = self._put(self.queues[1], item) if item is not None else 0.0
+            self.stages[0].add(busy, blocked)
+    
+    def _fetch(self, song_url: str) -> Optional[Dict]:
+        """取得一首歌曲的回應內容與檔名；不需要後續處理時回傳 None"""
+        if self.journal is not None:
+            self.journal.mark(song_url, 'started')
+        song_id = extract_song_id(song_url)
+        if not song_id:
+            self._finish(song_url, False, '無法從 URL 中提取歌曲 ID')
+            return None
+        
+        token = CancelToken(self.timeout, self.token)
+        title_lookup = None
+        try:
+            token.check()
+            filename = self.manifest.claimed_filename(song_id)
+            title_lookup = TitleLookup(song_id, self.session_cookie, token, self.metadata,
+                                       filename is None or self.store is not None)
+            title = title_lookup.title
+            if filename is None and title is not None:
+                filename = self.manifest.claim_filename(song_id, title)
+            
+            previous = None
+            if not self.force:
+                previous = previous_sync_state(song_id, filename, self.output_path, self.manifest,
+                                               self.formats, self.write_files, self.store, self.archive)
+            fetched = fetch_aligned_body(song_id, self.session_cookie, token,
+                                         previous.get('etag') if previous else None)
+            if fetched is None:
+                self._finish(song_url, True, '字幕未變更，略過')
+                return None
+            if previous and previous.get('content_hash') == fetched['content_hash']:
+                self._finish(song_url, True, '字幕內容雜湊相同，略過')
+                return None
+            
+            title = title_lookup.result()
+            if filename is None and title is not None:
+                filename = self.manifest.claim_filename(song_id, title)
+            return dict(fetched, url=song_url, song_id=song_id, title=title,
+                        filename=filename or get_safe_filename('', song_id))
+        except DownloadCancelled as e:
+            self._finish(song_url, False, f"已停止：{e}")
+        except APIError as e:
+            self._finish(song_url, False, str(e))
+        except requests.exceptions.RequestException as e:
+            self._finish(song_url, False, f"網路請求錯誤: {e}")
+        except Exception as e:
+            # 工作執行緒不能因單一歌曲而結束，否則上游會一直等待佇列空出位置
+            self._finish(song_url, False, f"發生錯誤: {type(e).__name__}: {e}")
+        finally:
+            if title_lookup is not None:
+                title_lookup.close()
+            token.close()
+        return None
+    
+    def _segment_worker(self):
+        while True:
+            item = self.queues[1].get()
+            if item is None:
+                return
+            if self.token.cancelled:
+                self._finish(item['url'], False, f"已停止：{self.token.reason}")
+                continue
+            started = time.monotonic()
+            try:
+                future = self.pool.submit(render_aligned_body, item.pop('body'), item['encoding'],
+                                          self.formats, self.store is not None)
+                item.update(future.result())
+            except Exception as e:
+                # 包含 JSON 解析錯誤與行程池意外終止
+                self.stages[1].add(time.monotonic() - started)
+                self._finish(item['url'], False, f"分段失敗: {e}")
+                continue
+            busy = time.monotonic() - started
+            if not item['rendered']:
+                self.stages[1].add(busy)
+                self._finish(item['url'], False, '沒有字幕資料')
+                continue
+            self.stages[1].add(busy, self._put(self.queues[2], item))
+    
+    def _write_worker(self):
+        while True:
+            item = self.queues[2].get()
+            if item is None:
+                return
+            if self.token.cancelled:
+                self._finish(item['url'], False, f"已停止：{self.token.reason}")
+                continue
+            started = time.monotonic()
+            try:
+                self._write(item)
+            except Exception as e:
+                self._finish(item['url'], False, f"寫入失敗: {type(e).__name__}: {e}")
+            else:
+                label = item['title'] or item['filename']
+                self._finish(item['url'], True, f"{label}：{item['segment_count']} 個段落")
+            self.stages[2].add(time.monotonic() - started)
+    
+    def _write(self, item: Dict):
+        song_id, content_hash = item['song_id'], item['content_hash']
+        names = {name: f"{item['filename']}{SUBTITLE_FORMATS[name][0]}" for name in item['rendered']}
+        files = {}
+        if self.write_files:
+            files = {self.output_path / names[name]: content for name, content in item['rendered'].items()}
+            if self.dedup:
+                write_deduplicated(files, self.output_path / OBJECTS_DIR_NAME, self.token)
+            else:
+                write_outputs(files, self.token)
+        if self.archive is not None:
+            self.archive.add(song_id, content_hash, {
+                names[name]: content for name, content in item['rendered'].items()
+            })
+        if self.store is not None:
+            self.store.put(song_id, item['title'] or '', content_hash, item['words'], item['segments'])
+        self.manifest.record(
+            song_id,
+            item['etag'],
+            content_hash,
+            {path.name: sha256_text(content) for path, content in files.items()}
+        )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """建立命令列參數解析器"""
+    parser = argparse.ArgumentParser(
+        description="從 Suno 歌曲網址下載 SRT 和 LRC 格式字幕檔案"
+    )
+    parser.add_argument('song_url', nargs='?',
+                        help='Suno 歌曲、播放清單或創作者頁面網址，或每行一個網址的清單檔案')
+    parser.add_argument('session_cookie', nargs='?',
+                        help='從瀏覽器取得的 __session cookie 值')
+    parser.add_argument('output_dir', nargs='?',
+                        help='儲存檔案的路徑，預設為當前目錄')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='批次下載的並行數量（預設 1）')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='每首歌曲的整體期限（秒），超過即取消該首歌曲')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略同步清單，重新下載並寫入所有歌曲')
+    parser.add_argument('--store', metavar='DB',
+                        help='同時寫入 SQLite 字幕庫（檔案不存在時會自動建立）')
+    parser.add_argument('--no-files', action='store_true',
+                        help='只寫入字幕庫，不產生 .srt/.lrc 檔案（需搭配 --store）')
+    parser.add_argument('--journal', metavar='PATH',
+                        help='工作日誌路徑；中斷後以同一份日誌重新執行會從中斷處繼續')
+    parser.add_argument('--formats', type=parse_formats, default=DEFAULT_FORMATS,
+                        help=f"以逗號分隔的輸出格式（可用：{', '.join(SUBTITLE_FORMATS)}，預設 srt,lrc）")
+    parser.add_argument('--dedup', action='store_true',
+                        help='以內容雜湊儲存字幕，相同內容只存一份，各檔名為硬連結')
+    parser.add_argument('--archive', metavar='PATH',
+                        help='將所有字幕寫入單一 .zip 或 .tar 封存檔（附偏移索引），不產生個別檔案')
+    parser.add_argument('--archive-shard-size', type=float, metavar='MB',
+                        help='封存檔超過此大小（MB）時換到下一個分片')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='以分段管線處理批次：擷取（--workers 個執行緒）→ 分段（行程池）→ 寫入，結束時顯示各階段使用率')
+    parser.add_argument('--cpu-workers', type=int, default=PIPELINE_CPU_WORKERS,
+                        help=f"分段管線的分段行程數（預設 {PIPELINE_CPU_WORKERS}）")
+    parser.add_argument('--write-workers', type=int, default=PIPELINE_WRITE_WORKERS,
+                        help=f"分段管線的寫入執行緒數（預設 {PIPELINE_WRITE_WORKERS}）")
+    parser.add_argument('--queue-size', type=int, default=PIPELINE_QUEUE_SIZE,
+                        help=f"分段管線各階段之間的佇列長度（預設 {PIPELINE_QUEUE_SIZE}）")
+    parser.add_argument('--page-workers', type=int, default=PAGE_WORKERS,
+                        help=f"列舉播放清單或創作者頁面時同時請求的頁數（預設 {PAGE_WORKERS}）")
+    parser.add_argument('--page-rate', type=float, default=PAGE_RATE_LIMIT,
+                        help=f"列舉時每秒最多請求幾頁，0 表示不限制（預設 {PAGE_RATE_LIMIT:g}）")
+    parser.add_argument('--api-base', metavar='URL',
+                        help=f"API 位址（預設 {DEFAULT_API_BASE}，或環境變數 SUNO_API_BASE）")
+    return parser
+
+
+def export_command(argv: List[str]) -> int:
+    """export 子命令：從 SQLite 字幕庫重新產生字幕檔案"""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} export",
+        description="從 SQLite 字幕庫重新匯出字幕檔案"
+    )
+    parser.add_argument('store', help='SQLite 字幕庫路徑')
+    parser.add_argument('output_dir', help='匯出目錄')
+    parser.add_argument('--formats', type=parse_formats, default=DEFAULT_FORMATS,
+                        help=f"以逗號分隔的格式（可用：{', '.join(SUBTITLE_FORMATS)}，預設 srt,lrc）")
+    parser.add_argument('--song', action='append', dest='songs', metavar='SONG_ID',
+                        help='只匯出指定歌曲，可重複使用；預設匯出全部')
+    parser.add_argument('--dedup', action='store_true',
+                        help='以內容雜湊儲存，相同內容只存一份（硬連結）')
+    args = parser.parse_args(argv)
+    
+    if not Path(args.store).is_file():
+        print(f"❌ 找不到字幕庫: {args.store}")
+        return 1
+    
+    store = SubtitleStore(args.store)
+    output_path = Path(args.output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest.for_dir(output_path)
+    
+    exported = 0
+    try:
+        for song_id in args.songs or store.song_ids():
+            words = store.get_words(song_id)
+            word_timings = WordTimings() if formats_need_words(args.formats) else None
+            segments = build_segments(words, word_timings=word_timings)
+            if not segments:
+                print(f"⚠️ [{song_id}] 字幕庫中沒有字幕資料")
+                continue
+            
+            filename = manifest.claim_filename(song_id, store.get_title(song_id))
+            rendered = render_formats(segments, word_timings, args.formats)
+            files = {
+                output_path / f"{filename}{SUBTITLE_FORMATS[name][0]}": content
+                for name, content in rendered.items()
+            }
+            if args.dedup:
+                write_deduplicated(files, output_path / OBJECTS_DIR_NAME)
+            else:
+                write_outputs(files)
+            exported += 1
+    finally:
+        store.close()
+        manifest.save()
+    
+    print(f"✅ 已匯出 {exported} 首歌曲到 {output_path}")
+    return 0
+
+
+def parse_sync_point(value: str) -> Tuple[float, float]:
+    """解析「原時間=新時間」格式的對齊點（供 argparse 使用）"""
+    try:
+        old, new = value.split('=')
+        return float(old), float(new)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"對齊點格式應為 原秒數=新秒數：{value}")
+
+
+def retime_command(argv: List[str]) -> int:
+    """retime 子命令：平移、縮放或重新對齊既有的 SRT/LRC 檔案"""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} retime",
+        description="重新計時既有的 SRT/LRC 字幕檔案（單一檔案或整個目錄）"
+    )
+    parser.add_argument('source', help='字幕檔案或目錄（目錄會遞迴處理所有 .srt/.lrc）')
+    parser.add_argument('output', nargs='?', help='輸出檔案或目錄；省略時需加上 --in-place')
+    parser.add_argument('--offset', type=float, default=0.0,
+                        help='平移秒數，負值表示提前（例如剪掉片頭 -12.5）')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='時間縮放倍率，先縮放再平移（預設 1）')
+    parser.add_argument('--sync', type=parse_sync_point, action='append', metavar='OLD=NEW',
+                        help='以對齊點計算平移與縮放：一個點只平移，兩個點同時縮放')
+    parser.add_argument('--clamp-start', type=float, default=0.0,
+                        help='最早時間，之前的段落會被移除或夾到此時間（預設 0）')
+    parser.add_argument('--clamp-end', type=float, default=None,
+                        help='最晚時間，例如影片長度；之後的段落會被移除')
+    parser.add_argument('--in-place', action='store_true', help='直接覆寫來源檔案')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='並行處理的行程數（預設為 CPU 核心數）')
+    args = parser.parse_args(argv)
+    
+    if not args.output and not args.in_place:
+        parser.error('請指定輸出位置，或加上 --in-place 覆寫來源檔案')
+    
+    offset, scale = args.offset, args.scale
+    if args.sync:
+        if len(args.sync) > 2:
+            parser.error('--sync 最多只能指定兩個對齊點')
+        (old1, new1) = args.sync[0]
+        if len(args.sync) == 2:
+            (old2, new2) = args.sync[1]
+            if old1 == old2:
+                parser.error('兩個對齊點的原時間不可相同')
+            scale = (new2 - new1) / (old2 - old1)
+        offset = new1 - old1 * scale
+    if scale <= 0:
+        parser.error('縮放倍率必須大於 0')
+    
+    source = Path(args.source)
+    output = Path(args.output) if args.output else None
+    if source.is_dir():
+        sources = sorted(
+            path for path in source.rglob('*')
+            if path.is_file() and path.suffix.lower() in RETIME_KINDS
+        )
+        destinations = [output / path.relative_to(source) if output else path for path in sources]
+    elif source.is_file() and source.suffix.lower() in RETIME_KINDS:
+        sources = [source]
+        if output and output.is_dir():
+            output = output / source.name
+        destinations = [output or source]
+    else:
+        print(f"❌ 找不到 SRT/LRC 檔案或目錄: {source}")
+        return 1
+    
+    options = {
+        'offset': offset,
+        'scale': scale,
+        'clamp_start': args.clamp_start,
+        'clamp_end': args.clamp_end,
+    }
+    jobs = [(str(src), str(dst), options) for src, dst in zip(sources, destinations)]
+    print(f"⏱ 重新計時 {len(jobs)} 個檔案（縮放 {scale:g}，平移 {offset:+g} 秒）")
+    
+    started = time.monotonic()
+    workers = max(1, args.workers)
+    if workers > 1 and len(jobs) >= RETIME_PARALLEL_MIN_FILES:
+        # 每個行程一次處理一批檔案，減少行程間往返
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(retime_file, jobs, chunksize=chunksize))
+    else:
+        results = [retime_file(job) for job in jobs]
+    
+    failures = [(src, error) for src, error in results if error]
+    for src, error in failures:
+        print(f"❌ {src}: {error}")
+    print(f"✅ 已重新計時 {len(results) - len(failures)} 個檔案"
+          f"（失敗 {len(failures)} 個，耗時 {time.monotonic() - started:.2f} 秒）")
+    return 1 if failures else 0
+
+
+def pipe_job(line_number: int, line: str, session_cookie: Optional[str],
+             formats: List[str], timeout: Optional[float], parent: CancelToken) -> Dict:
+    """處理 pipe 模式的一行工作，回傳要輸出的結果物件"""
+    result = {'line': line_number}
+    try:
+        if line.startswith('{'):
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError('工作必須是 JSON 物件')
+        else:
+            job = {'url': line}
+        if 'id' in job:
+            result['id'] = job['id']
+        
+        job_formats = job.get('formats', formats)
+        if isinstance(job_formats, list):
+            job_formats = ','.join(str(name) for name in job_formats)
+        job_formats = parse_formats(job_formats) if isinstance(job_formats, str) else formats
+        need_words = formats_need_words(job_formats)
+        
+        token = CancelToken(timeout=timeout, parent=parent)
+        try:
+            if 'aligned_words' in job:
+                words = job['aligned_words']
+                if not isinstance(words, list):
+                    raise ValueError('aligned_words 必須是陣列')
+                word_timings = WordTimings() if need_words else None
+                segments = build_segments([word for word in words if isinstance(word, dict)],
+                                          token, word_timings)
+            else:
+                song_id = extract_song_id(str(job.get('url', '')))
+                result['url'] = job.get('url')
+                if not song_id:
+                    raise ValueError('無法從 URL 中提取歌曲 ID')
+                result['song_id'] = song_id
+                cookie = job.get('cookie') or session_cookie
+                if not cookie:
+                    raise ValueError('缺少 session cookie（--cookie、SUNO_SESSION_COOKIE 或工作中的 cookie 欄位）')
+                fetched = fetch_subtitles(song_id, cookie, token, need_words)
+                words, segments = fetched['words'], fetched['segments']
+                word_timings = fetched['word_timings']
+                result['content_hash'] = fetched['content_hash']
+        finally:
+            token.close()
+        
+        if not segments:
+            raise ValueError('沒有字幕資料')
+        result['ok'] = True
+        result['words'] = len(words)
+        result['segments'] = len(segments)
+        result['formats'] = render_formats(segments, word_timings, job_formats)
+    except APIError as e:
+        result.update(ok=False, error=str(e), status=e.status_code)
+    except (DownloadCancelled, ValueError, argparse.ArgumentTypeError,
+            requests.exceptions.RequestException) as e:
+        # json.JSONDecodeError 也是 ValueError
+        result.update(ok=False, error=str(e) or type(e).__name__)
+    except Exception as e:
+        # 每行輸入都必須有一行輸出，不讓單一工作中斷整個管線
+        result.update(ok=False, error=f"{type(e).__name__}: {e}")
+    return result
+
+
+def pipe_command(argv: List[str]) -> int:
+    """pipe 子命令：從標準輸入讀取 NDJSON 工作，結果以 NDJSON 寫到標準輸出
+
+    每行一個工作：歌曲網址，或 JSON 物件
+    {"id": ..., "url": ..., "formats": [...], "cookie": ...} /
+    {"id": ..., "aligned_words": [...]}。
+    每完成一個工作就輸出一行並 flush，不輸出任何橫幅或進度文字；
+    並行數大於 1 時輸出順序依完成先後，請以 id 或 line 對應。
+    """
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} pipe",
+        description="機器模式：標準輸入每行一個工作，標準輸出每行一個 JSON 結果"
+    )
+    parser.add_argument('--cookie', default=os.environ.get('SUNO_SESSION_COOKIE'),
+                        help='session cookie（預設讀取環境變數 SUNO_SESSION_COOKIE）')
+    parser.add_argument('--formats', type=parse_formats, default=DEFAULT_FORMATS,
+                        help=f"預設輸出格式（可用：{', '.join(SUBTITLE_FORMATS)}），工作可自行指定")
+    parser.add_argument('--workers', type=int, default=1,
+                        help='同時處理的工作數（預設 1，輸出順序與輸入相同）')
+    parser.add_argument('--timeout', type=float, default=None, help='每個工作的整體期限（秒）')
+    parser.add_argument('--api-base', metavar='URL', help='API 位址')
+    args = parser.parse_args(argv)
+    
+    global API_BASE
+    if args.api_base:
+        API_BASE = args.api_base.rstrip('/')
+    
+    token = CancelToken()
+    signal.signal(signal.SIGTERM, lambda signum, frame: token.cancel('收到終止訊號'))
+    output_lock = threading.Lock()
+    failures = 0
+    
+    def emit(result: Dict):
+        nonlocal failures
+        with output_lock:
+            if not result.get('ok'):
+                failures += 1
+            if token.cancelled:
+                return
+            try:
+                sys.stdout.write(json.dumps(result) + '\n')
+                sys.stdout.flush()
+            except BrokenPipeError:
+                # 下游已關閉：停止讀取新工作，並避免結束時再次寫入失敗
+                token.cancel('輸出已關閉')
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    
+    workers = max(1, args.workers)
+    http_session(workers)
+    # 限制已提交但尚未完成的工作數，輸出端較慢時不會無限讀取標準輸入
+    slots = threading.BoundedSemaphore(workers * 2)
+    
+    def run(line_number: int, line: str):
+        try:
+            emit(pipe_job(line_number, line, args.cookie, args.formats, args.timeout, token))
+        finally:
+            slots.release()
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for line_number, line in enumerate(sys.stdin, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                if token.cancelled:
+                    break
+                if workers == 1:
+                    emit(pipe_job(line_number, line, args.cookie, args.formats, args.timeout, token))
+                    continue
+                slots.acquire()
+                executor.submit(run, line_number, line)
+    except KeyboardInterrupt:
+        token.cancel('使用者中斷')
+    
+    return 1 if failures or token.cancelled else 0
+
+
+def extract_command(argv: List[str]) -> int:
+    """extract 子命令：依索引從封存檔取出指定歌曲"""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} extract",
+        description="依偏移索引從封存檔直接取出指定歌曲的字幕，不需掃描整個封存檔"
+    )
+    parser.add_argument('archive', help='以 --archive 建立的封存檔路徑')
+    parser.add_argument('songs', nargs='*', metavar='SONG_ID', help='要取出的歌曲 ID')
+    parser.add_argument('--output', default='.', help='輸出目錄（預設當前目錄）')
+    parser.add_argument('--list', action='store_true', help='列出封存檔中的歌曲與成員')
+    args = parser.parse_args(argv)
+    
+    archive_path = Path(args.archive)
+    index_path = archive_path.with_name(archive_path.name + '.index.jsonl')
+    entries = SubtitleArchive.load_index(index_path)
+    if not entries:
+        print(f"❌ 找不到封存檔索引: {index_path}")
+        return 1
+    
+    if args.list:
+        for entry in entries.values():
+            print(f"{entry['song_id']}\t{entry['file']}\t{entry['name']}\t{entry['size']}")
+        return 0
+    
+    output_path = Path(args.output)
+    output_path.mkdir(parents=True, exist_ok=True)
+    wanted = set(args.songs)
+    files = {
+        output_path / entry['name']: SubtitleArchive.read_member(archive_path.parent, entry)
+        for entry in entries.values() if entry['song_id'] in wanted
+    }
+    write_outputs(files)
+    for path in files:
+        print(f"✅ 已取出: {path}")
+    
+    missing = wanted - {entry['song_id'] for entry in entries.values()}
+    for song_id in sorted(missing):
+        print(f"❌ 封存檔中沒有歌曲: {song_id}")
+    return 1 if missing or not wanted else 0
+
+
+def gc_command(argv: List[str]) -> int:
+    """gc 子命令：清除 --dedup 物件目錄中已沒有任何檔名連結的物件"""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} gc",
+        description="刪除內容定址儲存中不再被任何字幕檔案連結的物件"
+    )
+    parser.add_argument('output_dir', help='使用 --dedup 的輸出目錄')
+    parser.add_argument('--dry-run', action='store_true', help='只列出會刪除的物件數量')
+    args = parser.parse_args(argv)
+    
+    objects_dir = Path(args.output_dir) / OBJECTS_DIR_NAME
+    if not objects_dir.is_dir():
+        print(f"❌ 找不到物件目錄: {objects_dir}")
+        return 1
+    
+    total = removed = freed = 0
+    for path in objects_dir.glob('??/*'):
+        if path.name.endswith('.part'):
+            continue
+        total += 1
+        stat = path.stat()
+        # 只剩物件本身的連結，表示沒有任何歌曲檔名指向它
+        if stat.st_nlink <= 1:
+            removed += 1
+            freed += stat.st_size
+            if not args.dry_run:
+                path.unlink()
+    
+    action = '可刪除' if args.dry_run else '已刪除'
+    print(f"🧹 共 {total} 個物件，{action} {removed} 個（{freed / 1024:.1f} KB）")
+    return 0
+
+
+def status_command(argv: List[str]) -> int:
+    """status 子命令：摘要工作日誌中的進度"""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} status",
+        description="顯示批次工作日誌的進度摘要"
+    )
+    parser.add_argument('journal', help='工作日誌路徑')
+    parser.add_argument('--failed', action='store_true', help='列出所有失敗的歌曲網址')
+    args = parser.parse_args(argv)
+    
+    path = Path(args.journal)
+    if not path.is_file():
+        print(f"❌ 找不到工作日誌: {path}")
+        return 1
+    
+    records = JobJournal.read_records(path)
+    states = JobJournal.load_states(path)
+    jobs = [record for record in records if record.get('event') == 'job']
+    totals = [record.get('total') or 0 for record in records if record.get('event') in ('job', 'total')]
+    total = max(totals + [len(states)])
+    
+    counts = {'done': 0, 'failed': 0, 'started': 0}
+    for state in states.values():
+        counts[state.get('state')] = counts.get(state.get('state'), 0) + 1
+    pending = max(0, total - len(states))
+    
+    print(f"📒 工作日誌: {path}")
+    print(f"   執行次數: {len(jobs)}")
+    print(f"   歌曲總數: {total}")
+    print(f"   ✅ 已完成: {counts['done']}")
+    print(f"   ❌ 失敗:   {counts['failed']}")
+    print(f"   ⏸ 中斷:   {counts['started']}")
+    print(f"   ⏳ 未開始: {pending}")
+    if total:
+        print(f"   進度: {counts['done'] / total:.1%}")
+    if records:
+        print(f"   最後更新: {records[-1].get('ts', '')}")
+    
+    if args.failed:
+        for state in states.values():
+            if state.get('state') == 'failed':
+                print(f"   - {state.get('url')}")
+    
+    return 0
+
+
+# watch 模式：目錄中視為 URL 清單的副檔名、檔案寫入後需穩定多久才處理（秒）
+WATCH_SUFFIXES = ('.txt',)
+WATCH_SETTLE_SECONDS = 1.0
+
+
+class InotifyWatcher:
+    """以 Linux inotify 等待目錄或檔案變更（透過 ctypes 呼叫 libc，不需額外套件）
+
+    無法使用 inotify 時建構子拋出 OSError，呼叫端改用 PollingWatcher。
+    """
+    
+    mode = 'inotify'
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    
+    def __init__(self, path: Path):
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify 只支援 Linux')
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 失敗')
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(path)), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"無法監看 {path}")
+    
+    def wait(self, timeout: float) -> bool:
+        """等到有變更或逾時；有變更時回傳 True"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        # 只用來喚醒，事件內容不需要解析
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+    
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """沒有 inotify 的平台上以固定間隔輪詢"""
+    
+    mode = 'polling'
+    
+    def __init__(self, path: Path):
+        self.path = path
+    
+    def wait(self, timeout: float) -> bool:
+        time.sleep(timeout)
+        return False
+    
+    def close(self):
+        pass
+
+
+def open_watcher(path: Path, polling: bool = False):
+    """優先使用 inotify，不可用時改為輪詢"""
+    if not polling:
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️ 無法使用 inotify（{e}），改為輪詢")
+    return PollingWatcher(path)
+
+
+class WatchStats:
+    """watch 模式的健康狀態與吞吐量統計，供 --stats-port 的 HTTP 端點讀取"""
+    
+    def __init__(self, mode: str):
+        self._lock = threading.Lock()
+        self.mode = mode
+        self.started = time.time()
+        self.inputs_done = 0
+        self.inputs_failed = 0
+        self.songs_ok = 0
+        self.songs_failed = 0
+        self.current: Optional[str] = None
+        self.queued = 0
+        self.last_activity: Optional[float] = None
+        self.stopping = False
+        self._recent = collections.deque()
+    
+    def song_done(self, song_url: str, ok: bool):
+        now = time.time()
+        with self._lock:
+            if ok:
+                self.songs_ok += 1
+            else:
+                self.songs_failed += 1
+            self.last_activity = now
+            self._recent.append(now)
+    
+    def input_started(self, name: str, queued: int):
+        with self._lock:
+            self.current = name
+            self.queued = queued
+            self.last_activity = time.time()
+    
+    def input_finished(self, ok: bool):
+        with self._lock:
+            if ok:
+                self.inputs_done += 1
+            else:
+                self.inputs_failed += 1
+            self.current = None
+            self.queued = max(0, self.queued - 1)
+            self.last_activity = time.time()
+    
+    def snapshot(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            uptime = now - self.started
+            return {
+                'status': 'stopping' if self.stopping else 'ok',
+                'mode': self.mode,
+                'uptime_s': round(uptime, 1),
+                'inputs_done': self.inputs_done,
+                'inputs_failed': self.inputs_failed,
+                'songs_ok': self.songs_ok,
+                'songs_failed': self.songs_failed,
+                'songs_last_minute': len(self._recent),
+                'songs_per_minute': round((self.songs_ok + self.songs_failed) / uptime * 60, 2) if uptime else 0.0,
+                'current': self.current,
+                'queued': self.queued,
+                'last_activity': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.last_activity))
+                if self.last_activity else None,
+            }
+
+
+def serve_watch_stats(stats: WatchStats, host: str, port: int) -> http.server.ThreadingHTTPServer:
+    """在背景執行緒提供 /health 與 /stats（JSON）"""
+    
+    class StatsHandler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+        
+        def do_GET(self):
+            snapshot = stats.snapshot()
+            path = urllib.parse.urlsplit(self.path).path
+            if path == '/health':
+                status = 503 if stats.stopping else 200
+                body = {'status': snapshot['status']}
+            elif path == '/stats':
+                status, body = 200, snapshot
+            else:
+                status, body = 404, {'error': 'not found'}
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+    
+    server = http.server.ThreadingHTTPServer((host, port), StatsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def watch_output_dir(path: Path) -> Path:
+    """輸入檔案對應的輸出目錄：與輸入同目錄、以輸入檔名（不含副檔名）命名"""
+    return path.with_name(path.stem if path.suffix else path.name + '.out')
+
+
+def process_watch_input(path: Path, args: argparse.Namespace, token: CancelToken,
+                        metadata: MetadataCache, stats: WatchStats) -> Optional[bool]:
+    """處理監看目錄中的一份 URL 清單
+
+    字幕寫到 <名稱>/，摘要寫到 <名稱>.result.json，進度記在 <名稱>.journal.jsonl；
+    完成後輸入改名為 .done 或 .failed。被中斷時回傳 None 且保留輸入，
+    下次啟動會依工作日誌從中斷處繼續。
+    """
+    started = time.time()
+    output_dir = watch_output_dir(path)
+    journal = JobJournal(path.with_name(f"{path.stem}.journal.jsonl"))
+    song_urls = read_url_list(path)
+    source = song_urls
+    if SongSource.has_collections(song_urls):
+        source = SongSource(song_urls, args.cookie, token, metadata,
+                            workers=args.page_workers, rate_limit=args.page_rate)
+    print(f"📥 開始處理 {path.name}（{len(song_urls)} 行）")
+    try:
+        succeeded, total = download_batch(
+            source, args.cookie, str(output_dir), workers=args.workers, timeout=args.timeout,
+            token=token, journal=journal, formats=args.formats, metadata=metadata,
+            progress=stats.song_done
+        )
+    finally:
+        journal.close()
+    if token.cancelled:
+        return None
+    
+    failed_sources = source.failed if isinstance(source, SongSource) else []
+    ok = bool(total) and succeeded == total and not failed_sources
+    result = {
+        'input': path.name,
+        'output_dir': output_dir.name,
+        'ok': ok,
+        'total': total,
+        'succeeded': succeeded,
+        'failed': [state['url'] for state in journal.states.values() if state.get('state') != 'done'],
+        'failed_sources': failed_sources,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(started)),
+        'duration_s': round(time.time() - started, 2),
+    }
+    result_path = path.with_name(f"{path.stem}.result.json")
+    tmp_path = result_path.with_name(result_path.name + '.tmp')
+    tmp_path.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+    os.replace(tmp_path, result_path)
+    os.replace(path, path.with_name(path.name + ('.done' if ok else '.failed')))
+    print(f"{'✅' if ok else '❌'} {path.name}：成功 {succeeded} / {total} 首，{result['duration_s']} 秒")
+    return ok
+
+
+def watch_directory(directory: Path, args: argparse.Namespace, token: CancelToken,
+                    metadata: MetadataCache, stats: WatchStats, watcher):
+    """持續處理目錄中新出現的 URL 清單，直到權杖被取消"""
+    seen: Dict[Path, Tuple[int, float]] = {}
+    while not token.cancelled:
+        # 檔案大小與修改時間穩定後才處理，避免讀到寫到一半的清單
+        candidates = sorted(
+            path for path in directory.iterdir()
+            if path.suffix in WATCH_SUFFIXES and not path.name.startswith('.') and path.is_file()
+        )
+        ready, settling = [], False
+        now = time.time()
+        for path in candidates:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            signature = (stat.st_size, stat.st_mtime)
+            if seen.get(path) == signature or now - stat.st_mtime >= WATCH_SETTLE_SECONDS:
+                ready.append(path)
+            else:
+                settling = True
+            seen[path] = signature
+        seen = {path: signature for path, signature in seen.items() if path in candidates}
+        
+        for index, path in enumerate(ready):
+            if token.cancelled:
+                break
+            stats.input_started(path.name, len(ready) - index)
+            try:
+                ok = process_watch_input(path, args, token, metadata, stats)
+            except (OSError, ValueError) as e:
+                # 無法讀取或處理的輸入標記為失敗，不讓單一檔案中斷常駐程序
+                print(f"❌ 無法處理 {path.name}: {e}")
+                ok = False
+                if path.exists():
+                    os.replace(path, path.with_name(path.name + '.failed'))
+            if ok is not None:
+                stats.input_finished(ok)
+                seen.pop(path, None)
+        
+        if not ready:
+            watcher.wait(min(args.interval, WATCH_SETTLE_SECONDS) if settling else args.interval)
+
+
+def watch_spool(spool: Path, args: argparse.Namespace, token: CancelToken,
+                metadata: MetadataCache, stats: WatchStats, watcher):
+    """持續讀取附加到 spool 檔案的新網址，直到權杖被取消
+
+    已處理的位置記在 <spool>.offset；檔案被截斷或替換時從頭讀起。
+    工作日誌只保護目前這一段新內容（中斷後重新啟動不必重新下載已完成的歌曲），
+    整段處理完就清空，之後再次附加的網址會重新下載。
+    """
+    offset_path = spool.with_name(spool.name + '.offset')
+    try:
+        offset = int(offset_path.read_text().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        offset = 0
+    output_dir = Path(args.output) if args.output else watch_output_dir(spool)
+    journal = JobJournal(spool.with_name(f"{spool.name}.journal.jsonl"))
+    try:
+        while not token.cancelled:
+            try:
+                size = spool.stat().st_size
+            except FileNotFoundError:
+                size = 0
+            if size < offset:
+                print(f"⚠️ {spool.name} 已被截斷，從頭讀取")
+                offset = 0
+            
+            data = b''
+            if size > offset:
+                with open(spool, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read(size - offset)
+            # 只處理完整的行，寫到一半的最後一行留到下次
+            next_offset = offset + data.rfind(b'\n') + 1
+            lines = [line.strip() for line in data[:next_offset - offset].decode('utf-8', 'replace').splitlines()]
+            lines = [line for line in lines if line and not line.startswith('#')]
+            
+            if not lines:
+                if next_offset != offset:
+                    offset = next_offset
+                    offset_path.write_text(str(offset))
+                watcher.wait(args.interval)
+                continue
+            
+            stats.input_started(spool.name, 0)
+            source = lines
+            if SongSource.has_collections(lines):
+                source = SongSource(lines, args.cookie, token, metadata,
+                                    workers=args.page_workers, rate_limit=args.page_rate)
+            succeeded, total = download_batch(
+                source, args.cookie, str(output_dir), workers=args.workers, timeout=args.timeout,
+                token=token, journal=journal, formats=args.formats, metadata=metadata,
+                progress=stats.song_done
+            )
+            if token.cancelled:
+                break
+            stats.input_finished(succeeded == total)
+            print(f"📊 {spool.name}：成功 {succeeded} / {total} 首")
+            # 先清空日誌再記錄位置：兩者之間中斷時只會重新處理這一段，不會漏掉之後附加的網址
+            journal.reset()
+            offset = next_offset
+            offset_path.write_text(str(offset))
+    finally:
+        journal.close()
+
+
+def watch_command(argv: List[str]) -> int:
+    """watch 子命令：常駐監看目錄或 spool 檔案，處理新放入的 URL 清單
+
+    整個常駐期間共用同一個 HTTP 連線池與標題快取，每份清單不必重新啟動程序。
+    """
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} watch",
+        description="常駐模式：監看目錄中新放入的 URL 清單（.txt）或附加到 spool 檔案的網址並下載字幕"
+    )
+    parser.add_argument('path', help='要監看的目錄，或每行一個網址、持續附加的 spool 檔案')
+    parser.add_argument('--cookie', default=os.environ.get('SUNO_SESSION_COOKIE'),
+                        help='session cookie（預設讀取環境變數 SUNO_SESSION_COOKIE）')
+    parser.add_argument('--output', metavar='DIR', help='spool 模式的輸出目錄（預設與 spool 檔案同名的目錄）')
+    parser.add_argument('--workers', type=int, default=4, help='同時下載的歌曲數量（預設 4）')
+    parser.add_argument('--timeout', type=float, default=None, help='每首歌曲的整體期限（秒）')
+    parser.add_argument('--formats', type=parse_formats, default=DEFAULT_FORMATS,
+                        help=f"以逗號分隔的輸出格式（可用：{', '.join(SUBTITLE_FORMATS)}，預設 srt,lrc）")
+    parser.add_argument('--interval', type=float, default=2.0,
+                        help='輪詢間隔（秒）；使用 inotify 時為沒有事件時的最長等待（預設 2）')
+    parser.add_argument('--poll', action='store_true', help='不使用 inotify，一律輪詢')
+    parser.add_argument('--stats-port', type=int, metavar='PORT',
+                        help='在此連接埠提供 /health 與 /stats（JSON）')
+    parser.add_argument('--stats-host', default='127.0.0.1', help='統計端點的監聽位址（預設 127.0.0.1）')
+    parser.add_argument('--page-workers', type=int, default=PAGE_WORKERS, help='列舉播放清單時同時請求的頁數')
+    parser.add_argument('--page-rate', type=float, default=PAGE_RATE_LIMIT, help='列舉時每秒最多請求幾頁')
+    parser.add_argument('--api-base', metavar='URL', help='API 位址')
+    args = parser.parse_args(argv)
+    
+    global API_BASE
+    if args.api_base:
+        API_BASE = args.api_base.rstrip('/')
+    if not args.cookie:
+        parser.error('缺少 session cookie（--cookie 或環境變數 SUNO_SESSION_COOKIE）')
+    
+    path = Path(args.path)
+    if not path.exists():
+        print(f"❌ 找不到: {path}")
+        return 1
+    spool_mode = path.is_file()
+    
+    token = CancelToken()
+    signal.signal(signal.SIGTERM, lambda signum, frame: token.cancel('收到終止訊號'))
+    http_session(max(1, args.workers) * 2 + args.page_workers)
+    metadata = MetadataCache.default()
+    watcher = open_watcher(path, args.poll)
+    stats = WatchStats(watcher.mode)
+    stats_server = serve_watch_stats(stats, args.stats_host, args.stats_port) if args.stats_port else None
+    
+    print(f"👀 監看{'spool 檔案' if spool_mode else '目錄'}: {path}（{watcher.mode}）")
+    if stats_server is not None:
+        host, port = stats_server.server_address[:2]
+        print(f"   統計: http://{host}:{port}/stats")
+    print("   按 Ctrl+C 或送出 SIGTERM 停止")
+    
+    try:
+        if spool_mode:
+            watch_spool(path, args, token, metadata, stats, watcher)
+        else:
+            watch_directory(path, args, token, metadata, stats, watcher)
+    except KeyboardInterrupt:
+        token.cancel('使用者中斷')
+    finally:
+        stats.stopping = True
+        metadata.save()
+        watcher.close()
+        if stats_server is not None:
+            stats_server.shutdown()
+    
+    print(f"⏹ 已停止監看：{token.reason or '結束'}")
+    return 0
+
+
+# 子命令：第一個參數為子命令名稱時使用，其餘情況維持原本的下載用法
+COMMANDS = {
+    'export': export_command,
+    'status': status_command,
+    'retime': retime_command,
+    'pipe': pipe_command,
+    'extract': extract_command,
+    'gc': gc_command,
+    'watch': watch_command,
+}
+
+
+def main():
+    """主程式"""
+    global API_BASE
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        sys.exit(COMMANDS[sys.argv[1]](sys.argv[2:]))
+    
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.no_files and not args.store:
+        parser.error('--no-files 需要搭配 --store 使用')
+    if args.dedup and args.archive:
+        parser.error('--dedup 與 --archive 不能同時使用')
+    if args.archive_shard_size and not args.archive:
+        parser.error('--archive-shard-size 需要搭配 --archive 使用')
+    if args.archive and Path(args.archive).suffix.lower() not in ('.zip', '.tar'):
+        parser.error('--archive 的副檔名必須是 .zip 或 .tar')
+    if args.api_base:
+        API_BASE = args.api_base.rstrip('/')
+    
+    print("=" * 60)
+    print("🎵 Suno 字幕下載工具")
+    print("=" * 60)
+    print()
+    
+    # 取得輸入
+    if args.song_url and args.session_cookie:
+        song_url = args.song_url
+        session_cookie = args.session_cookie
+        output_dir = args.output_dir
+    else:
+        print("使用方法：")
+        print(f"  python3 {sys.argv[0]} <歌曲URL|URL清單檔案> <session_cookie> [輸出目錄] [--workers N] [--timeout 秒] [--force]")
+        print()
+        print("參數說明：")
+        print("  歌曲URL: Suno 歌曲頁面網址，例如：https://suno.com/song/xxxxx")
+        print("           也可以是播放清單（https://suno.com/playlist/xxxxx）或創作者頁面（https://suno.com/@名稱）")
+        print("  URL清單檔案: 每行一個歌曲網址的文字檔，用於批次下載")
+        print("  session_cookie: 從瀏覽器取得的 __session cookie 值")
+        print("  輸出目錄: (選填) 儲存檔案的路徑，預設為當前目錄")
+        print("  --workers: (選填) 批次下載的並行數量")
+        print("  --timeout: (選填) 每首歌曲的整體期限（秒）")
+        print("  --force: (選填) 忽略同步清單，重新下載所有歌曲")
+        print("  --store: (選填) 同時寫入 SQLite 字幕庫；加上 --no-files 則只寫入字幕庫")
+        print("  --journal: (選填) 工作日誌路徑，中斷後重新執行會從中斷處繼續")
+        print("  --formats: (選填) 輸出格式，例如 srt,lrc,vtt,elrc,ass（elrc 為逐字 LRC，ass 為卡拉 OK 字幕）")
+        print("  --dedup: (選填) 相同內容的字幕只存一份（.objects 目錄 + 硬連結）")
+        print("  --archive: (選填) 將字幕寫入單一 .zip/.tar 封存檔；--archive-shard-size 可依大小分片")
+        print("  --page-workers / --page-rate: (選填) 列舉播放清單時同時請求的頁數與每秒請求上限")
+        print("  --pipeline: (選填) 以擷取 → 分段（多行程）→ 寫入的分段管線處理大量歌曲；")
+        print("              --cpu-workers、--write-workers、--queue-size 調整各階段大小")
+        print("  --api-base: (選填) API 位址，測試時可指向本機的 mock-suno-api.py")
+        print()
+        print("子命令：")
+        print(f"  python3 {sys.argv[0]} export <字幕庫> <輸出目錄> [--formats srt,lrc] [--song ID]")
+        print(f"  python3 {sys.argv[0]} status <工作日誌> [--failed]")
+        print(f"  python3 {sys.argv[0]} pipe [--cookie COOKIE] [--formats srt,lrc] < jobs.ndjson > results.ndjson")
+        print(f"  python3 {sys.argv[0]} extract <封存檔> <歌曲ID>... [--output 目錄] [--list]")
+        print(f"  python3 {sys.argv[0]} gc <輸出目錄> [--dry-run]")
+        print(f"  python3 {sys.argv[0]} retime <檔案或目錄> [輸出] [--offset 秒] [--scale 倍率] [--sync 原=新] [--in-place]")
+        print(f"  python3 {sys.argv[0]} watch <目錄或spool檔案> --cookie COOKIE [--stats-port 8790]")
+        print()
+        print("如何取得 session cookie：")
+        print("  1. 在瀏覽器中登入 suno.com")
+        print("  2. 按 F12 開啟開發者工具")
+        print("  3. 切換到「Application」或「儲存空間」標籤")
+        print("  4. 在 Cookies 中找到 suno.com")
+        print("  5. 複製 __session 的值")
+        print()
+        
+        # 互動式輸入
+        song_url = input("請輸入 Suno 歌曲 URL: ").strip()
+        if not song_url:
+            print("❌ 未輸入 URL")
+            sys.exit(1)
+        
+        session_cookie = input("請輸入 __session cookie: ").strip()
         if not session_cookie:
             print("❌ 未輸入 session cookie")
             sys.exit(1)
         
         output_dir = input("請輸入輸出目錄（直接按 Enter 使用當前目錄）: ").strip() or None
     
+    # 若給的是清單檔案則批次下載
+    url_list_path = Path(song_url)
+    if url_list_path.is_file():
+        song_urls = read_url_list(url_list_path)
+        print(f"📋 從 {url_list_path} 讀取 {len(song_urls)} 個網址")
+    else:
+        song_urls = [song_url]
+    
+    # SIGTERM 與 Ctrl+C 一樣取消進行中的下載，並清除未完成的檔案
+    token = CancelToken()
+    signal.signal(signal.SIGTERM, lambda signum, frame: token.cancel('收到終止訊號'))
+    
+    # 播放清單與創作者頁面邊列舉邊下載
+    http_session(max(1, args.workers) * 2 + args.page_workers)
+    metadata = MetadataCache.default()
+    source = song_urls
+    if SongSource.has_collections(song_urls):
+        source = SongSource(song_urls, session_cookie, token, metadata,
+                            workers=args.page_workers, rate_limit=args.page_rate)
+    
+    store = SubtitleStore(args.store) if args.store else None
+    journal = JobJournal(Path(args.journal)) if args.journal else None
+    archive = None
+    if args.archive:
+        shard_size = int(args.archive_shard_size * 1024 * 1024) if args.archive_shard_size else None
+        try:
+            archive = SubtitleArchive(Path(args.archive), shard_size)
+        except ValueError as e:
+            parser.error(str(e))
+    
     # 執行下載
-    success = download_subtitles(song_url, session_cookie, output_dir)
+    try:
+        if args.pipeline:
+            pipeline = DownloadPipeline(
+                session_cookie, output_dir, fetch_workers=args.workers,
+                cpu_workers=args.cpu_workers, write_workers=args.write_workers,
+                queue_size=args.queue_size, timeout=args.timeout, token=token, force=args.force,
+                store=store, write_files=not args.no_files and archive is None, journal=journal,
+                formats=args.formats, archive=archive, dedup=args.dedup, metadata=metadata
+            )
+            succeeded, total = pipeline.run(source)
+        else:
+            succeeded, total = download_batch(
+                source, session_cookie, output_dir,
+                workers=args.workers, timeout=args.timeout, token=token, force=args.force,
+                store=store, write_files=not args.no_files and archive is None, journal=journal,
+                formats=args.formats, archive=archive, dedup=args.dedup, metadata=metadata
+            )
+    finally:
+        if store is not None:
+            store.close()
+        if journal is not None:
+            journal.close()
+        if archive is not None:
+            archive.close()
+    failed_sources = source.failed if isinstance(source, SongSource) else []
+    success = bool(total) and succeeded == total and not failed_sources
+    
+    if total > 1 or failed_sources:
+        print()
+        print(f"📊 成功 {succeeded} / {total} 首")
+        if failed_sources:
+            print(f"   {len(failed_sources)} 個播放清單或創作者頁面無法列舉")
     
     if success:
         print()
@@ -311,4 +3894,6 @@ def main():
 
 
 if __name__ == '__main__':
+    # 打包成可執行檔後，retime 的行程池需要此呼叫
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""命令列與 GUI 版本的 CancelToken 行為必須一致"""
+import importlib.util
+import os
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(name, filename):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def implementations():
+    modules = [load_module('suno_subtitle_downloader', 'suno-subtitle-downloader.py')]
+    try:
+        import tkinter  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        modules.append(load_module('suno_subtitle_downloader_gui', 'suno-subtitle-downloader-gui.py'))
+    return modules
+
+
+class CancelTokenTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.modules = implementations()
+
+    def test_child_deadline_is_clamped_to_parent(self):
+        for module in self.modules:
+            with self.subTest(module=module.__name__):
+                parent = module.CancelToken(timeout=0.1)
+                unlimited = module.CancelToken(parent=parent)
+                longer = module.CancelToken(timeout=60, parent=parent)
+                self.assertEqual(unlimited.deadline, parent.deadline)
+                self.assertEqual(longer.deadline, parent.deadline)
+                shorter = module.CancelToken(timeout=0.01, parent=parent)
+                self.assertLess(shorter.deadline, parent.deadline)
+                time.sleep(0.15)
+                self.assertTrue(unlimited.cancelled)
+                self.assertTrue(longer.cancelled)
+
+    def test_sleep_is_interrupted_by_cancel(self):
+        for module in self.modules:
+            with self.subTest(module=module.__name__):
+                token = module.CancelToken()
+                threading.Timer(0.05, token.cancel).start()
+                started = time.monotonic()
+                with self.assertRaises(module.DownloadCancelled):
+                    token.sleep(10)
+                self.assertLess(time.monotonic() - started, 2)
+
+    def test_sleep_stops_at_deadline(self):
+        for module in self.modules:
+            with self.subTest(module=module.__name__):
+                token = module.CancelToken(parent=module.CancelToken(timeout=0.05))
+                started = time.monotonic()
+                with self.assertRaises(module.DownloadCancelled):
+                    token.sleep(10)
+                self.assertLess(time.monotonic() - started, 2)
+
+    def test_sleep_returns_when_not_cancelled(self):
+        for module in self.modules:
+            with self.subTest(module=module.__name__):
+                module.CancelToken().sleep(0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
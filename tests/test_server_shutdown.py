@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""server.py 的平順關閉：SIGTERM 後拒絕新連線、排空進行中的請求並乾淨結束"""
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import urllib.request
+
+SERVER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server.py')
+
+ALIGNED_WORDS = json.dumps({'aligned_words': [
+    {'word': 'hello ', 'start_s': 0.0, 'end_s': 0.5, 'success': True},
+    {'word': 'world\n', 'start_s': 0.5, 'end_s': 1.0, 'success': True},
+]}).encode('utf-8')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@unittest.skipUnless(hasattr(signal, 'SIGTERM') and os.name == 'posix', '需要 POSIX 訊號')
+class ServerShutdownTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.workdir.name, 'index.html'), 'w') as f:
+            f.write('ok')
+        self.port = free_port()
+        env = dict(os.environ, PORT=str(self.port), CONVERT_POOL='process', CONVERT_WORKERS='2',
+                   DRAIN_TIMEOUT='10', PYTHONUNBUFFERED='1')
+        self.server = subprocess.Popen([sys.executable, SERVER_PATH], cwd=self.workdir.name, env=env,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       start_new_session=True)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or self.server.poll() is not None:
+                    self.fail('伺服器未啟動')
+                time.sleep(0.1)
+
+    def tearDown(self):
+        # 連同轉換行程一起結束，留下的行程會一直佔住輸出管道
+        try:
+            os.killpg(self.server.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self.server.communicate(timeout=10)
+        self.workdir.cleanup()
+
+    def convert(self):
+        request = urllib.request.Request(f'http://127.0.0.1:{self.port}/api/convert?format=srt',
+                                         data=ALIGNED_WORDS, method='POST')
+        with urllib.request.urlopen(request, timeout=10) as response:
+            self.assertEqual(response.status, 200)
+            return response.read().decode('utf-8')
+
+    def start_slow_convert(self):
+        # 只送出部分內容，讓請求在 SIGTERM 時仍在進行中
+        sock = socket.create_connection(('127.0.0.1', self.port), timeout=10)
+        sock.sendall(b'POST /api/convert?format=srt HTTP/1.1\r\nHost: localhost\r\n'
+                     b'Content-Length: %d\r\n\r\n' % len(ALIGNED_WORDS) + ALIGNED_WORDS[:10])
+        return sock
+
+    def wait_refused(self, timeout=3.0):
+        # SIGTERM 之後應很快拒絕新連線，而不是讓連線卡在 backlog
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=0.5).close()
+            except ConnectionRefusedError:
+                return True
+            except OSError:
+                pass
+            time.sleep(0.05)
+        return False
+
+    def test_refuses_new_connections_after_sigterm_once_convert_was_used(self):
+        self.assertIn('hello', self.convert())
+        in_flight = self.start_slow_convert()
+        try:
+            self.server.send_signal(signal.SIGTERM)
+            self.assertTrue(self.wait_refused(), 'SIGTERM 後仍接受新連線')
+        finally:
+            in_flight.close()
+        _, stderr = self.server.communicate(timeout=15)
+        self.assertEqual(self.server.returncode, 0)
+        self.assertNotIn(b'Bad file descriptor', stderr)
+
+    def test_drain_finishes_in_flight_convert_after_convert_was_used(self):
+        self.convert()
+        in_flight = self.start_slow_convert()
+        try:
+            time.sleep(0.2)
+            self.server.send_signal(signal.SIGTERM)
+            self.assertTrue(self.wait_refused(), 'SIGTERM 後仍接受新連線')
+            # 新連線已被拒絕，進行中的請求仍可送完並取得完整回應
+            self.assertIsNone(self.server.poll())
+            in_flight.sendall(ALIGNED_WORDS[10:])
+            response = b''
+            while True:
+                chunk = in_flight.recv(65536)
+                if not chunk:
+                    break
+                response += chunk
+        finally:
+            in_flight.close()
+        self.assertTrue(response.startswith(b'HTTP/1.0 200'), response[:100])
+        self.assertIn(b'hello', response)
+        stdout, _ = self.server.communicate(timeout=15)
+        self.assertEqual(self.server.returncode, 0)
+        self.assertIn('All in-flight requests finished', stdout.decode('utf-8'))
+
+
+if __name__ == '__main__':
+    unittest.main()